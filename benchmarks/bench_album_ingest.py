@@ -0,0 +1,87 @@
+# benchmarks/bench_album_ingest.py
+"""
+Ingesta de álbumes PPV de 10 archivos.
+1) AlbumCollector: los 10 mensajes de un álbum llegan como tareas
+   concurrentes (como en start_polling); se cuentan cuántas veces se procesa
+   el álbum y la latencia hasta tenerlo completo.
+2) Persistencia: add_ppv_content + una conexión por archivo con
+   add_ppv_album_item frente a add_ppv_album (una transacción, executemany).
+
+Uso: python benchmarks/bench_album_ingest.py [álbumes]
+"""
+
+import asyncio
+import datetime
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "bot"))
+
+import database
+
+database.DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_album.db")
+
+from aiogram.types import Chat, Message, PhotoSize, User
+
+from album_collector import AlbumCollector
+
+ALBUM_SIZE = 10
+
+def make_album(album_no: int) -> list:
+    user = User(id=42, is_bot=False, first_name="Creadora")
+    return [
+        Message(
+            message_id=album_no * ALBUM_SIZE + i, date=datetime.datetime.now(),
+            chat=Chat(id=42, type="private"), from_user=user, media_group_id=f"album{album_no}",
+            photo=[PhotoSize(file_id=f"file_{album_no}_{i}", file_unique_id=f"u_{album_no}_{i}", width=1280, height=960)],
+        )
+        for i in range(ALBUM_SIZE)
+    ]
+
+async def bench_collector(albums: int):
+    collector = AlbumCollector(debounce=0.05)
+    processed = []
+
+    async def handler(message: Message):
+        messages = await collector.collect(message)
+        if messages is not None:
+            processed.append(len(messages))
+
+    started = time.perf_counter()
+    for album_no in range(albums):
+        tasks = []
+        for message in make_album(album_no):
+            tasks.append(asyncio.create_task(handler(message)))
+            await asyncio.sleep(0.005)  # los mensajes de un álbum llegan escalonados
+        await asyncio.gather(*tasks)
+    elapsed = (time.perf_counter() - started) / albums * 1000
+    print(f"Agrupador: {albums} álbumes -> {len(processed)} procesados "
+          f"({ALBUM_SIZE * albums} mensajes, {sum(processed)} archivos), "
+          f"{elapsed:.0f} ms/álbum con espera de {collector.debounce * 1000:.0f} ms")
+
+def per_item(albums: int) -> float:
+    started = time.perf_counter()
+    for album_no in range(albums):
+        content_id = database.add_ppv_content(42, f"Álbum {album_no}", "", 100, album_type='album')
+        for i in range(ALBUM_SIZE):
+            database.add_ppv_album_item(content_id, f"file_{album_no}_{i}", "photo", i)
+    return (time.perf_counter() - started) / albums * 1000
+
+def batched(albums: int) -> float:
+    started = time.perf_counter()
+    for album_no in range(albums):
+        database.add_ppv_album(42, f"Álbum {album_no}", "", 100,
+                               [(f"file_{album_no}_{i}", "photo", f"u_{album_no}_{i}") for i in range(ALBUM_SIZE)])
+    return (time.perf_counter() - started) / albums * 1000
+
+def main(albums: int):
+    asyncio.run(bench_collector(min(albums, 20)))
+    database.init_db()
+    print(f"\nPersistencia de {albums} álbumes de {ALBUM_SIZE} archivos (ms/álbum)")
+    print(f"  una conexión por archivo: {per_item(albums):7.2f}  ({ALBUM_SIZE + 1} commits)")
+    print(f"  add_ppv_album:            {batched(albums):7.2f}  (1 commit)")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,95 @@
+# benchmarks/bench_bot_session.py
+"""
+Benchmark de la sesión HTTP del bot contra un servidor local que imita la Bot API.
+Compara conexiones en frío (una conexión TCP nueva por petición) con keep-alive caliente.
+
+Uso: python benchmarks/bench_bot_session.py [peticiones] [concurrencia]
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "bot"))
+
+from aiohttp import web
+from aiogram import Bot
+from aiogram.client.telegram import TelegramAPIServer
+
+from http_session import HttpSessionConfig, TunedAiohttpSession
+
+TOKEN = "123456:BENCHMARK"
+
+async def fake_get_me(request: web.Request) -> web.Response:
+    """Respuesta mínima de getMe, con una pequeña latencia de servidor"""
+    await asyncio.sleep(0.001)
+    return web.json_response({
+        "ok": True,
+        "result": {"id": 123456, "is_bot": True, "first_name": "Bench", "username": "bench_bot"},
+    })
+
+async def start_fake_server() -> tuple[web.AppRunner, int]:
+    app = web.Application()
+    app.router.add_post("/bot{token}/{method}", fake_get_me)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, port
+
+async def run(session: TunedAiohttpSession, port: int, requests: int, concurrency: int) -> tuple[list[float], dict]:
+    session.api = TelegramAPIServer.from_base(f"http://127.0.0.1:{port}")
+    bot = Bot(token=TOKEN, session=session)
+    latencies: list[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            await bot.get_me()
+            latencies.append(time.perf_counter() - started)
+
+    # Calentar el pool antes de medir
+    await asyncio.gather(*(one() for _ in range(concurrency)))
+    latencies.clear()
+
+    await asyncio.gather(*(one() for _ in range(requests)))
+    stats = session.pool_stats()["default"]
+    await session.close()
+    return latencies, stats
+
+def report(name: str, latencies: list[float]):
+    latencies = sorted(latencies)
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    print(f"{name:<22} n={len(latencies):<6} media={statistics.mean(latencies) * 1000:7.3f} ms  "
+          f"p50={p50:7.3f} ms  p99={p99:7.3f} ms")
+
+async def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    runner, port = await start_fake_server()
+    try:
+        # Frío: keep-alive desactivado, cada petición abre una conexión TCP nueva
+        cold = TunedAiohttpSession(HttpSessionConfig(pool_limit=concurrency))
+        cold._connector_init["force_close"] = True
+        cold._connector_init.pop("keepalive_timeout")
+        cold_latencies, _ = await run(cold, port, requests, concurrency)
+
+        # Caliente: pool con keep-alive, las conexiones se reutilizan
+        warm = TunedAiohttpSession(HttpSessionConfig(pool_limit=concurrency))
+        warm_latencies, stats = await run(warm, port, requests, concurrency)
+    finally:
+        await runner.cleanup()
+
+    report("sin keep-alive", cold_latencies)
+    report("keep-alive caliente", warm_latencies)
+    gain = 1 - statistics.mean(warm_latencies) / statistics.mean(cold_latencies)
+    print(f"Mejora de latencia media con keep-alive: {gain:.1%}")
+    print(f"Métricas del pool caliente: {stats}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
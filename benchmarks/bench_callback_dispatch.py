@@ -0,0 +1,85 @@
+# benchmarks/bench_callback_dispatch.py
+"""
+Coste de despacho por callback_query según el número de familias tipadas.
+Árbol sintético: un router raíz con 7 sub-routers, handlers de callbacks
+constantes (F.data == "...") y N familias CallbackData repartidas. Se mide
+dp.feed_update con los filtros .filter() de aiogram y con CallbackDispatch,
+para la última familia registrada, una al azar y un callback constante.
+
+Uso: python benchmarks/bench_callback_dispatch.py [callbacks]
+"""
+
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "bot"))
+
+from aiogram import Bot, Dispatcher, F, Router
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import Update, CallbackQuery, User
+
+from callbacks import CallbackDispatch
+
+SUB_ROUTERS = 7
+CONSTANTS_PER_ROUTER = 6
+
+async def noop(callback: CallbackQuery):
+    pass
+
+def make_family(i: int):
+    return type(f"Family{i}", (CallbackData,), {"__annotations__": {"item_id": int, "cursor": int}}, prefix=f"fam{i}")
+
+def build_tree(families) -> Router:
+    root = Router()
+    subs = [Router() for _ in range(SUB_ROUTERS)]
+    for i, sub in enumerate(subs):
+        for j in range(CONSTANTS_PER_ROUTER):
+            sub.callback_query(F.data == f"const_{i}_{j}")(noop)
+        root.include_router(sub)
+    owners = [root] + subs
+    for i, family in enumerate(families):
+        owners[i % len(owners)].callback_query(family.filter())(noop)
+    return root
+
+def make_update(update_id: int, data: str) -> Update:
+    user = User(id=42, is_bot=False, first_name="Fan")
+    callback = CallbackQuery(id=str(update_id), from_user=user, chat_instance="1", data=data)
+    return Update(update_id=update_id, callback_query=callback)
+
+async def per_callback(dp: Dispatcher, bot: Bot, payloads) -> float:
+    updates = [make_update(i, data) for i, data in enumerate(payloads)]
+    started = time.perf_counter()
+    for update in updates:
+        await dp.feed_update(bot, update)
+    return (time.perf_counter() - started) / len(updates) * 1e6
+
+async def main(count: int):
+    bot = Bot("42:TEST")
+    print(f"Callbacks por medida: {count} (µs/callback)\n")
+    print(f"{'familias':>8} | {'última':>15} | {'al azar':>15} | {'constante':>15}")
+    print(f"{'':>8} | {'filtros índice':>15} | {'filtros índice':>15} | {'filtros índice':>15}")
+    for size in (10, 20, 50, 100, 300):
+        families = [make_family(i) for i in range(size)]
+        scenarios = [
+            [families[-1](item_id=123456789, cursor=i).pack() for i in range(count)],
+            [random.choice(families)(item_id=123456789, cursor=i).pack() for i in range(count)],
+            [f"const_{SUB_ROUTERS - 1}_{CONSTANTS_PER_ROUTER - 1}"] * count,
+        ]
+        row = []
+        for payloads in scenarios:
+            plain = Dispatcher()
+            plain.include_router(build_tree(families))
+            indexed = Dispatcher()
+            indexed.include_router(build_tree(families))
+            dispatch = CallbackDispatch()
+            dispatch.build(indexed)
+            indexed.callback_query.outer_middleware(dispatch)
+            row.append(f"{await per_callback(plain, bot, payloads):7.1f} {await per_callback(indexed, bot, payloads):6.1f}")
+        print(f"{size:>8} | {' | '.join(row)}")
+    await bot.session.close()
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000))
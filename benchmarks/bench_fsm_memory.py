@@ -0,0 +1,52 @@
+# benchmarks/bench_fsm_memory.py
+"""
+Memoria del storage FSM con una cola larga de visitantes de una sola vez.
+Cada visitante hace lo que hace /start: lee el estado y guarda nav_stack.
+Compara MemoryStorage (nunca olvida) con BoundedMemoryStorage (LRU + tope).
+
+Uso: python benchmarks/bench_fsm_memory.py [visitantes] [tope]
+"""
+
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "bot"))
+
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from fsm_storage import BoundedMemoryStorage
+
+async def visit(storage, user_id: int):
+    key = StorageKey(bot_id=1, chat_id=user_id, user_id=user_id)
+    await storage.get_state(key)
+    await storage.update_data(key, {"nav_stack": ["main"]})
+
+async def run(name: str, storage, visitors: int):
+    checkpoints = {visitors // 4, visitors // 2, visitors * 3 // 4, visitors}
+    tracemalloc.start()
+    started = time.perf_counter()
+    row = []
+    for i in range(1, visitors + 1):
+        await visit(storage, 1_000_000 + i)
+        if i in checkpoints:
+            row.append(f"{tracemalloc.get_traced_memory()[0] / 1e6:6.1f} MB")
+    elapsed = time.perf_counter() - started
+    tracemalloc.stop()
+    print(f"{name:<22} {'  '.join(row)}   ({visitors / elapsed:,.0f} visitas/s)")
+    if hasattr(storage, "stats"):
+        print(f"{'':<22} {storage.stats()}")
+
+async def main(visitors: int, cap: int):
+    print(f"Visitantes: {visitors} | memoria al 25/50/75/100%\n")
+    await run("MemoryStorage", MemoryStorage(), visitors)
+    await run("BoundedMemoryStorage", BoundedMemoryStorage(max_entries=cap), visitors)
+
+if __name__ == "__main__":
+    asyncio.run(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 200_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 10_000,
+    ))
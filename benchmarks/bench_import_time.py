@@ -0,0 +1,75 @@
+# benchmarks/bench_import_time.py
+"""
+Tiempo de importación de main (arranque en frío) con y sin videollamadas.
+Cada medida es un proceso nuevo con `python -X importtime -c "import main"`;
+se toma la mediana de N ejecuciones. aiogram domina el total y depende del
+disco, así que el presupuesto se aplica al resto (main sin aiogram). Sale con
+código 1 si, con las videollamadas desactivadas, se supera el presupuesto o
+se importa Pyrogram.
+
+Uso: python benchmarks/bench_import_time.py [presupuesto_ms] [ejecuciones]
+"""
+
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+BOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bot")
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+WATCHED = ("main", "aiogram", "handlers", "pyrogram", "videocall_handlers")
+
+def import_once(env: dict) -> dict:
+    """Tiempo acumulado (ms) de los módulos vigilados en un proceso nuevo"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BOT_DIR, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+    times = {}
+    for match in LINE.finditer(result.stderr):
+        name = match.group(4)
+        if name in WATCHED and name not in times:
+            times[name] = int(match.group(2)) / 1000
+    return times
+
+def measure(label: str, env: dict, runs: int) -> dict:
+    samples = [import_once(env) for _ in range(runs)]
+    medians = {
+        name: statistics.median(sample.get(name, 0.0) for sample in samples)
+        for name in WATCHED
+    }
+    medians["own"] = statistics.median(sample.get("main", 0.0) - sample.get("aiogram", 0.0) for sample in samples)
+    detail = "  ".join(f"{name} {medians[name]:5.0f}" for name in WATCHED[1:])
+    print(f"{label:<14} main {medians['main']:5.0f} ms | sin aiogram {medians['own']:5.0f} ms   ({detail})")
+    return medians
+
+def main(budget_ms: float, runs: int) -> int:
+    base = dict(os.environ)
+    # Variables vacías: load_dotenv no las sobrescribe con las del .env
+    disabled = {**base, "TELEGRAM_API_ID": "", "TELEGRAM_API_HASH": "", "TELEGRAM_PHONE_NUMBER": ""}
+    enabled = {**base, "TELEGRAM_API_ID": "1", "TELEGRAM_API_HASH": "bench", "TELEGRAM_PHONE_NUMBER": "1"}
+
+    print(f"Mediana de {runs} procesos, tiempo acumulado de importación (ms)\n")
+    off = measure("sin videollam.", disabled, runs)
+    on = measure("con videollam.", enabled, runs)
+    print(f"\nAhorro al desactivar videollamadas: {on['own'] - off['own']:.0f} ms")
+
+    failed = False
+    if off["pyrogram"] > 0:
+        print("❌ Pyrogram se importa aunque las videollamadas están desactivadas")
+        failed = True
+    if off["own"] > budget_ms:
+        print(f"❌ Importar main (sin aiogram) tarda {off['own']:.0f} ms (presupuesto {budget_ms:.0f} ms)")
+        failed = True
+    if not failed:
+        print(f"✅ Dentro del presupuesto de {budget_ms:.0f} ms y sin Pyrogram")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main(
+        float(sys.argv[1]) if len(sys.argv) > 1 else float(os.getenv("IMPORT_BUDGET_MS", 300)),
+        int(sys.argv[2]) if len(sys.argv) > 2 else 5,
+    ))
@@ -0,0 +1,82 @@
+# benchmarks/bench_media_dedupe.py
+"""
+Detección de archivos PPV repetidos por file_unique_id.
+Cada creador publica álbumes de 10 archivos reutilizando una fracción de su
+biblioteca. Se mide lo que cuesta en disco la columna file_unique_id con su
+índice (tamaño tras VACUUM con y sin ella) y find_duplicate_media para un
+álbum recién subido. El file_id sigue en cada fila: esto no ahorra espacio.
+
+Uso: python benchmarks/bench_media_dedupe.py [álbumes]
+"""
+
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "bot"))
+
+import database
+
+ALBUM_SIZE = 10
+CREATORS = 50
+
+def random_id(length: int) -> str:
+    return "".join(random.choices(string.ascii_letters + string.digits, k=length))
+
+def make_uploads(albums: int, reuse: float) -> list:
+    """[(creator_id, [(file_id, file_type, file_unique_id), ...]), ...] con reutilización"""
+    random.seed(7)
+    libraries = {creator_id: [] for creator_id in range(CREATORS)}
+    uploads = []
+    for _ in range(albums):
+        creator_id = random.randrange(CREATORS)
+        library = libraries[creator_id]
+        items = []
+        for _ in range(ALBUM_SIZE):
+            if library and random.random() < reuse:
+                unique_id, file_type = random.choice(library)
+            else:
+                unique_id, file_type = random_id(16), random.choice(("photo", "video"))
+                library.append((unique_id, file_type))
+            # Cada reenvío trae un file_id distinto (~80 caracteres) para el mismo archivo
+            items.append((random_id(80), file_type, unique_id))
+        uploads.append((creator_id, items))
+    return uploads
+
+def load(uploads: list, indexed: bool) -> int:
+    database.DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_media.db")
+    database.init_db()
+    for creator_id, items in uploads:
+        if not indexed:
+            items = [(file_id, file_type, None) for file_id, file_type, _ in items]
+        database.add_ppv_album(creator_id, "Álbum", "", 100, items)
+    conn = database.get_db_connection()
+    conn.execute("VACUUM")
+    conn.close()
+    return os.path.getsize(database.DB_PATH)
+
+def lookup_ms(uploads: list, lookups: int = 500) -> float:
+    """Media de find_duplicate_media por álbum sobre la última base cargada"""
+    sample = random.sample(uploads, min(lookups, len(uploads)))
+    started = time.perf_counter()
+    for creator_id, items in sample:
+        database.find_duplicate_media(creator_id, [unique_id for _, _, unique_id in items])
+    return (time.perf_counter() - started) / len(sample) * 1000
+
+def main(albums: int):
+    print(f"{albums} álbumes de {ALBUM_SIZE} archivos, {CREATORS} creadores (tamaño tras VACUUM)\n")
+    print(f"{'reutilización':>13} | {'repetidos':>9} | {'sin índice':>10} | {'con índice':>10} | {'coste':>5} | {'detección':>9}")
+    for reuse in (0.2, 0.5, 0.8):
+        uploads = make_uploads(albums, reuse)
+        files = albums * ALBUM_SIZE
+        unique = len({unique_id for _, items in uploads for _, _, unique_id in items})
+        plain = load(uploads, indexed=False)
+        indexed = load(uploads, indexed=True)
+        print(f"{reuse:>13.0%} | {files - unique:>9} | {plain / 1024:>7.0f} KB | {indexed / 1024:>7.0f} KB | "
+              f"{(indexed / plain - 1) * 100:>4.0f}% | {lookup_ms(uploads):>6.2f} ms")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
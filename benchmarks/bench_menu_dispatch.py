@@ -0,0 +1,88 @@
+# benchmarks/bench_menu_dispatch.py
+"""
+Coste de despacho por mensaje de texto según el número de botones de menú.
+Árbol sintético como el del bot: un router raíz con 7 sub-routers, comandos y
+handlers de estado FSM, y N botones repartidos entre los routers. Se mide
+dp.feed_update con el enrutado normal de aiogram y con MenuDispatch, para el
+último botón (peor caso), un botón al azar y un texto que no es botón.
+
+Uso: python benchmarks/bench_menu_dispatch.py [mensajes]
+"""
+
+import asyncio
+import datetime
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "bot"))
+
+from aiogram import Bot, Dispatcher, Router
+from aiogram.filters import Command
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.types import Update, Message, Chat, User
+
+from menu_router import MenuButton, MenuDispatch
+
+SUB_ROUTERS = 7
+
+class Flow(StatesGroup):
+    waiting = State()
+
+async def noop(message: Message):
+    pass
+
+def build_tree(buttons: int) -> Router:
+    root = Router()
+    subs = [Router() for _ in range(SUB_ROUTERS)]
+    for i, sub in enumerate(subs):
+        sub.message(Command(f"cmd{i}"))(noop)
+        sub.message(Flow.waiting)(noop)
+        root.include_router(sub)
+    owners = [root] + subs
+    for i in range(buttons):
+        owners[i % len(owners)].message(MenuButton(f"📌 Botón {i}"))(noop)
+    return root
+
+def make_update(update_id: int, text: str) -> Update:
+    user = User(id=42, is_bot=False, first_name="Fan")
+    message = Message(
+        message_id=update_id, date=datetime.datetime.now(), text=text,
+        chat=Chat(id=42, type="private"), from_user=user,
+    )
+    return Update(update_id=update_id, message=message)
+
+async def per_message(dp: Dispatcher, bot: Bot, texts) -> float:
+    updates = [make_update(i, text) for i, text in enumerate(texts)]
+    started = time.perf_counter()
+    for update in updates:
+        await dp.feed_update(bot, update)
+    return (time.perf_counter() - started) / len(updates) * 1e6
+
+async def main(messages: int):
+    bot = Bot("42:TEST")
+    print(f"Mensajes por medida: {messages} (µs/mensaje)\n")
+    print(f"{'botones':>8} | {'último':>15} | {'al azar':>15} | {'no botón':>15}")
+    print(f"{'':>8} | {'filtros  tabla':>15} | {'filtros  tabla':>15} | {'filtros  tabla':>15}")
+    for buttons in (10, 30, 100, 300, 1000):
+        scenarios = [
+            [f"📌 Botón {buttons - 1}"] * messages,
+            [f"📌 Botón {random.randrange(buttons)}" for _ in range(messages)],
+            ["hola, ¿qué tal?"] * messages,
+        ]
+        row = []
+        for texts in scenarios:
+            plain = Dispatcher()
+            plain.include_router(build_tree(buttons))
+            indexed = Dispatcher()
+            indexed.include_router(build_tree(buttons))
+            dispatch = MenuDispatch()
+            dispatch.build(indexed)
+            indexed.message.outer_middleware(dispatch)
+            row.append(f"{await per_message(plain, bot, texts):7.1f} {await per_message(indexed, bot, texts):6.1f}")
+        print(f"{buttons:>8} | {' | '.join(row)}")
+    await bot.session.close()
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000))
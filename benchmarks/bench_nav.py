@@ -0,0 +1,99 @@
+# benchmarks/bench_nav.py
+"""
+Coste por clic de menú del NavigationManager.
+Compara la implementación anterior (lista de strings, get_data + update_data
+por operación, sin tope) con la actual (string compacto, una operación) sobre
+los storages FSM disponibles. Cada "clic" es un push o un "Volver".
+
+Uso: python benchmarks/bench_nav.py [clics]
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "bot"))
+
+import database
+
+database.DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_nav.db")
+
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from fsm_storage import SQLiteStorage, BoundedMemoryStorage
+from nav_states import MenuState, NavigationManager
+
+# Datos FSM típicos de un usuario a mitad de un flujo (además del stack)
+FLOW_DATA = {
+    "display_name": "creador_demo",
+    "description": "Contenido exclusivo " * 5,
+    "subscription_price": 50,
+    "ppv_title": "Sesión de fotos",
+    "album_items": [{"file_id": "AgACAgEAAxkBAAI" + "x" * 60, "file_type": "photo"}] * 5,
+}
+
+class LegacyNavigation:
+    """Implementación anterior, copiada tal cual para comparar"""
+
+    NAV_STACK_KEY = "nav_stack"
+
+    @classmethod
+    async def push_state(cls, state, context):
+        data = await context.get_data()
+        nav_stack = data.get(cls.NAV_STACK_KEY, [])
+        nav_stack.append(state.value)
+        await context.update_data({cls.NAV_STACK_KEY: nav_stack})
+
+    @classmethod
+    async def pop_state(cls, context):
+        data = await context.get_data()
+        nav_stack = data.get(cls.NAV_STACK_KEY, [])
+        if nav_stack:
+            nav_stack.pop()
+        if nav_stack:
+            current = nav_stack[-1]
+        else:
+            current = MenuState.MAIN.value
+            nav_stack = [MenuState.MAIN.value]
+        await context.update_data({cls.NAV_STACK_KEY: nav_stack})
+        return MenuState(current)
+
+async def clicks(nav, context, count: int) -> float:
+    """Tres menús hacia dentro y uno hacia atrás: el stack crece sin parar"""
+    menus = [MenuState.CREATOR, MenuState.EXPLORE, MenuState.HELP]
+    started = time.perf_counter()
+    for i in range(count):
+        if i % 4 == 3:
+            await nav.pop_state(context)
+        else:
+            await nav.push_state(menus[i % 4], context)
+    return time.perf_counter() - started
+
+async def main(count: int):
+    database.init_db()
+    storages = [
+        ("MemoryStorage", MemoryStorage),
+        ("BoundedMemory", BoundedMemoryStorage),
+        ("SQLiteStorage", lambda: SQLiteStorage(flush_interval=3600)),
+    ]
+    print(f"Clics: {count}\n")
+    print(f"{'storage':<15} {'impl':<8} {'µs/clic':>8} {'bytes JSON':>12}")
+    for name, make_storage in storages:
+        for label, nav in (("antes", LegacyNavigation), ("ahora", NavigationManager)):
+            storage = make_storage()
+            key = StorageKey(bot_id=1, chat_id=hash((name, label)) % 10**9, user_id=1)
+            context = FSMContext(storage, key)
+            await context.set_data(FLOW_DATA)
+            elapsed = await clicks(nav, context, count)
+            size = len(json.dumps(await context.get_data(), separators=(",", ":")))
+            print(f"{name:<15} {label:<8} {elapsed / count * 1e6:8.2f} {size:12d}")
+            if hasattr(storage, "close"):
+                await storage.close()
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 20_000))
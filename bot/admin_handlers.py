@@ -2,19 +2,17 @@
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
+from aiogram.fsm.context import FSMContext
 from database import (get_admin_stats, ban_user, is_user_banned, get_creator_by_id, 
                      get_all_creators)
 from keyboards import get_admin_keyboard
-from dotenv import load_dotenv
-import os
-
-load_dotenv()
+from settings import settings, reload_settings
 
 router = Router()
 
 def is_admin(user_id: int, username: str) -> bool:
     """Verifica si el usuario es administrador"""
-    admin_username = os.getenv("ADMIN_USERNAME", "@admin")
+    admin_username = settings.admin_username
     if username:
         user_username = f"@{username}" if not username.startswith("@") else username
         return user_username == admin_username
@@ -58,7 +56,7 @@ async def show_admin_stats(callback: CallbackQuery):
         return
     
     total_creators, total_transactions, total_commission = get_admin_stats()
-    commission_usd = total_commission * float(os.getenv("EXCHANGE_RATE", 0.013))
+    commission_usd = total_commission * settings.exchange_rate
     
     text = (
         "📊 <b>ESTADÍSTICAS DETALLADAS</b>\n\n"
@@ -120,15 +118,15 @@ async def show_admin_commissions(callback: CallbackQuery):
         return
     
     total_creators, total_transactions, total_commission = get_admin_stats()
-    commission_rate = int(os.getenv("COMMISSION_PERCENTAGE", 20))
-    commission_usd = total_commission * float(os.getenv("EXCHANGE_RATE", 0.013))
+    commission_rate = settings.commission_percentage
+    commission_usd = total_commission * settings.exchange_rate
     
     text = (
         "💰 <b>GESTIÓN DE COMISIONES</b>\n\n"
         f"📊 <b>Configuración actual:</b>\n"
         f"💎 Tasa de comisión: {commission_rate}%\n"
         f"⭐️ Moneda: Telegram Stars (XTR)\n"
-        f"💱 Tasa de cambio: ${os.getenv('EXCHANGE_RATE', 0.013)} por Star\n\n"
+        f"💱 Tasa de cambio: ${settings.exchange_rate} por Star\n\n"
         f"📈 <b>Ingresos acumulados:</b>\n"
         f"⭐️ Total en Stars: {total_commission}\n"
         f"💵 Equivalente USD: ${commission_usd:.2f}\n\n"
@@ -198,10 +196,10 @@ async def show_admin_config(callback: CallbackQuery):
         await callback.answer("❌ Sin permisos de administrador", show_alert=True)
         return
     
-    commission_rate = os.getenv("COMMISSION_PERCENTAGE", "20")
-    exchange_rate = os.getenv("EXCHANGE_RATE", "0.013")
-    min_withdrawal = os.getenv("MIN_WITHDRAWAL", "1000")
-    withdrawal_mode = os.getenv("WITHDRAWAL_MODE", "REAL")
+    commission_rate = settings.commission_percentage
+    exchange_rate = settings.exchange_rate
+    min_withdrawal = settings.min_withdrawal
+    withdrawal_mode = settings.withdrawal_mode
     
     text = (
         "🔧 <b>CONFIGURACIÓN DEL SISTEMA</b>\n\n"
@@ -210,7 +208,7 @@ async def show_admin_config(callback: CallbackQuery):
         f"• Tasa de cambio: ${exchange_rate} por Star\n"
         f"• Retiro mínimo: {min_withdrawal} ⭐️\n"
         f"• Modo de retiro: {withdrawal_mode}\n"
-        f"• Admin: {os.getenv('ADMIN_USERNAME', '@admin')}\n\n"
+        f"• Admin: {settings.admin_username}\n\n"
         "⚙️ <b>Sistema OnlyStars</b>\n"
         "🗂 Base de datos: SQLite (runtime)\n"
         "💫 Powered by Telegram Stars\n"
@@ -315,7 +313,7 @@ async def admin_stats_command(message: Message):
         return
     
     total_creators, total_transactions, total_commission = get_admin_stats()
-    commission_usd = total_commission * float(os.getenv("EXCHANGE_RATE", 0.013))
+    commission_usd = total_commission * settings.exchange_rate
     
     text = (
         "📊 <b>ESTADÍSTICAS COMPLETAS DE LA PLATAFORMA</b>\n\n"
@@ -324,10 +322,214 @@ async def admin_stats_command(message: Message):
         f"💎 <b>Comisiones generadas:</b> {total_commission} ⭐️\n"
         f"💵 <b>Valor en USD:</b> ${commission_usd:.2f}\n\n"
         f"⚙️ <b>Configuración:</b>\n"
-        f"• Comisión por plataforma: {os.getenv('COMMISSION_PERCENTAGE', 20)}%\n"
-        f"• Retiro mínimo: {os.getenv('MIN_WITHDRAWAL', 1000)} ⭐️\n"
-        f"• Tasa de cambio: ${os.getenv('EXCHANGE_RATE', 0.013)}/Star\n\n"
-        f"🚀 <b>OnlyStars Bot - Administrador: {os.getenv('ADMIN_USERNAME')}</b>"
+        f"• Comisión por plataforma: {settings.commission_percentage}%\n"
+        f"• Retiro mínimo: {settings.min_withdrawal} ⭐️\n"
+        f"• Tasa de cambio: ${settings.exchange_rate}/Star\n\n"
+        f"🚀 <b>OnlyStars Bot - Administrador: {settings.admin_username}</b>"
+    )
+    
+    await message.answer(text)
+
+@router.message(Command("http_stats"))
+async def http_stats_command(message: Message):
+    """Métricas del pool HTTP de la Bot API"""
+    if not is_admin(message.from_user.id, message.from_user.username):
+        await message.answer("❌ No tienes permisos de administrador.")
+        return
+    
+    session = message.bot.session
+    if not hasattr(session, "pool_stats"):
+        await message.answer("ℹ️ La sesión HTTP actual no expone métricas.")
+        return
+    
+    text = "🌐 <b>POOL HTTP DE LA BOT API</b>\n\n"
+    for pool_name, stats in session.pool_stats().items():
+        text += (
+            f"📦 <b>{pool_name}</b> (límite {stats['limit']})\n"
+            f"• Conexiones en uso: {stats['connections_in_use']} | ociosas: {stats['connections_idle']}\n"
+            f"• Peticiones: {stats['requests']} | errores: {stats['errors']}\n"
+            f"• En curso: {stats['in_flight']} (pico {stats['peak_in_flight']})\n"
+            f"• Latencia media: {stats['avg_latency_ms']} ms | máx: {stats['max_latency_ms']} ms\n\n"
+        )
+    
+    await message.answer(text)
+
+@router.message(Command("mtproto_stats"))
+async def mtproto_stats_command(message: Message):
+    """Métricas de la cola de operaciones MTProto de videollamadas"""
+    if not is_admin(message.from_user.id, message.from_user.username):
+        await message.answer("❌ No tienes permisos de administrador.")
+        return
+    
+    if not settings.videocalls_enabled:
+        await message.answer("ℹ️ Videollamadas desactivadas: no hay cola MTProto.")
+        return
+    
+    from videocall_system import videocall_manager
+    stats = videocall_manager.queue.stats()
+    
+    text = (
+        "📡 <b>COLA MTPROTO</b>\n\n"
+        f"• En cola: {stats['queued']}/{stats['maxsize']} | workers: {stats['workers']}\n"
+        f"• Enviadas: {stats['submitted']} | completadas: {stats['completed']} | fallidas: {stats['failed']}\n"
+        f"• FloodWait: {stats['flood_waits']} ({stats['flood_seconds']}s) | reintentos: {stats['retries']}\n"
+        f"• Ventana de flood restante: {stats['flood_remaining']}s\n"
+    )
+    if stats['per_method']:
+        text += "\n<b>Por método:</b>\n"
+        for method, count in sorted(stats['per_method'].items(), key=lambda item: -item[1]):
+            text += f"• {method}: {count}\n"
+    
+    await message.answer(text)
+
+@router.message(Command("checkout_stats"))
+async def checkout_stats_command(message: Message):
+    """Latencia de pre-checkout y aciertos del índice en memoria"""
+    if not is_admin(message.from_user.id, message.from_user.username):
+        await message.answer("❌ No tienes permisos de administrador.")
+        return
+    
+    from checkout_cache import checkout_cache
+    stats = checkout_cache.stats()
+    latency = stats.pop('pre_checkout_latency')
+    
+    text = (
+        "🧾 <b>PRE-CHECKOUT</b>\n\n"
+        f"• Validaciones: {latency['count']} | media: {latency['avg_ms']} ms | máx: {latency['max_ms']} ms\n"
+        f"• p50: ≤{latency['p50_ms']} ms | p99: ≤{latency['p99_ms']} ms\n"
     )
+    if latency['count']:
+        text += "\n<b>Histograma:</b>\n"
+        for bucket, count in latency['buckets'].items():
+            if count:
+                text += f"• {bucket}: {count}\n"
+    text += "\n<b>Índice en memoria:</b>\n"
+    for name, lookup in stats.items():
+        text += f"• {name}: {lookup['entries']} entradas | aciertos: {lookup['hits']} | fallos: {lookup['misses']}\n"
+    
+    await message.answer(text)
+
+@router.message(Command("event_stats"))
+async def event_stats_command(message: Message):
+    """Colas del bus de eventos y pagos liquidados desde el arranque"""
+    if not is_admin(message.from_user.id, message.from_user.username):
+        await message.answer("❌ No tienes permisos de administrador.")
+        return
+    
+    from event_bus import event_bus
+    from payment_subscribers import payment_stats
+    payments = payment_stats.as_dict()
+    
+    text = "📬 <b>BUS DE EVENTOS</b>\n\n"
+    for name, stats in event_bus.stats().items():
+        text += f"• {name} ({stats['event']}): en cola {stats['queued']} | ok {stats['processed']} | fallos {stats['failed']}\n"
+    text += "\n<b>Pagos liquidados:</b>\n"
+    for kind, count in payments['payments'].items():
+        text += f"• {kind}: {count} pagos | {payments['stars'][kind]} ⭐️ | comisión {payments['commission'][kind]} ⭐️\n"
+    text += (
+        f"\n• Suscripciones otorgadas: {payments['subscriptions_granted']}\n"
+        f"• Contenidos entregados: {payments['contents_delivered']}\n"
+    )
+    
+    from outbox_relay import outbox_relay
+    outbox = outbox_relay.stats()
+    text += (
+        "\n<b>Outbox:</b>\n"
+        f"• Pendientes: {outbox['pending']} | fallidos: {outbox['failed_total']}\n"
+        f"• Enviados: {outbox['sent']} | reintentos: {outbox['retried']} | descartados: {outbox['failed']}\n"
+    )
+    
+    await message.answer(text)
+
+@router.message(Command("fsm_stats"))
+async def fsm_stats_command(message: Message, state: FSMContext):
+    """Contextos FSM en memoria, volcados y desalojos del storage activo"""
+    if not is_admin(message.from_user.id, message.from_user.username):
+        await message.answer("❌ No tienes permisos de administrador.")
+        return
+    
+    stats = state.storage.stats() if hasattr(state.storage, "stats") else {}
+    text = f"🗂️ <b>STORAGE FSM</b> ({type(state.storage).__name__})\n\n"
+    for name, value in stats.items():
+        text += f"• {name}: {value}\n"
+    
+    await message.answer(text)
+
+@router.message(Command("menu_stats"))
+async def menu_stats_command(message: Message):
+    """Botones indexados en la tabla de menú y mensajes despachados por ella"""
+    if not is_admin(message.from_user.id, message.from_user.username):
+        await message.answer("❌ No tienes permisos de administrador.")
+        return
+    
+    from menu_router import menu_dispatch
+    stats = menu_dispatch.stats()
+    text = (
+        "🧭 <b>TABLA DE MENÚ</b>\n\n"
+        f"• Botones indexados: {stats['buttons']}\n"
+        f"• Despachados por tabla: {stats['hits']}\n"
+        f"• Enrutado normal: {stats['fallthrough']}\n"
+    )
+    
+    await message.answer(text)
+
+@router.message(Command("callback_stats"))
+async def callback_stats_command(message: Message):
+    """Familias de callbacks indexadas y callbacks despachados por el índice"""
+    if not is_admin(message.from_user.id, message.from_user.username):
+        await message.answer("❌ No tienes permisos de administrador.")
+        return
+    
+    from callbacks import callback_dispatch
+    stats = callback_dispatch.stats()
+    text = (
+        "🔘 <b>ÍNDICE DE CALLBACKS</b>\n\n"
+        f"• Familias indexadas: {stats['families']}\n"
+        f"• Despachados por índice: {stats['hits']} (formato antiguo: {stats['legacy_hits']})\n"
+        f"• Enrutado normal: {stats['fallthrough']}\n"
+    )
+    
+    await message.answer(text)
+
+@router.message(Command("media_stats"))
+async def media_stats_command(message: Message):
+    """Archivos publicados en contenido PPV frente a archivos distintos (por file_unique_id)"""
+    if not is_admin(message.from_user.id, message.from_user.username):
+        await message.answer("❌ No tienes permisos de administrador.")
+        return
+    
+    from database import get_media_stats
+    unique_files, published = get_media_stats()
+    text = (
+        "🗂 <b>ARCHIVOS PPV</b>\n\n"
+        f"• Archivos publicados: {published}\n"
+        f"• Archivos distintos: {unique_files}\n"
+        f"• Republicados: {published - unique_files}\n"
+    )
+    
+    await message.answer(text)
+
+@router.message(Command("reload_settings"))
+async def reload_settings_command(message: Message):
+    """Relee el .env y aplica comisión, tasa de cambio, retiro mínimo, etc. sin reiniciar"""
+    if not is_admin(message.from_user.id, message.from_user.username):
+        await message.answer("❌ No tienes permisos de administrador.")
+        return
+    
+    try:
+        applied, pending = reload_settings()
+    except ValueError as e:
+        await message.answer(f"❌ Configuración no válida, se mantiene la actual:\n{e}")
+        return
     
-    await message.answer(text)
\ No newline at end of file
+    text = "🔄 <b>CONFIGURACIÓN RECARGADA</b>\n\n"
+    if not applied and not pending:
+        text += "Sin cambios.\n"
+    for name, (before, after) in applied.items():
+        text += f"• {name}: {before} → {after}\n"
+    if pending:
+        text += "\n⚠️ <b>Requieren reinicio:</b>\n"
+        for name in pending:
+            text += f"• {name}\n"
+    
+    await message.answer(text)
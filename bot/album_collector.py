@@ -0,0 +1,66 @@
+# bot/album_collector.py
+"""
+Agrupador de álbumes de Telegram
+Un álbum llega como N mensajes sueltos con el mismo media_group_id. El
+primer handler que lo recibe espera a que deje de llegar material durante
+ALBUM_DEBOUNCE segundos y recibe el álbum completo; los demás mensajes solo
+se añaden al búfer. Así el álbum se procesa y se responde una sola vez.
+Requiere que el dispatcher procese las actualizaciones como tareas
+concurrentes (comportamiento por defecto de start_polling)
+"""
+
+import asyncio
+import os
+from typing import Dict, List, Optional, Tuple
+
+from aiogram.types import Message
+
+ALBUM_DEBOUNCE = float(os.getenv("ALBUM_DEBOUNCE", 0.6))
+
+class AlbumCollector:
+    """Búfer de mensajes por (chat, media_group_id) con espera deslizante"""
+
+    def __init__(self, debounce: float = ALBUM_DEBOUNCE):
+        self.debounce = debounce
+        self._groups: Dict[Tuple[int, str], List[Message]] = {}
+        self._last_seen: Dict[Tuple[int, str], float] = {}
+        self.albums = 0
+        self.buffered = 0
+
+    async def collect(self, message: Message) -> Optional[List[Message]]:
+        """Lista de mensajes del álbum ordenada, o None si otro handler lo procesa
+
+        Un mensaje sin media_group_id se devuelve solo y sin espera
+        """
+        if not message.media_group_id:
+            return [message]
+        key = (message.chat.id, message.media_group_id)
+        loop = asyncio.get_running_loop()
+        self._last_seen[key] = loop.time()
+        group = self._groups.get(key)
+        if group is not None:
+            group.append(message)
+            self.buffered += 1
+            return None
+        self._groups[key] = [message]
+        try:
+            while True:
+                delay = self._last_seen[key] + self.debounce - loop.time()
+                if delay <= 0:
+                    break
+                await asyncio.sleep(delay)
+        finally:
+            messages = self._groups.pop(key)
+            self._last_seen.pop(key, None)
+        self.albums += 1
+        return sorted(messages, key=lambda item: item.message_id)
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._groups),
+            "albums": self.albums,
+            "buffered": self.buffered,
+        }
+
+# Instancia global del agrupador de álbumes
+album_collector = AlbumCollector()
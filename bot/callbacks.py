@@ -0,0 +1,199 @@
+# bot/callbacks.py
+"""
+Esquemas tipados de callback_data y despacho indexado por prefijo
+Cada familia de botones inline con parámetros tiene su CallbackData: los
+teclados la construyen con .pack() y los handlers la filtran con .filter()
+y la reciben ya parseada en callback_data. aiogram limita el callback_data
+a 64 bytes y .pack() falla si se supera.
+
+CallbackDispatch, como middleware externo de callback_query, resuelve la
+familia con un dict prefijo -> handler en vez de probar los filtros uno a
+uno; los callbacks sin familia (F.data == "...") siguen el enrutado normal.
+También acepta el formato anterior "prefijo_<n>" de botones ya enviados
+"""
+
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, Type
+
+from aiogram import BaseMiddleware, Router
+from aiogram.dispatcher.event.handler import HandlerObject
+from aiogram.filters.callback_data import CallbackData, CallbackQueryFilter
+from aiogram.types import CallbackQuery
+
+logger = logging.getLogger(__name__)
+
+# === REGISTRO DE CREADORES ===
+
+class SubscriptionPrice(CallbackData, prefix="price"):
+    price: int
+
+# === EXPLORAR Y SUSCRIBIRSE ===
+
+class Subscribe(CallbackData, prefix="subscribe"):
+    creator_id: int
+
+class ConfirmSubscription(CallbackData, prefix="confirm_sub"):
+    creator_id: int
+
+class CreatorPage(CallbackData, prefix="creator_page"):
+    """Cursor de la tarjeta de creadores: página de destino"""
+    page: int
+
+# === BALANCE ===
+
+class ConfirmWithdraw(CallbackData, prefix="confirm_withdraw"):
+    amount: int
+
+# === CATÁLOGOS Y PPV ===
+
+class DeleteContent(CallbackData, prefix="delete_content"):
+    content_id: int
+
+class ConfirmDelete(CallbackData, prefix="confirm_delete"):
+    content_id: int
+
+class ViewCatalog(CallbackData, prefix="view_catalog"):
+    creator_id: int
+
+class ShowPurchased(CallbackData, prefix="show_purchased"):
+    content_id: int
+
+class BuyCatalogPPV(CallbackData, prefix="buy_catalog_ppv"):
+    content_id: int
+
+# === VIDEOLLAMADAS ===
+
+class VcSelectCreator(CallbackData, prefix="vc_select_creator"):
+    creator_id: int
+
+class VcDuration(CallbackData, prefix="vc_duration"):
+    creator_id: int
+    duration: int
+    price: int
+
+class VcPay(CallbackData, prefix="vc_pay"):
+    creator_id: int
+    duration: int
+    price: int
+
+class VcQueue(CallbackData, prefix="vc_queue"):
+    creator_id: int
+    entry_id: int
+
+class VcLeaveQueue(CallbackData, prefix="vc_leave_queue"):
+    entry_id: int
+
+class VcSchedule(CallbackData, prefix="vc_schedule"):
+    creator_id: int
+
+class VcSlots(CallbackData, prefix="vc_slots"):
+    creator_id: int
+    duration: int
+
+class VcBook(CallbackData, prefix="vc_book"):
+    creator_id: int
+    duration: int
+    start_at: int
+
+# Formato anterior "prefijo_<n>" (botones que ya están en chats) -> esquema actual
+LEGACY_PREFIXES: Dict[str, Callable[[int], CallbackData]] = {
+    "price": lambda value: SubscriptionPrice(price=value),
+    "subscribe": lambda value: Subscribe(creator_id=value),
+    "confirm_sub": lambda value: ConfirmSubscription(creator_id=value),
+    "creator_next": lambda page: CreatorPage(page=page + 1),
+    "creator_prev": lambda page: CreatorPage(page=page - 1),
+    "confirm_withdraw": lambda value: ConfirmWithdraw(amount=value),
+    "delete_content": lambda value: DeleteContent(content_id=value),
+    "confirm_delete": lambda value: ConfirmDelete(content_id=value),
+    "view_catalog": lambda value: ViewCatalog(creator_id=value),
+    "show_purchased": lambda value: ShowPurchased(content_id=value),
+    "buy_catalog_ppv": lambda value: BuyCatalogPPV(content_id=value),
+}
+
+def parse_legacy(data: str) -> Optional[CallbackData]:
+    """Convierte un callback_data antiguo "prefijo_<n>"; None si no lo es"""
+    prefix, _, value = data.rpartition("_")
+    factory = LEGACY_PREFIXES.get(prefix)
+    if factory is None or not value.isdigit():
+        return None
+    return factory(int(value))
+
+def _callback_schema(handler: HandlerObject) -> Optional[Type[CallbackData]]:
+    """Esquema si el único filtro del handler es Esquema.filter() sin regla extra"""
+    if handler.filters and len(handler.filters) == 1:
+        callback_filter = handler.filters[0].callback
+        if isinstance(callback_filter, CallbackQueryFilter) and callback_filter.rule is None:
+            return callback_filter.callback_data
+    return None
+
+class CallbackDispatch(BaseMiddleware):
+    """Middleware externo con el índice prefijo -> (esquema, handler) de callbacks tipados"""
+
+    def __init__(self):
+        self._index: Dict[str, tuple] = {}
+        self.hits = 0
+        self.legacy_hits = 0
+        self.fallthrough = 0
+
+    def build(self, root: Router) -> int:
+        """Indexa las familias del árbol; gana el primer handler en orden de aiogram"""
+        self._index.clear()
+        self._collect(root)
+        logger.info(f"✅ Índice de callbacks: {len(self._index)} familias")
+        return len(self._index)
+
+    def _collect(self, router: Router):
+        for handler in router.callback_query.handlers:
+            schema = _callback_schema(handler)
+            if schema is not None:
+                self._index.setdefault(schema.__prefix__, (schema, handler))
+        for sub_router in router.sub_routers:
+            self._collect(sub_router)
+
+    def resolve(self, data: Optional[str]):
+        """(callback_data, handler) para el texto del callback, o None si no es de una familia"""
+        if not data:
+            return None
+        prefix, separator, _ = data.partition(":")
+        if separator:
+            entry = self._index.get(prefix)
+            if entry is None:
+                return None
+            schema, handler = entry
+            try:
+                return schema.unpack(data), handler
+            except (TypeError, ValueError):
+                return None
+        callback_data = parse_legacy(data)
+        if callback_data is None:
+            return None
+        entry = self._index.get(callback_data.__prefix__)
+        if entry is None:
+            return None
+        self.legacy_hits += 1
+        return callback_data, entry[1]
+
+    async def __call__(
+        self,
+        handler: Callable[[CallbackQuery, Dict[str, Any]], Awaitable[Any]],
+        event: CallbackQuery,
+        data: Dict[str, Any],
+    ) -> Any:
+        resolved = self.resolve(event.data)
+        if resolved is None:
+            self.fallthrough += 1
+            return await handler(event, data)
+        self.hits += 1
+        data["callback_data"], data["handler"] = resolved
+        return await resolved[1].call(event, **data)
+
+    def stats(self) -> dict:
+        return {
+            "families": len(self._index),
+            "hits": self.hits,
+            "legacy_hits": self.legacy_hits,
+            "fallthrough": self.fallthrough,
+        }
+
+# Instancia global del despacho de callbacks
+callback_dispatch = CallbackDispatch()
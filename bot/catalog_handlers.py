@@ -1,72 +1,112 @@
 # bot/catalog_handlers.py
-from aiogram import Router, F
-from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery, InputMediaPhoto, InputMediaVideo, LabeledPrice
+from aiogram import Bot, Router, F
+from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery, InputMediaPhoto, InputMediaVideo, LabeledPrice, PaidMediaPurchased
 from aiogram.utils.media_group import MediaGroupBuilder
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from database import (get_creator_by_id, is_user_banned, get_active_subscriptions, 
                      get_ppv_by_creator, has_purchased_ppv, get_ppv_content, get_ppv_album_items,
-                     add_ppv_purchase, add_transaction, update_balance)
-import time
+                     add_ppv_purchase, add_transaction, update_balance,
+                     add_paid_media_tracking, get_paid_media_tracking, delete_paid_media_tracking,
+                     purge_expired_paid_media_tracking)
+from payment_router import encode_payload
+from settings import settings
+from callbacks import ViewCatalog, ShowPurchased, BuyCatalogPPV
+import asyncio
+import logging
+import secrets
 import os
 import math
 
-COMMISSION_PERCENTAGE = int(os.getenv("COMMISSION_PERCENTAGE", 20))
-
+logger = logging.getLogger(__name__)
 router = Router()
 
-# Handler para procesar compras de Paid Media (CORREGIDO para usar paid_media_purchased)
-@router.message(F.paid_media_purchased)
-async def process_paid_media_purchase(message: Message):
+# Los Paid Media enviados desde el catálogo se registran en la tabla paid_media_tracking
+# con un payload único que Telegram devuelve en el update purchased_paid_media
+PAID_MEDIA_TRACKING_TTL = int(os.getenv("PAID_MEDIA_TRACKING_TTL", 7 * 24 * 60 * 60))
+PAID_MEDIA_SWEEP_INTERVAL = int(os.getenv("PAID_MEDIA_SWEEP_INTERVAL", 60 * 60))
+
+def new_paid_media_payload() -> str:
+    """Genera un payload único para un envío de Paid Media (máximo 128 bytes)"""
+    return f"pm_{secrets.token_urlsafe(16)}"
+
+def track_paid_media(payload: str, content, buyer_id: int, price_stars: int, album_type: str):
+    """Guarda el tracking de un Paid Media enviado a un comprador"""
+    add_paid_media_tracking(
+        payload=payload,
+        content_id=content[0],
+        creator_id=content[1],  # creator_id
+        buyer_id=buyer_id,
+        price_stars=price_stars,
+        album_type=album_type,
+        ttl_seconds=PAID_MEDIA_TRACKING_TTL
+    )
+
+async def sweep_paid_media_tracking(interval: int = PAID_MEDIA_SWEEP_INTERVAL):
+    """Tarea en segundo plano que elimina periódicamente el tracking vencido"""
+    while True:
+        try:
+            deleted = purge_expired_paid_media_tracking()
+            if deleted:
+                logger.info(f"🧹 Paid Media tracking: {deleted} registros vencidos eliminados")
+        except Exception as e:
+            logger.error(f"❌ Error limpiando tracking de Paid Media: {e}")
+        await asyncio.sleep(interval)
+
+# Handler para procesar compras de Paid Media (update purchased_paid_media de la Bot API)
+@router.purchased_paid_media()
+async def process_paid_media_purchase(purchase: PaidMediaPurchased, bot: Bot):
     """Procesa compras exitosas de Paid Media desde el catálogo"""
-    # IMPORTANTE: Este handler ahora usa paid_media_purchased (correcto para Paid Media)
-    # Las compras por factura (/comprar_ppv) se manejan en ppv_handlers.py
-    
-    # Verificar si hay información de Paid Media tracking
-    if hasattr(message.bot, '_paid_media_tracking'):
-        # Buscar si este mensaje corresponde a una compra de Paid Media
-        # En un bot real, esto se haría consultando una tabla en DB
-        for message_id, tracking_info in message.bot._paid_media_tracking.items():
-            if tracking_info['buyer_id'] == message.from_user.id:
-                # Procesar la compra
-                content_id = tracking_info['content_id']
-                creator_id = tracking_info['creator_id']
-                price_stars = tracking_info['price_stars']
-                album_type = tracking_info['album_type']
-                
-                # Verificar si ya fue comprado (evitar duplicados) y usar return value seguro
-                purchase_added = add_ppv_purchase(message.from_user.id, content_id)
-                if purchase_added:
-                    # Calcular comisión y ganancia del creador
-                    # CRÍTICO: Asegurar comisión mínima para evitar fuga en montos pequeños
-                    commission = max(1, math.ceil(price_stars * COMMISSION_PERCENTAGE / 100)) if price_stars > 0 else 0
-                    creator_earnings = price_stars - commission
-                    
-                    # Actualizar balance del creador
-                    update_balance(creator_id, creator_earnings)
-                    
-                    # Registrar transacción
-                    add_transaction(message.from_user.id, creator_id, price_stars, commission, "ppv")
-                    
-                    # Confirmar compra al usuario
-                    content_type = "📁 Álbum" if album_type == 'album' else "📸 Contenido"
-                    await message.answer(
-                        f"✅ <b>¡Compra exitosa via Paid Media!</b>\n\n"
-                        f"💰 Pagaste: {price_stars} ⭐️\n"
-                        f"📦 {content_type} desbloqueado\n\n"
-                        f"💡 Ahora puedes ver este contenido en /mis_catalogos"
-                    )
-                else:
-                    # Ya fue comprado, solo confirmar
-                    await message.answer(
-                        f"✅ <b>Contenido ya desbloqueado</b>\n\n"
-                        f"💡 Puedes ver este contenido en /mis_catalogos"
-                    )
-                
-                # Limpiar tracking
-                del message.bot._paid_media_tracking[message_id]
-                break
+    # IMPORTANTE: Las compras por factura (/comprar_ppv) se manejan en ppv_handlers.py
+    buyer_id = purchase.from_user.id
+    
+    # Búsqueda directa por payload (clave primaria)
+    tracking = get_paid_media_tracking(purchase.paid_media_payload)
+    if not tracking:
+        logger.warning(f"⚠️ Compra de Paid Media sin tracking: {purchase.paid_media_payload}")
+        return
+    
+    _, content_id, creator_id, tracked_buyer_id, price_stars, album_type = tracking
+    
+    # CRÍTICO: El payload solo es válido para el usuario al que se envió
+    if tracked_buyer_id != buyer_id:
+        logger.warning(f"⚠️ Payload {purchase.paid_media_payload} usado por otro usuario: {buyer_id}")
+        return
+    
+    # Verificar si ya fue comprado (evitar duplicados) y usar return value seguro
+    purchase_added = add_ppv_purchase(buyer_id, content_id)
+    if purchase_added:
+        # Calcular comisión y ganancia del creador
+        # CRÍTICO: Asegurar comisión mínima para evitar fuga en montos pequeños
+        commission = max(1, math.ceil(price_stars * settings.commission_percentage / 100)) if price_stars > 0 else 0
+        creator_earnings = price_stars - commission
+        
+        # Actualizar balance del creador
+        update_balance(creator_id, creator_earnings)
+        
+        # Registrar transacción
+        add_transaction(buyer_id, creator_id, price_stars, commission, "ppv")
+        
+        # Confirmar compra al usuario
+        content_type = "📁 Álbum" if album_type == 'album' else "📸 Contenido"
+        await bot.send_message(
+            buyer_id,
+            f"✅ <b>¡Compra exitosa via Paid Media!</b>\n\n"
+            f"💰 Pagaste: {price_stars} ⭐️\n"
+            f"📦 {content_type} desbloqueado\n\n"
+            f"💡 Ahora puedes ver este contenido en /mis_catalogos"
+        )
+    else:
+        # Ya fue comprado, solo confirmar
+        await bot.send_message(
+            buyer_id,
+            f"✅ <b>Contenido ya desbloqueado</b>\n\n"
+            f"💡 Puedes ver este contenido en /mis_catalogos"
+        )
+    
+    # Limpiar tracking
+    delete_paid_media_tracking(purchase.paid_media_payload)
 
 class CatalogStates(StatesGroup):
     viewing_catalog = State()
@@ -118,7 +158,7 @@ async def build_catalogs_view(user_id: int) -> dict:
             keyboard.append([
                 InlineKeyboardButton(
                     text=f"📺 Ver catálogo de {display_name}", 
-                    callback_data=f"view_catalog_{creator_id}"
+                    callback_data=ViewCatalog(creator_id=creator_id).pack()
                 )
             ])
     
@@ -144,20 +184,19 @@ async def show_my_catalogs(message: Message, state: FSMContext):
         reply_markup=catalog_data["keyboard"]
     )
 
-@router.callback_query(F.data.startswith("view_catalog_"))
-async def show_creator_catalog(callback: CallbackQuery, state: FSMContext):
+@router.callback_query(ViewCatalog.filter())
+async def show_creator_catalog(callback: CallbackQuery, callback_data: ViewCatalog, state: FSMContext):
     """Muestra el catálogo PPV de un creador específico"""
     await callback.answer()
     
-    if not callback.message or not callback.from_user or not callback.data:
+    if not callback.message or not callback.from_user:
         return
         
     if is_user_banned(callback.from_user.id):
         await callback.message.edit_text("❌ Tu cuenta está baneada.")
         return
     
-    # Extraer el creator_id del callback_data
-    creator_id = int(callback.data.split("_")[2])
+    creator_id = callback_data.creator_id
     
     # Verificar que el usuario tenga suscripción activa a este creador
     subscriptions = get_active_subscriptions(callback.from_user.id)
@@ -304,35 +343,20 @@ async def send_paid_content_individual(callback: CallbackQuery, paid_content: li
                 if paid_media_items:
                     caption = description if description and description.strip() else None
                     
+                    # Registrar tracking antes de enviar para que la compra nunca llegue sin registro
+                    payload = new_paid_media_payload()
+                    track_paid_media(payload, content, callback.from_user.id, validated_price, album_type)
+                    
                     # Single call to send_paid_media for the entire album
-                    paid_message = await callback.message.bot.send_paid_media(
+                    await callback.message.bot.send_paid_media(
                         chat_id=callback.message.chat.id,
                         star_count=validated_price,
                         media=paid_media_items,
-                        caption=caption
+                        caption=caption,
+                        payload=payload
                     )
                     
-                    # Tracking verification - ensure tracking is saved correctly
-                    if not hasattr(callback.message.bot, '_paid_media_tracking'):
-                        callback.message.bot._paid_media_tracking = {}
-                    
-                    tracking_data = {
-                        'content_id': content_id,
-                        'creator_id': content[1],  # creator_id
-                        'buyer_id': callback.from_user.id,
-                        'price_stars': validated_price,
-                        'album_type': album_type,
-                        'timestamp': time.time(),  # CRÍTICO: Timestamp para correlación segura
-                        'album_items_count': len(album_items)  # Para verificación adicional
-                    }
-                    
-                    callback.message.bot._paid_media_tracking[paid_message.message_id] = tracking_data
-                    
-                    # Verify tracking was saved correctly
-                    if paid_message.message_id in callback.message.bot._paid_media_tracking:
-                        print(f"✅ Enviado álbum paid media {content_id}: {validated_price} ⭐️ ({len(album_items)} items)")
-                    else:
-                        print(f"⚠️ Error en tracking para álbum {content_id}")
+                    print(f"✅ Enviado álbum paid media {content_id}: {validated_price} ⭐️ ({len(album_items)} items)")
                         
             else:
                 # Contenido individual (compatibilidad hacia atrás)
@@ -345,33 +369,18 @@ async def send_paid_content_individual(callback: CallbackQuery, paid_content: li
                 if paid_media_items and price_stars > 0:
                     caption = description if description and description.strip() else None
                     
-                    paid_message = await callback.message.bot.send_paid_media(
+                    payload = new_paid_media_payload()
+                    track_paid_media(payload, content, callback.from_user.id, price_stars, album_type)
+                    
+                    await callback.message.bot.send_paid_media(
                         chat_id=callback.message.chat.id,
                         star_count=price_stars,
                         media=paid_media_items,
-                        caption=caption
+                        caption=caption,
+                        payload=payload
                     )
                     
-                    # Tracking verification for individual content
-                    if not hasattr(callback.message.bot, '_paid_media_tracking'):
-                        callback.message.bot._paid_media_tracking = {}
-                    
-                    tracking_data = {
-                        'content_id': content_id,
-                        'creator_id': content[1],  # creator_id
-                        'buyer_id': callback.from_user.id,
-                        'price_stars': price_stars,
-                        'album_type': album_type,
-                        'timestamp': time.time()  # CRÍTICO: Timestamp para correlación segura
-                    }
-                    
-                    callback.message.bot._paid_media_tracking[paid_message.message_id] = tracking_data
-                    
-                    # Verify tracking was saved correctly
-                    if paid_message.message_id in callback.message.bot._paid_media_tracking:
-                        print(f"✅ Enviado paid media individual {content_id}: {price_stars} ⭐️")
-                    else:
-                        print(f"⚠️ Error en tracking para contenido {content_id}")
+                    print(f"✅ Enviado paid media individual {content_id}: {price_stars} ⭐️")
                 
         except Exception as e:
             # Solo usar fallback para este contenido específico si hay un error real
@@ -416,7 +425,7 @@ async def send_purchased_content_individual(callback: CallbackQuery, purchased_c
                 )
             else:
                 # Contenido individual (compatibilidad hacia atrás)
-                keyboard = [[InlineKeyboardButton(text="👁️ Ver contenido completo", callback_data=f"show_purchased_{content_id}")]]
+                keyboard = [[InlineKeyboardButton(text="👁️ Ver contenido completo", callback_data=ShowPurchased(content_id=content_id).pack())]]
                 reply_markup = InlineKeyboardMarkup(inline_keyboard=keyboard)
                 
                 if file_type == "photo":
@@ -457,11 +466,11 @@ async def send_content_album_fallback(callback: CallbackQuery, content_list: lis
         
         if already_purchased:
             caption = description if description and description.strip() else None
-            keyboard = [[InlineKeyboardButton(text="👁️ Ver contenido completo", callback_data=f"show_purchased_{content_id}")]]
+            keyboard = [[InlineKeyboardButton(text="👁️ Ver contenido completo", callback_data=ShowPurchased(content_id=content_id).pack())]]
             has_spoiler = False
         else:
             caption = description if description and description.strip() else None
-            keyboard = [[InlineKeyboardButton(text=f"🛒 Comprar por {price_stars} ⭐️", callback_data=f"buy_catalog_ppv_{content_id}")]]
+            keyboard = [[InlineKeyboardButton(text=f"🛒 Comprar por {price_stars} ⭐️", callback_data=BuyCatalogPPV(content_id=content_id).pack())]]
             has_spoiler = True
         
         reply_markup = InlineKeyboardMarkup(inline_keyboard=keyboard)
@@ -493,12 +502,12 @@ async def send_content_album_fallback(callback: CallbackQuery, content_list: lis
 
 # Función de navegación eliminada - ya no es necesaria con el nuevo diseño de canal
 
-@router.callback_query(F.data.startswith("show_purchased_"))
-async def show_purchased_content(callback: CallbackQuery):
+@router.callback_query(ShowPurchased.filter())
+async def show_purchased_content(callback: CallbackQuery, callback_data: ShowPurchased):
     """Muestra contenido ya comprado sin spoiler"""
     await callback.answer()
     
-    content_id = int(callback.data.split("_")[2])
+    content_id = callback_data.content_id
     
     # Verificar que realmente haya comprado el contenido
     if not has_purchased_ppv(callback.from_user.id, content_id):
@@ -557,7 +566,7 @@ async def process_ppv_purchase(user_id: int, content_id: int, bot, chat_id: int,
         chat_id=chat_id,
         title=f"Contenido PPV: {title}",
         description=description,
-        payload=f"ppv_{content_id}_{user_id}",
+        payload=encode_payload("ppv", content_id, user_id),
         provider_token="",
         currency="XTR",
         prices=[LabeledPrice(label="Contenido PPV", amount=price_stars)],
@@ -570,15 +579,15 @@ async def process_ppv_purchase(user_id: int, content_id: int, bot, chat_id: int,
         reply_to_message_id=message_id
     )
 
-@router.callback_query(F.data.startswith("buy_catalog_ppv_"))
-async def buy_catalog_ppv(callback: CallbackQuery):
+@router.callback_query(BuyCatalogPPV.filter())
+async def buy_catalog_ppv(callback: CallbackQuery, callback_data: BuyCatalogPPV):
     """Comprar contenido PPV desde el catálogo"""
     await callback.answer()
     
     if not callback.from_user or not callback.message:
         return
     
-    content_id = int(callback.data.split("_")[3])
+    content_id = callback_data.content_id
     
     # Usar la función reutilizable para procesar la compra
     await process_ppv_purchase(
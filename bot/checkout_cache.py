@@ -0,0 +1,138 @@
+# bot/checkout_cache.py
+"""
+Índice en memoria para validar pre_checkout_query
+Precios y dueños de contenido PPV, precios de suscripción y de videollamada,
+baneos y compras. Las funciones de escritura de database.py lo mantienen al
+día y SQLite solo se consulta ante un fallo o una entrada caducada; el TTL
+acota cuánto puede quedar desactualizado frente a escrituras de otro proceso
+"""
+
+import os
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Hashable, Optional
+
+CHECKOUT_CACHE_TTL = int(os.getenv("CHECKOUT_CACHE_TTL", 300))
+CHECKOUT_CACHE_MAX_ENTRIES = int(os.getenv("CHECKOUT_CACHE_MAX_ENTRIES", 50000))
+
+class CachedLookup:
+    """Mapa clave -> valor con TTL; ante un fallo consulta el loader y guarda el resultado (también None)"""
+
+    def __init__(self, name: str, ttl: float, max_entries: int):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.loader: Optional[Callable] = None
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[Hashable, tuple] = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] > time.monotonic():
+            self.hits += 1
+            return entry[0]
+        self.misses += 1
+        value = self.loader(key)
+        self.set(key, value)
+        return value
+
+    def set(self, key, value):
+        if key not in self._entries and len(self._entries) >= self.max_entries:
+            # Desaloja la entrada más antigua (orden de inserción del dict)
+            del self._entries[next(iter(self._entries))]
+        self._entries[key] = (value, time.monotonic() + self.ttl)
+
+    def invalidate(self, key):
+        self._entries.pop(key, None)
+
+    def discard_where(self, predicate: Callable[[Hashable], bool]):
+        for key in [key for key in self._entries if predicate(key)]:
+            del self._entries[key]
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+class LatencyHistogram:
+    """Histograma de latencias en milisegundos con cubetas fijas"""
+
+    BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, elapsed_ms: float):
+        self.counts[bisect_left(self.BUCKETS_MS, elapsed_ms)] += 1
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Cota superior de la cubeta que contiene el percentil p (0-100)"""
+        if not self.count:
+            return None
+        target = self.count * p / 100
+        seen = 0
+        for bound, count in zip(self.BUCKETS_MS, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return self.max_ms
+
+    def as_dict(self) -> dict:
+        buckets = {f"<={bound}ms": count for bound, count in zip(self.BUCKETS_MS, self.counts)}
+        buckets[f">{self.BUCKETS_MS[-1]}ms"] = self.counts[-1]
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total_ms / self.count, 2) if self.count else 0.0,
+            "p50_ms": self.percentile(50),
+            "p99_ms": self.percentile(99),
+            "max_ms": round(self.max_ms, 2),
+            "buckets": buckets,
+        }
+
+class CheckoutCache:
+    """Datos que necesita cada pre-checkout, servidos desde memoria"""
+
+    def __init__(self, ttl: float = CHECKOUT_CACHE_TTL, max_entries: int = CHECKOUT_CACHE_MAX_ENTRIES):
+        # user_id -> bool
+        self.banned = CachedLookup("banned", ttl, max_entries)
+        # creator_id -> precio de suscripción, o None si el creador no existe
+        self.creators = CachedLookup("creators", ttl, max_entries)
+        # content_id -> (creator_id, price_stars), o None si el contenido no existe
+        self.ppv = CachedLookup("ppv", ttl, max_entries)
+        # (buyer_id, content_id) -> bool
+        self.purchases = CachedLookup("purchases", ttl, max_entries)
+        # creator_id -> (enabled, price_10, price_30, price_60), o None si no configuró videollamadas
+        self.videocall = CachedLookup("videocall", ttl, max_entries)
+        self.pre_checkout_latency = LatencyHistogram()
+
+    @property
+    def lookups(self):
+        return (self.banned, self.creators, self.ppv, self.purchases, self.videocall)
+
+    def bind(self, **loaders):
+        """Asigna la consulta a SQLite de cada índice (la hace database.py)"""
+        for name, loader in loaders.items():
+            getattr(self, name).loader = loader
+
+    def clear(self):
+        for lookup in self.lookups:
+            lookup.clear()
+
+    def stats(self) -> dict:
+        stats = {lookup.name: lookup.stats() for lookup in self.lookups}
+        stats["pre_checkout_latency"] = self.pre_checkout_latency.as_dict()
+        return stats
+
+# Instancia global del índice de pre-checkout
+checkout_cache = CheckoutCache()
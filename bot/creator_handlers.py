@@ -8,14 +8,13 @@ from database import (add_creator, get_creator_by_id, get_all_creators, get_avai
                      get_user_balance, withdraw_balance, add_ppv_content, is_user_banned,
                      update_creator_display_name, update_creator_description, 
                      update_creator_subscription_price, update_creator_photo,
-                     add_ppv_album_item, add_subscriber)
-from dotenv import load_dotenv
+                     add_ppv_album, add_subscriber, find_duplicate_media)
+from settings import settings
 from keyboards import get_creator_card_keyboard, get_subscription_confirmation_keyboard
-import os
+from callbacks import SubscriptionPrice, Subscribe, ConfirmSubscription, CreatorPage, ConfirmWithdraw
+from album_collector import album_collector
 import time
 
-load_dotenv()
-
 router = Router()
 
 async def show_creator_card(message: Message, creators: list, page: int = 0):
@@ -252,12 +251,12 @@ async def edit_creator_description(callback: CallbackQuery, state: FSMContext):
     )
     await state.set_state(CreatorRegistration.waiting_for_description)
 
-@router.callback_query(F.data.startswith("price_"))
-async def select_subscription_price(callback: CallbackQuery, state: FSMContext):
+@router.callback_query(SubscriptionPrice.filter())
+async def select_subscription_price(callback: CallbackQuery, callback_data: SubscriptionPrice, state: FSMContext):
     """Seleccionar precio de suscripción predefinido"""
     await callback.answer()
     
-    price = int(callback.data.split("_")[1])
+    price = callback_data.price
     await state.update_data(subscription_price=price)
     
     from keyboards import get_creator_photo_keyboard
@@ -442,7 +441,7 @@ async def my_profile(message: Message):
     # Obtener número de suscriptores activos
     subscribers_count = get_creator_stats(message.from_user.id)
         
-    balance_usd = balance_stars * float(os.getenv("EXCHANGE_RATE", 0.013))
+    balance_usd = balance_stars * settings.exchange_rate
     
     text = f"👤 <b>TU PERFIL DE CREADOR</b>\n\n"
     text += f"🎨 Nombre artístico: {display_name}\n"
@@ -471,8 +470,8 @@ async def check_balance(message: Message):
         return
     
     balance_stars = get_user_balance(message.from_user.id)
-    balance_usd = balance_stars * float(os.getenv("EXCHANGE_RATE", 0.013))
-    min_withdrawal = int(os.getenv("MIN_WITHDRAWAL", 1000))
+    balance_usd = balance_stars * settings.exchange_rate
+    min_withdrawal = settings.min_withdrawal
     
     text = f"💎 <b>TU BALANCE</b>\n\n"
     text += f"⭐️ Balance en Stars: {balance_stars}\n"
@@ -508,7 +507,7 @@ async def withdraw(message: Message):
         await message.answer("❌ El monto debe ser un número válido.")
         return
     
-    min_withdrawal = int(os.getenv("MIN_WITHDRAWAL", 1000))
+    min_withdrawal = settings.min_withdrawal
     current_balance = get_user_balance(message.from_user.id)
     
     if amount < min_withdrawal:
@@ -520,7 +519,7 @@ async def withdraw(message: Message):
         return
     
     if withdraw_balance(message.from_user.id, amount):
-        amount_usd = amount * float(os.getenv("EXCHANGE_RATE", 0.013))
+        amount_usd = amount * settings.exchange_rate
         await message.answer(
             f"✅ <b>Retiro procesado exitosamente</b>\n\n"
             f"💰 Monto retirado: {amount} ⭐️\n"
@@ -549,32 +548,83 @@ async def create_ppv_content(message: Message, state: FSMContext):
     )
     await state.set_state(PPVCreation.waiting_for_content)
 
+MAX_ALBUM_FILES = 10
+
+def _album_files_from(messages: list, current: list = ()) -> tuple:
+    """(archivos nuevos, repetidos): fotos o videos de los mensajes, en orden
+
+    Un archivo que ya está en el álbum (mismo file_unique_id) se cuenta como repetido
+    """
+    seen = {file_data.get('file_unique_id') for file_data in current}
+    files, repeated = [], 0
+    for item in messages:
+        media = item.photo[-1] if item.photo else item.video
+        if media is None:
+            continue
+        if media.file_unique_id in seen:
+            repeated += 1
+            continue
+        seen.add(media.file_unique_id)
+        files.append({
+            'file_id': media.file_id,
+            'file_unique_id': media.file_unique_id,
+            'file_type': 'photo' if item.photo else 'video',
+        })
+    return files, repeated
+
+def _duplicates_note(creator_id: int, files: list, repeated: int) -> str:
+    """Avisos de archivos repetidos en el álbum o ya publicados en otro contenido"""
+    note = f"ℹ️ Se omitieron {repeated} archivos repetidos en el álbum.\n" if repeated else ""
+    published = find_duplicate_media(creator_id, [file_data['file_unique_id'] for file_data in files])
+    if published:
+        note += f"⚠️ {len(published)} de estos archivos ya están en otro contenido PPV tuyo.\n"
+    return f"{note}\n" if note else ""
+
+def _describe_files(files: list) -> str:
+    if len(files) == 1:
+        return "📸 Foto agregada" if files[0]['file_type'] == "photo" else "🎥 Video agregado"
+    return f"📁 {len(files)} archivos agregados"
+
+async def _album_full(message: Message, album_files: list, ignored: int, note: str = ""):
+    ignored_note = f"⚠️ Se ignoraron {ignored} archivos que superaban el límite.\n\n" if ignored else ""
+    await message.answer(
+        f"📁 <b>ÁLBUM COMPLETO ({len(album_files)} archivos)</b>\n\n"
+        f"Has alcanzado el límite máximo de {MAX_ALBUM_FILES} archivos por álbum.\n\n"
+        f"{ignored_note}"
+        f"{note}"
+        f"💰 ¿Cuál será el precio de este álbum en ⭐️ Stars?"
+    )
+
 @router.message(PPVCreation.waiting_for_content)
 async def process_ppv_content(message: Message, state: FSMContext):
-    file_id = None
-    file_type = None
+    messages = await album_collector.collect(message)
+    if messages is None:
+        return  # Parte de un álbum que procesa otro handler
     
-    if message.photo:
-        file_id = message.photo[-1].file_id
-        file_type = "photo"
-    elif message.video:
-        file_id = message.video.file_id
-        file_type = "video"
-    else:
+    received, repeated = _album_files_from(messages)
+    if not received:
         await message.answer("❌ Por favor envía una foto o video:")
         return
+    note = _duplicates_note(message.from_user.id, received, repeated)
     
     # Inicializar lista de archivos en el álbum
-    await state.update_data(album_files=[{'file_id': file_id, 'file_type': file_type}])
+    album_files = received[:MAX_ALBUM_FILES]
+    await state.update_data(album_files=album_files)
+    
+    if len(album_files) >= MAX_ALBUM_FILES:
+        await _album_full(messages[0], album_files, len(received) - len(album_files), note)
+        await state.set_state(PPVCreation.waiting_for_price)
+        return
     
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="➕ Agregar más fotos/videos", callback_data="add_more_content")],
-        [InlineKeyboardButton(text="✅ Continuar con este archivo", callback_data="finish_content")]
+        [InlineKeyboardButton(text="✅ Continuar con este archivo" if len(album_files) == 1 else "✅ Finalizar álbum",
+                              callback_data="finish_content")]
     ])
     
-    content_type = "📸 Foto" if file_type == "photo" else "🎥 Video"
-    await message.answer(
-        f"✅ {content_type} agregada al álbum\n\n"
+    await messages[0].answer(
+        f"✅ {_describe_files(album_files)} al álbum\n\n"
+        f"{note}"
         f"¿Quieres agregar más contenido a este álbum?",
         reply_markup=keyboard
     )
@@ -598,32 +648,29 @@ async def finish_content(callback: CallbackQuery, state: FSMContext):
 
 @router.message(PPVCreation.waiting_for_more_content)
 async def process_more_content(message: Message, state: FSMContext):
-    file_id = None
-    file_type = None
-    
-    if message.photo:
-        file_id = message.photo[-1].file_id
-        file_type = "photo"
-    elif message.video:
-        file_id = message.video.file_id
-        file_type = "video"
-    else:
-        await message.answer("❌ Por favor envía una foto o video, o usa los botones para continuar:")
-        return
+    messages = await album_collector.collect(message)
+    if messages is None:
+        return  # Parte de un álbum que procesa otro handler
     
-    # Agregar archivo a la lista
+    # Agregar los archivos a la lista (una sola lectura y escritura por álbum)
     data = await state.get_data()
     album_files = data.get('album_files', [])
-    album_files.append({'file_id': file_id, 'file_type': file_type})
+    received, repeated = _album_files_from(messages, album_files)
+    if not received:
+        if repeated:
+            await message.answer("ℹ️ Ese contenido ya está en el álbum. Envía otra foto o video, o usa los botones para continuar:")
+        else:
+            await message.answer("❌ Por favor envía una foto o video, o usa los botones para continuar:")
+        return
+    note = _duplicates_note(message.from_user.id, received, repeated)
+    
+    room = MAX_ALBUM_FILES - len(album_files)
+    album_files.extend(received[:room])
     await state.update_data(album_files=album_files)
     
     # Limitar a 10 archivos por álbum
-    if len(album_files) >= 10:
-        await message.answer(
-            f"📁 <b>ÁLBUM COMPLETO ({len(album_files)} archivos)</b>\n\n"
-            f"Has alcanzado el límite máximo de 10 archivos por álbum.\n\n"
-            f"💰 ¿Cuál será el precio de este álbum en ⭐️ Stars?"
-        )
+    if len(album_files) >= MAX_ALBUM_FILES:
+        await _album_full(messages[0], album_files, max(len(received) - room, 0), note)
         await state.set_state(PPVCreation.waiting_for_price)
         return
     
@@ -632,10 +679,10 @@ async def process_more_content(message: Message, state: FSMContext):
         [InlineKeyboardButton(text="✅ Finalizar álbum", callback_data="finish_content")]
     ])
     
-    content_type = "📸 Foto" if file_type == "photo" else "🎥 Video"
-    await message.answer(
-        f"✅ {content_type} agregada al álbum\n\n"
+    await messages[0].answer(
+        f"✅ {_describe_files(received)} al álbum\n\n"
         f"📁 <b>Archivos actuales: {len(album_files)}</b>\n"
+        f"{note}"
         f"¿Quieres agregar más contenido?",
         reply_markup=keyboard
     )
@@ -671,24 +718,15 @@ async def process_ppv_description(message: Message, state: FSMContext):
     
     # Determinar si es álbum o contenido individual
     if len(album_files) > 1:
-        # Crear álbum
-        content_id = add_ppv_content(
+        # Crear álbum con todos sus archivos en una sola transacción
+        content_id = add_ppv_album(
             creator_id=message.from_user.id,
             title=f"Álbum PPV #{int(time.time())}",
             description=description,
             price_stars=data['price'],
-            album_type='album'
+            items=[(file_data['file_id'], file_data['file_type'], file_data.get('file_unique_id')) for file_data in album_files]
         )
         
-        # Agregar todos los archivos al álbum
-        for i, file_data in enumerate(album_files):
-            add_ppv_album_item(
-                album_id=content_id,
-                file_id=file_data['file_id'],
-                file_type=file_data['file_type'],
-                order_position=i
-            )
-        
         content_type = f"📁 Álbum ({len(album_files)} archivos)"
     else:
         # Crear contenido individual (compatibilidad con versión anterior)
@@ -700,7 +738,8 @@ async def process_ppv_description(message: Message, state: FSMContext):
             price_stars=data['price'],
             file_id=file_data['file_id'],
             file_type=file_data['file_type'],
-            album_type='single'
+            album_type='single',
+            file_unique_id=file_data.get('file_unique_id')
         )
         
         content_type = "📸 Foto" if file_data['file_type'] == "photo" else "🎥 Video"
@@ -873,10 +912,10 @@ async def cancel_edit(callback: CallbackQuery, state: FSMContext):
 
 # ==================== CALLBACKS PARA TARJETAS DE CREADORES ====================
 
-@router.callback_query(F.data.startswith("subscribe_"))
-async def handle_subscribe_button(callback: CallbackQuery):
+@router.callback_query(Subscribe.filter())
+async def handle_subscribe_button(callback: CallbackQuery, callback_data: Subscribe):
     """Maneja el botón de suscribirse a un creador"""
-    creator_id = int(callback.data.split("_")[1])
+    creator_id = callback_data.creator_id
     
     creator = get_creator_by_id(creator_id)
     if not creator:
@@ -918,10 +957,10 @@ async def handle_subscribe_button(callback: CallbackQuery):
             reply_markup=keyboard
         )
 
-@router.callback_query(F.data.startswith("confirm_sub_"))
-async def handle_confirm_subscription(callback: CallbackQuery):
+@router.callback_query(ConfirmSubscription.filter())
+async def handle_confirm_subscription(callback: CallbackQuery, callback_data: ConfirmSubscription):
     """Confirma la suscripción de pago usando Telegram Stars"""
-    creator_id = int(callback.data.split("_")[2])
+    creator_id = callback_data.creator_id
     
     creator = get_creator_by_id(creator_id)
     if not creator:
@@ -957,31 +996,21 @@ async def handle_cancel_subscription(callback: CallbackQuery):
     await callback.answer("Operación cancelada")
 
 
-@router.callback_query(F.data.startswith("creator_next_"))
-async def handle_next_creator(callback: CallbackQuery):
-    """Navega al siguiente creador"""
-    current_page = int(callback.data.split("_")[2])
-    # 🎯 NUEVA LÓGICA: Solo mostrar creadores NO suscritos
-    creators = get_available_creators(callback.from_user.id)
+@router.callback_query(CreatorPage.filter())
+async def handle_creator_page(callback: CallbackQuery, callback_data: CreatorPage):
+    """Navega al creador anterior o siguiente (el botón lleva la página de destino)"""
+    page = callback_data.page
+    if page < 0:
+        await callback.answer("❌ No hay creadores anteriores.", show_alert=True)
+        return
     
-    next_page = current_page + 1
-    if next_page < len(creators):
-        await show_creator_card_callback(callback, creators, next_page)
-    else:
-        await callback.answer("❌ No hay más creadores disponibles.", show_alert=True)
-
-@router.callback_query(F.data.startswith("creator_prev_"))
-async def handle_prev_creator(callback: CallbackQuery):
-    """Navega al creador anterior"""
-    current_page = int(callback.data.split("_")[2])
     # 🎯 NUEVA LÓGICA: Solo mostrar creadores NO suscritos
     creators = get_available_creators(callback.from_user.id)
     
-    prev_page = current_page - 1
-    if prev_page >= 0:
-        await show_creator_card_callback(callback, creators, prev_page)
+    if page < len(creators):
+        await show_creator_card_callback(callback, creators, page)
     else:
-        await callback.answer("❌ No hay creadores anteriores.", show_alert=True)
+        await callback.answer("❌ No hay más creadores disponibles.", show_alert=True)
 
 @router.callback_query(F.data == "back_to_explore")
 async def handle_back_to_explore(callback: CallbackQuery):
@@ -1061,7 +1090,7 @@ async def process_withdrawal_amount(message: Message, state: FSMContext):
     
     amount_text = message.text.strip().lower()
     current_balance = get_user_balance(message.from_user.id)
-    min_withdrawal = int(os.getenv("MIN_WITHDRAWAL", 1000))
+    min_withdrawal = settings.min_withdrawal
     
     # Manejar "todo" para retirar todo el balance
     if amount_text == "todo":
@@ -1099,7 +1128,7 @@ async def process_withdrawal_amount(message: Message, state: FSMContext):
         return
     
     # Mostrar confirmación
-    amount_usd = amount * float(os.getenv("EXCHANGE_RATE", 0.013))
+    amount_usd = amount * settings.exchange_rate
     remaining_balance = current_balance - amount
     
     confirmation_text = (
@@ -1120,8 +1149,8 @@ async def process_withdrawal_amount(message: Message, state: FSMContext):
     await state.update_data(withdrawal_amount=amount)
     await state.set_state(WithdrawalFlow.confirming_withdrawal)
 
-@router.callback_query(F.data.startswith("confirm_withdraw_"))
-async def confirm_withdrawal(callback: CallbackQuery, state: FSMContext):
+@router.callback_query(ConfirmWithdraw.filter())
+async def confirm_withdrawal(callback: CallbackQuery, callback_data: ConfirmWithdraw, state: FSMContext):
     """Confirmar y procesar retiro"""
     if is_user_banned(callback.from_user.id):
         await callback.answer("❌ Tu cuenta está baneada.", show_alert=True)
@@ -1134,7 +1163,7 @@ async def confirm_withdrawal(callback: CallbackQuery, state: FSMContext):
         await state.clear()
         return
     
-    amount = int(callback.data.split("_")[2])
+    amount = callback_data.amount
     current_balance = get_user_balance(callback.from_user.id)
     
     # Verificación final de balance (por si cambió entre confirmación)
@@ -1150,7 +1179,7 @@ async def confirm_withdrawal(callback: CallbackQuery, state: FSMContext):
     
     # Procesar retiro
     if withdraw_balance(callback.from_user.id, amount):
-        amount_usd = amount * float(os.getenv("EXCHANGE_RATE", 0.013))
+        amount_usd = amount * settings.exchange_rate
         remaining_balance = current_balance - amount
         
         success_text = (
@@ -1,7 +1,9 @@
 # bot/database.py
 import sqlite3
 import os
+import json
 import time
+from checkout_cache import checkout_cache
 
 DB_PATH = os.path.join(os.path.dirname(__file__), "platform.db")
 
@@ -63,7 +65,8 @@ def init_db():
             file_id TEXT,
             file_type TEXT, -- 'photo' or 'video'
             album_type TEXT DEFAULT 'single', -- 'single' or 'album'
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            file_unique_id TEXT -- igual para el mismo archivo aunque cambie el file_id
         )
     ''')
     
@@ -75,6 +78,7 @@ def init_db():
             file_type TEXT, -- 'photo' or 'video'
             order_position INTEGER,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            file_unique_id TEXT, -- igual para el mismo archivo aunque cambie el file_id
             FOREIGN KEY (album_id) REFERENCES ppv_content(id) ON DELETE CASCADE
         )
     ''')
@@ -96,7 +100,26 @@ def init_db():
             banned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     ''')
-    
+
+    # Tracking de Paid Media enviados desde el catálogo, indexado por el payload
+    # que Telegram devuelve en purchased_paid_media
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS paid_media_tracking (
+            payload TEXT PRIMARY KEY,
+            content_id INTEGER,
+            creator_id INTEGER,
+            buyer_id INTEGER,
+            price_stars INTEGER,
+            album_type TEXT DEFAULT 'single',
+            created_at INTEGER,
+            expires_at INTEGER
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_paid_media_tracking_expires
+        ON paid_media_tracking (expires_at)
+    ''')
+
     # === VIDEOCALL SYSTEM TABLES ===
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS videocall_settings (
@@ -142,6 +165,161 @@ def init_db():
         )
     ''')
     
+    # Índices para la reconciliación de sesiones y grupos huérfanos
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_videocall_sessions_status_started
+        ON videocall_sessions (status, started_at)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_videocall_groups_live
+        ON videocall_groups (session_id) WHERE deleted_at IS NULL
+    ''')
+    
+    # Pool de supergrupos precreados para videollamadas (bot ya promovido)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS videocall_group_pool (
+            group_id INTEGER PRIMARY KEY,
+            status TEXT DEFAULT 'ready', -- 'ready', 'in_use', 'recycling'
+            session_id TEXT,
+            invite_link TEXT, -- enlace vigente, se rota al reciclar el grupo
+            created_at INTEGER,
+            updated_at INTEGER
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_videocall_group_pool_status
+        ON videocall_group_pool (status, created_at)
+    ''')
+    
+    # Trabajos programados persistentes (sobreviven a reinicios)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS scheduled_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_type TEXT,
+            payload TEXT, -- JSON
+            due_at REAL,
+            status TEXT DEFAULT 'pending', -- 'pending', 'done', 'failed', 'cancelled'
+            attempts INTEGER DEFAULT 0,
+            last_error TEXT,
+            created_at INTEGER
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_scheduled_jobs_status_due
+        ON scheduled_jobs (status, due_at)
+    ''')
+    
+    # Ventanas de disponibilidad publicadas por los creadores (epoch en segundos)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS videocall_availability (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            creator_id INTEGER,
+            start_at REAL,
+            end_at REAL,
+            created_at INTEGER,
+            FOREIGN KEY (creator_id) REFERENCES creators(user_id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_videocall_availability_creator_end
+        ON videocall_availability (creator_id, end_at)
+    ''')
+    
+    # Reservas de videollamadas en un horario concreto
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS videocall_bookings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            creator_id INTEGER,
+            fan_id INTEGER,
+            start_at REAL,
+            end_at REAL,
+            duration_minutes INTEGER,
+            price_stars INTEGER,
+            status TEXT DEFAULT 'booked', -- 'booked', 'started', 'cancelled', 'failed'
+            session_id TEXT,
+            created_at INTEGER,
+            charge_id TEXT, -- telegram_payment_charge_id (para reembolsos)
+            FOREIGN KEY (creator_id) REFERENCES creators(user_id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_videocall_bookings_creator_status_end
+        ON videocall_bookings (creator_id, status, end_at)
+    ''')
+    
+    # Cola de espera FIFO de fans por creador (límite de videollamadas simultáneas)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS videocall_waitlist (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            creator_id INTEGER,
+            fan_id INTEGER,
+            duration_minutes INTEGER,
+            price_stars INTEGER,
+            status TEXT DEFAULT 'waiting', -- 'waiting', 'served', 'left', 'failed', 'cancelled'
+            created_at INTEGER,
+            charge_id TEXT, -- telegram_payment_charge_id si ya pagó (para reembolsos)
+            FOREIGN KEY (creator_id) REFERENCES creators(user_id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_videocall_waitlist_creator_status
+        ON videocall_waitlist (creator_id, status, id)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_videocall_sessions_creator_status
+        ON videocall_sessions (creator_id, status)
+    ''')
+    
+    # Pagos ya liquidados: un successful_payment reenviado no vuelve a acreditar
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS processed_payments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            charge_id TEXT NOT NULL, -- telegram_payment_charge_id
+            kind TEXT, -- 'sub', 'ppv', 'tip', 'vc'
+            payer_id INTEGER,
+            amount_stars INTEGER,
+            processed_at INTEGER
+        )
+    ''')
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_processed_payments_charge
+        ON processed_payments (charge_id)
+    ''')
+    
+    # Outbox de mensajes: se escribe en la misma transacción que el cambio de estado
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER,
+            template TEXT,
+            payload TEXT, -- JSON con los datos para renderizar el mensaje
+            status TEXT DEFAULT 'pending', -- 'pending', 'sending', 'sent', 'failed'
+            attempts INTEGER DEFAULT 0,
+            next_attempt_at REAL,
+            claimed_at REAL,
+            last_error TEXT,
+            created_at INTEGER
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_outbox_status_next
+        ON outbox (status, next_attempt_at)
+    ''')
+    
+    # Estados FSM persistentes (registro, subida de PPV, retiros...)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS fsm_storage (
+            storage_key TEXT PRIMARY KEY, -- bot:chat:user:thread:business:destiny
+            state TEXT,
+            data BLOB, -- JSON compacto, opcionalmente comprimido
+            updated_at INTEGER
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_fsm_storage_updated
+        ON fsm_storage (updated_at)
+    ''')
+    
     # === MIGRATION LOGIC FOR EXISTING DATABASES ===
     # Add album_type column to ppv_content if it doesn't exist (for databases created before this feature)
     try:
@@ -155,8 +333,54 @@ def init_db():
     except Exception as e:
         print(f"⚠️ Migration warning: {e}")
     
+    # Add file_unique_id column to PPV tables if it doesn't exist (filas anteriores quedan sin él)
+    for table in ('ppv_content', 'ppv_album_items'):
+        try:
+            cursor.execute(f"PRAGMA table_info({table})")
+            columns = [column[1] for column in cursor.fetchall()]
+            
+            if 'file_unique_id' not in columns:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN file_unique_id TEXT")
+                print(f"✅ Migration: Added file_unique_id column to {table} table")
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_file_unique_id ON {table}(file_unique_id)")
+        except Exception as e:
+            print(f"⚠️ Migration warning: {e}")
+    
+    # Add invite_link column to videocall_group_pool if it doesn't exist
+    try:
+        cursor.execute("PRAGMA table_info(videocall_group_pool)")
+        columns = [column[1] for column in cursor.fetchall()]
+        
+        if 'invite_link' not in columns:
+            cursor.execute("ALTER TABLE videocall_group_pool ADD COLUMN invite_link TEXT")
+            print("✅ Migration: Added invite_link column to videocall_group_pool table")
+    except Exception as e:
+        print(f"⚠️ Migration warning: {e}")
+    
+    # Add charge_id column to videocall payment tables if it doesn't exist
+    for table in ('videocall_bookings', 'videocall_waitlist'):
+        try:
+            cursor.execute(f"PRAGMA table_info({table})")
+            columns = [column[1] for column in cursor.fetchall()]
+            
+            if 'charge_id' not in columns:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN charge_id TEXT")
+                print(f"✅ Migration: Added charge_id column to {table} table")
+        except Exception as e:
+            print(f"⚠️ Migration warning: {e}")
+    
+    # Entradas de pago en cola de antes de cobrar al encolar: nunca se pagaron y
+    # atenderlas acreditaría al creador Stars que nadie pagó
+    cursor.execute('''
+        UPDATE videocall_waitlist SET status = 'cancelled'
+        WHERE status = 'waiting' AND price_stars > 0 AND charge_id IS NULL
+    ''')
+    if cursor.rowcount:
+        print(f"✅ Migration: Cancelled {cursor.rowcount} unpaid videocall waitlist entries")
+    
     conn.commit()
     conn.close()
+    checkout_cache.clear()
 
 def add_creator(user_id, username, display_name, description, subscription_price, photo_url, payout_method):
     conn = get_db_connection()
@@ -168,6 +392,7 @@ def add_creator(user_id, username, display_name, description, subscription_price
     ''', (user_id, username, display_name, description, subscription_price, photo_url, payout_method))
     conn.commit()
     conn.close()
+    checkout_cache.creators.set(user_id, subscription_price or 0)
 
 def get_creator_by_id(creator_id):
     conn = get_db_connection()
@@ -232,6 +457,7 @@ def update_creator_subscription_price(user_id, price):
     cursor.execute("UPDATE creators SET subscription_price = ? WHERE user_id = ?", (price, user_id))
     conn.commit()
     conn.close()
+    checkout_cache.creators.invalidate(user_id)
 
 def update_creator_photo(user_id, photo_url):
     conn = get_db_connection()
@@ -312,18 +538,88 @@ def ban_user(user_id):
     cursor.execute("INSERT OR IGNORE INTO banned_users (user_id) VALUES (?)", (user_id,))
     conn.commit()
     conn.close()
+    checkout_cache.banned.set(user_id, True)
+
+# === DETECCIÓN DE ARCHIVOS DUPLICADOS ===
+
+def _without_unique_id(cursor, rows):
+    """Quita file_unique_id de las filas: los handlers leen ppv_content y ppv_album_items por posición"""
+    keep = [i for i, column in enumerate(cursor.description) if column[0] != 'file_unique_id']
+    return [tuple(row[i] for i in keep) for row in rows]
+
+def find_duplicate_media(creator_id, file_unique_ids):
+    """file_unique_id de la lista que ya están en el contenido PPV del creador"""
+    if not file_unique_ids:
+        return set()
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    placeholders = ", ".join("?" for _ in file_unique_ids)
+    cursor.execute(f'''
+        SELECT file_unique_id FROM ppv_content
+        WHERE file_unique_id IN ({placeholders}) AND creator_id = ?
+        UNION
+        SELECT i.file_unique_id FROM ppv_album_items i
+        JOIN ppv_content c ON c.id = i.album_id
+        WHERE i.file_unique_id IN ({placeholders}) AND c.creator_id = ?
+    ''', (*file_unique_ids, creator_id, *file_unique_ids, creator_id))
+    duplicates = {row[0] for row in cursor.fetchall()}
+    conn.close()
+    return duplicates
+
+def get_media_stats():
+    """(archivos distintos, archivos publicados) del contenido PPV con file_unique_id"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT COUNT(DISTINCT file_unique_id), COUNT(file_unique_id) FROM (
+            SELECT file_unique_id FROM ppv_content
+            UNION ALL
+            SELECT file_unique_id FROM ppv_album_items
+        )
+    ''')
+    unique_files, published = cursor.fetchone()
+    conn.close()
+    return unique_files, published
 
-def add_ppv_content(creator_id, title, description, price_stars, file_id=None, file_type=None, album_type='single'):
+# === CONTENIDO PPV ===
+
+def add_ppv_content(creator_id, title, description, price_stars, file_id=None, file_type=None, album_type='single',
+                    file_unique_id=None):
     """Crea contenido PPV individual o álbum"""
     conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute('''
-        INSERT INTO ppv_content (creator_id, title, description, price_stars, file_id, file_type, album_type)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', (creator_id, title, description, price_stars, file_id, file_type, album_type))
+        INSERT INTO ppv_content (creator_id, title, description, price_stars, file_id, file_type, album_type, file_unique_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (creator_id, title, description, price_stars, file_id, file_type, album_type, file_unique_id))
     content_id = cursor.lastrowid
     conn.commit()
     conn.close()
+    checkout_cache.ppv.set(content_id, (creator_id, price_stars))
+    return content_id
+
+def add_ppv_album(creator_id, title, description, price_stars, items):
+    """Crea un álbum PPV con todos sus archivos en una sola transacción
+
+    items: [(file_id, file_type, file_unique_id), ...]; file_unique_id puede ser None
+    """
+    conn = get_db_connection()
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO ppv_content (creator_id, title, description, price_stars, album_type)
+            VALUES (?, ?, ?, ?, 'album')
+        ''', (creator_id, title, description, price_stars))
+        content_id = cursor.lastrowid
+        cursor.executemany('''
+            INSERT INTO ppv_album_items (album_id, file_id, file_type, order_position, file_unique_id)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [
+            (content_id, file_id, file_type, position, unique_id)
+            for position, (file_id, file_type, unique_id) in enumerate(items)
+        ])
+    conn.close()
+    checkout_cache.ppv.set(content_id, (creator_id, price_stars))
     return content_id
 
 def add_ppv_album_item(album_id, file_id, file_type, order_position):
@@ -346,7 +642,7 @@ def get_ppv_album_items(album_id):
         WHERE album_id = ? 
         ORDER BY order_position
     ''', (album_id,))
-    rows = cursor.fetchall()
+    rows = _without_unique_id(cursor, cursor.fetchall())
     conn.close()
     return rows
 
@@ -354,9 +650,9 @@ def get_ppv_content(content_id):
     conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM ppv_content WHERE id = ?", (content_id,))
-    row = cursor.fetchone()
+    rows = _without_unique_id(cursor, cursor.fetchall())
     conn.close()
-    return row
+    return rows[0] if rows else None
 
 def add_ppv_purchase(buyer_id, content_id):
     """Agrega una compra PPV de manera segura, evitando duplicados"""
@@ -365,9 +661,11 @@ def add_ppv_purchase(buyer_id, content_id):
     try:
         cursor.execute("INSERT INTO ppv_purchases (buyer_id, content_id) VALUES (?, ?)", (buyer_id, content_id))
         conn.commit()
+        checkout_cache.purchases.set((buyer_id, content_id), True)
         return True
     except sqlite3.IntegrityError:
         # Ya existe esta compra, no hacer nada
+        checkout_cache.purchases.set((buyer_id, content_id), True)
         return False
     finally:
         conn.close()
@@ -380,6 +678,52 @@ def has_purchased_ppv(buyer_id, content_id):
     conn.close()
     return result is not None
 
+# === PAID MEDIA TRACKING ===
+
+def add_paid_media_tracking(payload, content_id, creator_id, buyer_id, price_stars, album_type, ttl_seconds):
+    """Registra un Paid Media enviado, indexado por su payload"""
+    now = int(time.time())
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT OR REPLACE INTO paid_media_tracking
+        (payload, content_id, creator_id, buyer_id, price_stars, album_type, created_at, expires_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (payload, content_id, creator_id, buyer_id, price_stars, album_type, now, now + ttl_seconds))
+    conn.commit()
+    conn.close()
+
+def get_paid_media_tracking(payload):
+    """Obtiene el tracking de un Paid Media por payload (búsqueda por clave primaria)"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT payload, content_id, creator_id, buyer_id, price_stars, album_type
+        FROM paid_media_tracking
+        WHERE payload = ? AND expires_at > ?
+    ''', (payload, int(time.time())))
+    row = cursor.fetchone()
+    conn.close()
+    return row
+
+def delete_paid_media_tracking(payload):
+    """Elimina el tracking de un Paid Media ya procesado"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM paid_media_tracking WHERE payload = ?", (payload,))
+    conn.commit()
+    conn.close()
+
+def purge_expired_paid_media_tracking():
+    """Elimina los registros de tracking vencidos y devuelve cuántos se borraron"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM paid_media_tracking WHERE expires_at <= ?", (int(time.time()),))
+    deleted = cursor.rowcount
+    conn.commit()
+    conn.close()
+    return deleted
+
 def get_admin_stats():
     conn = get_db_connection()
     cursor = conn.cursor()
@@ -428,7 +772,7 @@ def get_ppv_by_creator(creator_id):
         WHERE creator_id = ?
         ORDER BY created_at ASC, id ASC
     ''', (creator_id,))
-    rows = cursor.fetchall()
+    rows = _without_unique_id(cursor, cursor.fetchall())
     conn.close()
     return rows
 
@@ -456,6 +800,8 @@ def delete_ppv_content(content_id, creator_id):
         
         if cursor.rowcount > 0:
             conn.commit()
+            checkout_cache.ppv.set(content_id, None)
+            checkout_cache.purchases.discard_where(lambda key: key[1] == content_id)
             return True, "Contenido eliminado exitosamente"
         else:
             return False, "No se pudo eliminar el contenido"
@@ -481,7 +827,7 @@ def get_ppv_content_with_stats(creator_id):
         GROUP BY p.id
         ORDER BY p.created_at DESC
     ''', (creator_id,))
-    rows = cursor.fetchall()
+    rows = _without_unique_id(cursor, cursor.fetchall())
     conn.close()
     return rows
 
@@ -498,6 +844,7 @@ def set_videocall_settings(creator_id, price_10min, price_30min, price_60min, en
     ''', (creator_id, price_10min, price_30min, price_60min, enabled))
     conn.commit()
     conn.close()
+    checkout_cache.videocall.set(creator_id, (bool(enabled), price_10min, price_30min, price_60min))
 
 def get_videocall_settings(creator_id):
     """Obtiene la configuración de videollamadas de un creador"""
@@ -565,8 +912,9 @@ def create_videocall_group(group_id, session_id, group_title):
     """Registra un grupo de videollamada creado"""
     conn = get_db_connection()
     cursor = conn.cursor()
+    # Los grupos del pool se reutilizan entre sesiones: se reemplaza el registro anterior
     cursor.execute('''
-        INSERT INTO videocall_groups (group_id, session_id, group_title)
+        INSERT OR REPLACE INTO videocall_groups (group_id, session_id, group_title)
         VALUES (?, ?, ?)
     ''', (group_id, session_id, group_title))
     conn.commit()
@@ -584,6 +932,15 @@ def delete_videocall_group(group_id):
     conn.commit()
     conn.close()
 
+def get_videocall_group(group_id):
+    """Obtiene el registro de un grupo de videollamada"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM videocall_groups WHERE group_id = ?", (group_id,))
+    row = cursor.fetchone()
+    conn.close()
+    return row
+
 def get_active_videocall_sessions(creator_id=None, fan_id=None):
     """Obtiene sesiones activas de videollamadas"""
     conn = get_db_connection()
@@ -610,3 +967,653 @@ def get_active_videocall_sessions(creator_id=None, fan_id=None):
     conn.close()
     return rows
 
+# === VIDEOCALL GROUP POOL ===
+
+def add_pool_group(group_id, invite_link=None):
+    """Agrega un supergrupo listo al pool"""
+    now = int(time.time())
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT OR REPLACE INTO videocall_group_pool (group_id, status, session_id, invite_link, created_at, updated_at)
+        VALUES (?, 'ready', NULL, ?, ?, ?)
+    ''', (group_id, invite_link, now, now))
+    conn.commit()
+    conn.close()
+
+def checkout_pool_group(session_id):
+    """Reserva atómicamente el grupo listo más antiguo del pool para una sesión"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute('''
+            SELECT group_id FROM videocall_group_pool
+            WHERE status = 'ready'
+            ORDER BY created_at
+            LIMIT 1
+        ''')
+        row = cursor.fetchone()
+        if not row:
+            conn.rollback()
+            return None
+        cursor.execute('''
+            UPDATE videocall_group_pool
+            SET status = 'in_use', session_id = ?, updated_at = ?
+            WHERE group_id = ?
+        ''', (session_id, int(time.time()), row[0]))
+        conn.commit()
+        return row[0]
+    finally:
+        conn.close()
+
+def set_pool_group_status(group_id, status):
+    """Cambia el estado de un grupo del pool ('ready' libera la sesión asociada)"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    if status == 'ready':
+        cursor.execute('''
+            UPDATE videocall_group_pool
+            SET status = 'ready', session_id = NULL, updated_at = ?
+            WHERE group_id = ?
+        ''', (int(time.time()), group_id))
+    else:
+        cursor.execute('''
+            UPDATE videocall_group_pool
+            SET status = ?, updated_at = ?
+            WHERE group_id = ?
+        ''', (status, int(time.time()), group_id))
+    conn.commit()
+    conn.close()
+
+def remove_pool_group(group_id):
+    """Quita un grupo del pool (por ejemplo, si se eliminó en Telegram)"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM videocall_group_pool WHERE group_id = ?", (group_id,))
+    conn.commit()
+    conn.close()
+
+def set_pool_invite_link(group_id, invite_link):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "UPDATE videocall_group_pool SET invite_link = ? WHERE group_id = ?",
+        (invite_link, group_id)
+    )
+    conn.commit()
+    conn.close()
+
+def is_pool_group(group_id):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM videocall_group_pool WHERE group_id = ?", (group_id,))
+    result = cursor.fetchone()
+    conn.close()
+    return result is not None
+
+def count_pool_groups(status='ready'):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM videocall_group_pool WHERE status = ?", (status,))
+    count = cursor.fetchone()[0]
+    conn.close()
+    return count
+
+def get_pool_groups(status):
+    """Obtiene los IDs de grupos del pool en un estado dado"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT group_id FROM videocall_group_pool WHERE status = ?", (status,))
+    rows = [row[0] for row in cursor.fetchall()]
+    conn.close()
+    return rows
+
+# === SCHEDULED JOBS ===
+
+def add_scheduled_job(job_type, payload, due_at):
+    """Guarda un trabajo programado y devuelve su ID"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO scheduled_jobs (job_type, payload, due_at, status, created_at)
+        VALUES (?, ?, ?, 'pending', ?)
+    ''', (job_type, payload, due_at, int(time.time())))
+    job_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+    return job_id
+
+def get_pending_scheduled_jobs():
+    """Obtiene todos los trabajos pendientes ordenados por vencimiento"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT id, job_type, payload, due_at, attempts FROM scheduled_jobs
+        WHERE status = 'pending'
+        ORDER BY due_at
+    ''')
+    rows = cursor.fetchall()
+    conn.close()
+    return rows
+
+def update_scheduled_job(job_id, status, due_at=None, attempts=None, last_error=None):
+    """Actualiza el estado de un trabajo programado"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        UPDATE scheduled_jobs
+        SET status = ?,
+            due_at = COALESCE(?, due_at),
+            attempts = COALESCE(?, attempts),
+            last_error = ?
+        WHERE id = ?
+    ''', (status, due_at, attempts, last_error, job_id))
+    conn.commit()
+    conn.close()
+
+def cancel_scheduled_job(job_id):
+    """Cancela un trabajo solo si sigue pendiente; False si ya terminó, falló o estaba cancelado"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("UPDATE scheduled_jobs SET status = 'cancelled' WHERE id = ? AND status = 'pending'", (job_id,))
+    cancelled = cursor.rowcount > 0
+    conn.commit()
+    conn.close()
+    return cancelled
+
+# === RECONCILIACIÓN DE VIDEOLLAMADAS ===
+
+def get_expired_videocall_sessions(grace_minutes, limit=100):
+    """Sesiones 'active' cuya duración (más la gracia) ya venció"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT session_id, group_id FROM videocall_sessions
+        WHERE status = 'active'
+          AND datetime(started_at, '+' || (duration_minutes + ?) || ' minutes') <= CURRENT_TIMESTAMP
+        LIMIT ?
+    ''', (grace_minutes, limit))
+    rows = cursor.fetchall()
+    conn.close()
+    return rows
+
+def get_stale_pending_videocall_sessions(max_age_minutes, limit=100):
+    """Sesiones que quedaron en 'pending' (creación interrumpida) hace más de max_age_minutes"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT session_id, group_id FROM videocall_sessions
+        WHERE status = 'pending'
+          AND created_at <= datetime('now', '-' || ? || ' minutes')
+        LIMIT ?
+    ''', (max_age_minutes, limit))
+    rows = cursor.fetchall()
+    conn.close()
+    return rows
+
+def close_videocall_sessions(session_ids, status):
+    """Marca varias sesiones como cerradas ('completed' o 'cancelled') en una sola transacción"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.executemany('''
+        UPDATE videocall_sessions
+        SET status = ?, ended_at = CURRENT_TIMESTAMP
+        WHERE session_id = ?
+    ''', [(status, session_id) for session_id in session_ids])
+    conn.commit()
+    conn.close()
+
+def get_orphan_videocall_groups(limit=100):
+    """Grupos sin eliminar cuya sesión ya terminó o no existe"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT g.group_id, g.session_id FROM videocall_groups g
+        LEFT JOIN videocall_sessions s ON s.session_id = g.session_id
+        WHERE g.deleted_at IS NULL
+          AND (s.session_id IS NULL OR s.status IN ('completed', 'cancelled'))
+        LIMIT ?
+    ''', (limit,))
+    rows = cursor.fetchall()
+    conn.close()
+    return rows
+
+def get_orphan_pool_groups(min_age_seconds, limit=100):
+    """Grupos del pool 'in_use' desde hace más de min_age_seconds sin un registro vivo en videocall_groups"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT p.group_id FROM videocall_group_pool p
+        LEFT JOIN videocall_groups g ON g.group_id = p.group_id AND g.deleted_at IS NULL
+        WHERE p.status = 'in_use' AND g.group_id IS NULL AND p.updated_at <= ?
+        LIMIT ?
+    ''', (int(time.time()) - min_age_seconds, limit))
+    rows = [row[0] for row in cursor.fetchall()]
+    conn.close()
+    return rows
+
+# === RESERVAS DE VIDEOLLAMADAS ===
+
+def add_videocall_availability(creator_id, start_at, end_at):
+    """Publica una ventana de disponibilidad y devuelve su ID"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO videocall_availability (creator_id, start_at, end_at, created_at)
+        VALUES (?, ?, ?, ?)
+    ''', (creator_id, start_at, end_at, int(time.time())))
+    window_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+    return window_id
+
+def delete_videocall_availability(window_id):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM videocall_availability WHERE id = ?", (window_id,))
+    conn.commit()
+    conn.close()
+
+def get_videocall_availability(creator_id, after):
+    """Ventanas de un creador que terminan después de 'after', ordenadas por inicio"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT id, start_at, end_at FROM videocall_availability
+        WHERE creator_id = ? AND end_at > ?
+        ORDER BY start_at
+    ''', (creator_id, after))
+    rows = cursor.fetchall()
+    conn.close()
+    return rows
+
+def add_videocall_booking(creator_id, fan_id, start_at, end_at, duration_minutes, price_stars, charge_id=None):
+    """Registra una reserva y devuelve su ID"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO videocall_bookings
+        (creator_id, fan_id, start_at, end_at, duration_minutes, price_stars, status, created_at, charge_id)
+        VALUES (?, ?, ?, ?, ?, ?, 'booked', ?, ?)
+    ''', (creator_id, fan_id, start_at, end_at, duration_minutes, price_stars, int(time.time()), charge_id))
+    booking_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+    return booking_id
+
+def get_videocall_booking(booking_id):
+    """Obtiene una reserva: (id, creator_id, fan_id, start_at, end_at, duration_minutes, price_stars, status, session_id, created_at, charge_id)"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM videocall_bookings WHERE id = ?", (booking_id,))
+    row = cursor.fetchone()
+    conn.close()
+    return row
+
+def get_upcoming_videocall_bookings(creator_id, after):
+    """Reservas vigentes de un creador que terminan después de 'after'"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT id, start_at, end_at FROM videocall_bookings
+        WHERE creator_id = ? AND status = 'booked' AND end_at > ?
+        ORDER BY start_at
+    ''', (creator_id, after))
+    rows = cursor.fetchall()
+    conn.close()
+    return rows
+
+def get_user_videocall_bookings(user_id, after):
+    """Reservas vigentes donde el usuario participa como fan o como creador"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT id, creator_id, fan_id, start_at, duration_minutes, price_stars FROM videocall_bookings
+        WHERE (fan_id = ? OR creator_id = ?) AND status = 'booked' AND end_at > ?
+        ORDER BY start_at
+    ''', (user_id, user_id, after))
+    rows = cursor.fetchall()
+    conn.close()
+    return rows
+
+def update_videocall_booking_status(booking_id, status, session_id=None):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        UPDATE videocall_bookings
+        SET status = ?, session_id = COALESCE(?, session_id)
+        WHERE id = ?
+    ''', (status, session_id, booking_id))
+    conn.commit()
+    conn.close()
+
+# === COLA DE ESPERA DE VIDEOLLAMADAS ===
+
+def count_active_videocall_sessions(creator_id):
+    """Sesiones en curso (o creándose) de un creador"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT COUNT(*) FROM videocall_sessions
+        WHERE creator_id = ? AND status IN ('pending', 'active')
+    ''', (creator_id,))
+    count = cursor.fetchone()[0]
+    conn.close()
+    return count
+
+def get_active_videocall_remaining(creator_id):
+    """Segundos restantes de cada sesión en curso de un creador (duración completa si no empezó)"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT CASE
+            WHEN started_at IS NULL THEN duration_minutes * 60
+            ELSE MAX(0, strftime('%s', started_at) + duration_minutes * 60 - strftime('%s', 'now'))
+        END
+        FROM videocall_sessions
+        WHERE creator_id = ? AND status IN ('pending', 'active')
+    ''', (creator_id,))
+    rows = [row[0] for row in cursor.fetchall()]
+    conn.close()
+    return rows
+
+def add_waitlist_entry(creator_id, fan_id, duration_minutes, price_stars, charge_id=None):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO videocall_waitlist (creator_id, fan_id, duration_minutes, price_stars, status, created_at, charge_id)
+        VALUES (?, ?, ?, ?, 'waiting', ?, ?)
+    ''', (creator_id, fan_id, duration_minutes, price_stars, int(time.time()), charge_id))
+    entry_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+    return entry_id
+
+def get_waitlist(creator_id):
+    """Entradas en espera de un creador en orden de llegada: (id, fan_id, duration_minutes, price_stars, charge_id)"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT id, fan_id, duration_minutes, price_stars, charge_id FROM videocall_waitlist
+        WHERE creator_id = ? AND status = 'waiting'
+        ORDER BY id
+    ''', (creator_id,))
+    rows = cursor.fetchall()
+    conn.close()
+    return rows
+
+def get_waitlist_entry(entry_id):
+    """Obtiene una entrada de la cola: (id, creator_id, fan_id, status, charge_id)"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT id, creator_id, fan_id, status, charge_id FROM videocall_waitlist WHERE id = ?",
+        (entry_id,)
+    )
+    row = cursor.fetchone()
+    conn.close()
+    return row
+
+def get_waitlist_entries_for_fan(fan_id):
+    """Entradas en espera de un fan: (id, creator_id)"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT id, creator_id FROM videocall_waitlist
+        WHERE fan_id = ? AND status = 'waiting'
+        ORDER BY id
+    ''', (fan_id,))
+    rows = cursor.fetchall()
+    conn.close()
+    return rows
+
+def get_waitlist_creators():
+    """Creadores con fans en espera"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT DISTINCT creator_id FROM videocall_waitlist WHERE status = 'waiting'")
+    rows = [row[0] for row in cursor.fetchall()]
+    conn.close()
+    return rows
+
+def update_waitlist_status(entry_id, status):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("UPDATE videocall_waitlist SET status = ? WHERE id = ?", (status, entry_id))
+    conn.commit()
+    conn.close()
+    return cursor.rowcount > 0
+
+# === PAGOS PROCESADOS (IDEMPOTENCIA) ===
+
+def settle_payment(charge_id, kind, payer_id, amount_stars, receiver_id=None, commission_stars=0,
+                   tx_type=None, subscription_expires_at=None, ppv_content_id=None, outbox=()):
+    """Liquida un pago una sola vez por charge_id, en una única transacción
+
+    Registra el charge_id y, en la misma transacción, la transacción contable, el
+    balance del creador, la suscripción o compra PPV y los mensajes del outbox
+    (chat_id, template, payload). Devuelve False si el pago ya se había procesado
+    (reentrega de Telegram u otro worker), sin tocar nada
+    """
+    conn = get_db_connection()
+    try:
+        with conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT OR IGNORE INTO processed_payments (charge_id, kind, payer_id, amount_stars, processed_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (charge_id, kind, payer_id, amount_stars, int(time.time())))
+            if cursor.rowcount == 0:
+                return False
+            
+            if tx_type:
+                cursor.execute('''
+                    INSERT INTO transactions (payer_id, receiver_id, amount_stars, commission_stars, type)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (payer_id, receiver_id, amount_stars, commission_stars, tx_type))
+                cursor.execute(
+                    "UPDATE creators SET balance_stars = balance_stars + ? WHERE user_id = ?",
+                    (amount_stars - commission_stars, receiver_id)
+                )
+            if subscription_expires_at is not None:
+                cursor.execute('''
+                    INSERT OR REPLACE INTO subscribers (fan_id, creator_id, expires_at)
+                    VALUES (?, ?, ?)
+                ''', (payer_id, receiver_id, subscription_expires_at))
+            if ppv_content_id is not None:
+                cursor.execute(
+                    "INSERT OR IGNORE INTO ppv_purchases (buyer_id, content_id) VALUES (?, ?)",
+                    (payer_id, ppv_content_id)
+                )
+            _insert_outbox(cursor, outbox)
+        if ppv_content_id is not None:
+            checkout_cache.purchases.set((payer_id, ppv_content_id), True)
+        return True
+    finally:
+        conn.close()
+
+# === ÍNDICE DE PRE-CHECKOUT ===
+
+def _load_subscription_price(creator_id):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT subscription_price FROM creators WHERE user_id = ?", (creator_id,))
+    row = cursor.fetchone()
+    conn.close()
+    return (row[0] or 0) if row else None
+
+def _load_ppv_price(content_id):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT creator_id, price_stars FROM ppv_content WHERE id = ?", (content_id,))
+    row = cursor.fetchone()
+    conn.close()
+    return row
+
+def _load_videocall_prices(creator_id):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT enabled, price_10min, price_30min, price_60min FROM videocall_settings WHERE creator_id = ?",
+        (creator_id,)
+    )
+    row = cursor.fetchone()
+    conn.close()
+    return (bool(row[0]), *row[1:]) if row else None
+
+checkout_cache.bind(
+    banned=is_user_banned,
+    creators=_load_subscription_price,
+    ppv=_load_ppv_price,
+    purchases=lambda key: has_purchased_ppv(*key),
+    videocall=_load_videocall_prices,
+)
+
+def warm_checkout_cache():
+    """Precarga baneos y precios de suscripción, PPV y videollamadas con una consulta por tabla"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT user_id FROM banned_users")
+    for (user_id,) in cursor.fetchall():
+        checkout_cache.banned.set(user_id, True)
+    cursor.execute("SELECT user_id, subscription_price FROM creators")
+    for creator_id, price in cursor.fetchall():
+        checkout_cache.creators.set(creator_id, price or 0)
+    cursor.execute("SELECT id, creator_id, price_stars FROM ppv_content")
+    for content_id, creator_id, price in cursor.fetchall():
+        checkout_cache.ppv.set(content_id, (creator_id, price))
+    cursor.execute("SELECT creator_id, enabled, price_10min, price_30min, price_60min FROM videocall_settings")
+    for creator_id, enabled, *prices in cursor.fetchall():
+        checkout_cache.videocall.set(creator_id, (bool(enabled), *prices))
+    conn.close()
+    return sum(len(lookup) for lookup in checkout_cache.lookups)
+
+# === OUTBOX DE MENSAJES ===
+
+def _insert_outbox(cursor, messages):
+    now = time.time()
+    cursor.executemany('''
+        INSERT INTO outbox (chat_id, template, payload, next_attempt_at, created_at)
+        VALUES (?, ?, ?, ?, ?)
+    ''', [(chat_id, template, json.dumps(payload), now, int(now)) for chat_id, template, payload in messages])
+
+def add_outbox_messages(messages):
+    """Encola mensajes (chat_id, template, payload) fuera de una liquidación de pago"""
+    conn = get_db_connection()
+    with conn:
+        _insert_outbox(conn.cursor(), messages)
+    conn.close()
+
+def claim_outbox_batch(limit, stale_after):
+    """Reserva hasta 'limit' mensajes vencidos: (id, chat_id, template, payload, attempts)
+
+    También recupera los que quedaron en 'sending' más de 'stale_after' segundos
+    (el proceso cayó a mitad de envío): la entrega es al menos una vez
+    """
+    now = time.time()
+    conn = get_db_connection()
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE outbox SET status = 'sending', claimed_at = ?
+            WHERE id IN (
+                SELECT id FROM outbox
+                WHERE (status = 'pending' AND next_attempt_at <= ?)
+                   OR (status = 'sending' AND claimed_at < ?)
+                ORDER BY id
+                LIMIT ?
+            )
+            RETURNING id, chat_id, template, payload, attempts
+        ''', (now, now, now - stale_after, limit))
+        rows = sorted(cursor.fetchall())
+    conn.close()
+    return [(row_id, chat_id, template, json.loads(payload), attempts)
+            for row_id, chat_id, template, payload, attempts in rows]
+
+def mark_outbox_sent(message_ids):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.executemany("UPDATE outbox SET status = 'sent' WHERE id = ?", [(message_id,) for message_id in message_ids])
+    conn.commit()
+    conn.close()
+
+def retry_outbox_message(message_id, attempts, next_attempt_at, error):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        UPDATE outbox SET status = 'pending', attempts = ?, next_attempt_at = ?, last_error = ?
+        WHERE id = ?
+    ''', (attempts, next_attempt_at, error, message_id))
+    conn.commit()
+    conn.close()
+
+def fail_outbox_message(message_id, error):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("UPDATE outbox SET status = 'failed', last_error = ? WHERE id = ?", (error, message_id))
+    conn.commit()
+    conn.close()
+
+def purge_sent_outbox(older_than_seconds):
+    """Borra los mensajes ya enviados más antiguos que el umbral"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "DELETE FROM outbox WHERE status = 'sent' AND created_at < ?",
+        (int(time.time() - older_than_seconds),)
+    )
+    deleted = cursor.rowcount
+    conn.commit()
+    conn.close()
+    return deleted
+
+def count_outbox(status='pending'):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM outbox WHERE status = ?", (status,))
+    count = cursor.fetchone()[0]
+    conn.close()
+    return count
+
+# === FSM STORAGE ===
+
+def load_fsm_record(storage_key):
+    """Devuelve (state, data, updated_at) de una clave FSM o None"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT state, data, updated_at FROM fsm_storage WHERE storage_key = ?", (storage_key,))
+    row = cursor.fetchone()
+    conn.close()
+    return row
+
+def save_fsm_records(upserts, deleted_keys):
+    """Escribe un lote de estados FSM en una sola transacción"""
+    conn = get_db_connection()
+    with conn:
+        cursor = conn.cursor()
+        cursor.executemany(
+            "INSERT OR REPLACE INTO fsm_storage (storage_key, state, data, updated_at) VALUES (?, ?, ?, ?)",
+            upserts
+        )
+        cursor.executemany("DELETE FROM fsm_storage WHERE storage_key = ?", [(key,) for key in deleted_keys])
+    conn.close()
+
+def get_fsm_keys(updated_after):
+    """Claves FSM con actividad posterior a 'updated_after' (epoch)"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT storage_key FROM fsm_storage WHERE updated_at >= ?", (int(updated_after),))
+    keys = [row[0] for row in cursor.fetchall()]
+    conn.close()
+    return keys
+
+def purge_fsm_records(older_than):
+    """Borra los estados FSM sin actividad desde 'older_than' (epoch) y devuelve sus claves"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM fsm_storage WHERE updated_at < ? RETURNING storage_key", (int(older_than),))
+    deleted = [row[0] for row in cursor.fetchall()]
+    conn.commit()
+    conn.close()
+    return deleted
@@ -0,0 +1,148 @@
+# bot/event_bus.py
+"""
+Bus de eventos de dominio en proceso
+Los handlers de pago publican un evento en cuanto la liquidación queda
+confirmada en SQLite; recibos, entrega de contenido, avisos al creador y
+estadísticas se atienden después. Cada suscriptor tiene su propia cola acotada
+y sus workers, así un suscriptor lento no frena a los demás. Con la cola llena,
+publish() espera (backpressure) en lugar de acumular memoria sin límite
+"""
+
+import asyncio
+import logging
+import os
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+EVENT_BUS_QUEUE_SIZE = int(os.getenv("EVENT_BUS_QUEUE_SIZE", 1000))
+
+EventHandler = Callable[[Any], Awaitable[None]]
+
+# === EVENTOS DE DOMINIO ===
+
+@dataclass(frozen=True)
+class PaymentSettled:
+    """Un pago quedó registrado en la contabilidad (transacción + balance del creador)"""
+    kind: str  # 'sub', 'ppv', 'tip'
+    charge_id: str
+    payer_id: int
+    creator_id: int
+    amount_stars: int
+    commission_stars: int
+    chat_id: int
+
+@dataclass(frozen=True)
+class SubscriptionGranted:
+    fan_id: int
+    creator_id: int
+    expires_at: int
+    chat_id: int
+
+@dataclass(frozen=True)
+class ContentPurchased:
+    """Hay que entregar un contenido PPV; redelivery indica una reentrega sin cobro nuevo"""
+    buyer_id: int
+    content_id: int
+    amount_stars: int
+    chat_id: int
+    redelivery: bool = False
+
+# === BUS ===
+
+class _Subscriber:
+    def __init__(self, name: str, handler: EventHandler, queue_size: int, workers: int):
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.tasks: List[asyncio.Task] = []
+        self.processed = 0
+        self.failed = 0
+
+    async def run(self):
+        while True:
+            event = await self.queue.get()
+            try:
+                await self.handler(event)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"❌ Suscriptor {self.name} falló con {type(event).__name__}: {e}")
+            finally:
+                self.queue.task_done()
+
+class EventBus:
+    """Publicación/suscripción por tipo de evento con colas acotadas"""
+
+    def __init__(self, queue_size: int = EVENT_BUS_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.bot = None  # se asigna al arrancar; lo usan los suscriptores que envían mensajes
+        self._subscribers: Dict[type, List[_Subscriber]] = {}
+        self._running = False
+
+    def subscribe(self, event_type: type, handler: EventHandler, name: Optional[str] = None, workers: int = 1):
+        """Registra una corrutina para un tipo de evento; puede hacerse antes o después de start()"""
+        subscriber = _Subscriber(name or handler.__name__, handler, self.queue_size, workers)
+        self._subscribers.setdefault(event_type, []).append(subscriber)
+        if self._running:
+            self._spawn(subscriber)
+        return handler
+
+    def on(self, event_type: type, workers: int = 1):
+        """Decorador equivalente a subscribe()"""
+        def decorator(handler: EventHandler):
+            return self.subscribe(event_type, handler, workers=workers)
+        return decorator
+
+    async def publish(self, event):
+        """Entrega el evento a las colas de sus suscriptores; espera si alguna está llena"""
+        for subscriber in self._subscribers.get(type(event), ()):
+            await subscriber.queue.put(event)
+
+    def _spawn(self, subscriber: _Subscriber):
+        subscriber.tasks = [
+            asyncio.create_task(subscriber.run(), name=f"event-{subscriber.name}-{i}")
+            for i in range(subscriber.workers)
+        ]
+
+    def start(self):
+        """Arranca los workers de todos los suscriptores (idempotente)"""
+        if self._running:
+            return
+        self._running = True
+        for subscribers in self._subscribers.values():
+            for subscriber in subscribers:
+                self._spawn(subscriber)
+
+    async def stop(self, timeout: float = 10):
+        """Espera a que se vacíen las colas (como mucho 'timeout' segundos) y detiene los workers"""
+        subscribers = [s for subs in self._subscribers.values() for s in subs]
+        try:
+            await asyncio.wait_for(asyncio.gather(*(s.queue.join() for s in subscribers)), timeout)
+        except asyncio.TimeoutError:
+            pending = sum(s.queue.qsize() for s in subscribers)
+            logger.warning(f"⚠️ Bus de eventos detenido con {pending} eventos sin procesar")
+        tasks = [task for s in subscribers for task in s.tasks]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for subscriber in subscribers:
+            subscriber.tasks = []
+        self._running = False
+
+    def stats(self) -> dict:
+        return {
+            subscriber.name: {
+                "event": event_type.__name__,
+                "queued": subscriber.queue.qsize(),
+                "processed": subscriber.processed,
+                "failed": subscriber.failed,
+            }
+            for event_type, subscribers in self._subscribers.items()
+            for subscriber in subscribers
+        }
+
+# Instancia global del bus de eventos
+event_bus = EventBus()
@@ -0,0 +1,309 @@
+# bot/fsm_storage.py
+"""
+Almacenamiento FSM
+SQLiteStorage: los estados de registro, subida de PPV o retiro sobreviven a
+un reinicio. Lecturas y escrituras se sirven desde memoria; las escrituras
+marcan la clave como sucia y un flusher las vuelca cada FSM_FLUSH_INTERVAL
+segundos en una sola transacción, así varias escrituras seguidas de la misma
+clave cuestan una fila. Los estados inactivos más de FSM_STATE_TTL caducan.
+
+BoundedMemoryStorage: alternativa sin persistencia con memoria acotada
+(LRU + caducidad por inactividad + tope duro de entradas)
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from database import load_fsm_record, save_fsm_records, get_fsm_keys, purge_fsm_records
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+FSM_FLUSH_INTERVAL = float(os.getenv("FSM_FLUSH_INTERVAL", 0.5))
+FSM_STATE_TTL = int(os.getenv("FSM_STATE_TTL", 7 * 24 * 60 * 60))
+# Un registro sin cambios pendientes se suelta de memoria tras este tiempo sin uso
+FSM_CACHE_IDLE = int(os.getenv("FSM_CACHE_IDLE", 600))
+# Solo BoundedMemoryStorage: tope de contextos en memoria y caducidad por inactividad
+FSM_MEMORY_MAX_ENTRIES = int(os.getenv("FSM_MEMORY_MAX_ENTRIES", 50000))
+FSM_MEMORY_IDLE_TTL = int(os.getenv("FSM_MEMORY_IDLE_TTL", 6 * 60 * 60))
+MAINTENANCE_INTERVAL = 60
+COMPRESS_MIN_BYTES = 256
+
+# === CODIFICACIÓN ===
+
+def encode_data(data: Dict[str, Any]) -> bytes:
+    """JSON compacto; si pasa de COMPRESS_MIN_BYTES y zlib lo reduce, comprimido
+
+    Prefijo de un byte: b'j' JSON, b'z' JSON comprimido. Un dict vacío es b''
+    """
+    if not data:
+        return b""
+    raw = json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode()
+    if len(raw) >= COMPRESS_MIN_BYTES:
+        compressed = zlib.compress(raw)
+        if len(compressed) < len(raw):
+            return b"z" + compressed
+    return b"j" + raw
+
+def decode_data(blob: Optional[bytes]) -> Dict[str, Any]:
+    if not blob:
+        return {}
+    if blob[:1] == b"z":
+        return json.loads(zlib.decompress(blob[1:]))
+    return json.loads(blob[1:])
+
+def storage_key_id(key: StorageKey) -> str:
+    """Clave compacta de texto para una StorageKey de aiogram"""
+    return (
+        f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:"
+        f"{key.business_connection_id or ''}:{key.destiny}"
+    )
+
+# === STORAGE ===
+
+class _Record:
+    __slots__ = ("state", "data", "touched")
+
+    def __init__(self, state: Optional[str] = None, data: Optional[dict] = None):
+        self.state = state
+        self.data = data or {}
+        self.touched = time.monotonic()
+
+class SQLiteStorage(BaseStorage):
+    """Storage FSM con caché en memoria y volcado diferido y agrupado a SQLite"""
+
+    def __init__(
+        self,
+        flush_interval: float = FSM_FLUSH_INTERVAL,
+        state_ttl: int = FSM_STATE_TTL,
+        cache_idle: int = FSM_CACHE_IDLE,
+    ):
+        self.flush_interval = flush_interval
+        self.state_ttl = state_ttl
+        self.cache_idle = cache_idle
+        self._cache: Dict[str, _Record] = {}
+        self._dirty: set = set()
+        # Claves con fila en disco: un usuario nuevo no cuesta una consulta a SQLite
+        self._on_disk: Optional[set] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._last_maintenance = time.monotonic()
+        # Métricas: escrituras lógicas frente a filas realmente volcadas
+        self.writes = 0
+        self.flushes = 0
+        self.rows_flushed = 0
+
+    def _record(self, key: StorageKey) -> _Record:
+        key_id = storage_key_id(key)
+        record = self._cache.get(key_id)
+        if record is None:
+            if self._on_disk is None:
+                self._on_disk = set(get_fsm_keys(time.time() - self.state_ttl))
+            record = _Record()
+            if key_id in self._on_disk:
+                row = load_fsm_record(key_id)
+                if row and row[2] >= time.time() - self.state_ttl:
+                    record.state, record.data = row[0], decode_data(row[1])
+            self._cache[key_id] = record
+        record.touched = time.monotonic()
+        return record
+
+    def _mark_dirty(self, key: StorageKey):
+        self._dirty.add(storage_key_id(key))
+        self.writes += 1
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flusher(), name="fsm-flusher")
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        self._record(key).state = state.state if isinstance(state, State) else state
+        self._mark_dirty(key)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return self._record(key).state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        self._record(key).data = data.copy()
+        self._mark_dirty(key)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return self._record(key).data.copy()
+
+    async def update_data(self, key: StorageKey, data: Dict[str, Any]) -> Dict[str, Any]:
+        record = self._record(key)
+        record.data.update(data)
+        self._mark_dirty(key)
+        return record.data.copy()
+
+    async def modify_data(self, key: StorageKey, func: Callable[[Dict[str, Any]], T], readonly: bool = False) -> T:
+        """Aplica func a los datos en sitio, sin copiarlos; devuelve lo que devuelva func"""
+        record = self._record(key)
+        result = func(record.data)
+        if not readonly:
+            self._mark_dirty(key)
+        return result
+
+    def flush(self) -> int:
+        """Vuelca a SQLite las claves sucias en una transacción; devuelve cuántas"""
+        if not self._dirty:
+            return 0
+        now = int(time.time())
+        upserts, deletes = [], []
+        for key_id in self._dirty:
+            record = self._cache.get(key_id)
+            if record is None:
+                continue
+            if record.state is None and not record.data:
+                deletes.append(key_id)
+            else:
+                upserts.append((key_id, record.state, encode_data(record.data), now))
+        save_fsm_records(upserts, deletes)
+        if self._on_disk is not None:
+            self._on_disk.update(row[0] for row in upserts)
+            self._on_disk.difference_update(deletes)
+        flushed = len(self._dirty)
+        self._dirty.clear()
+        self.flushes += 1
+        self.rows_flushed += flushed
+        return flushed
+
+    def _maintenance(self):
+        """Suelta de memoria los registros limpios inactivos y purga los caducados en disco"""
+        cutoff = time.monotonic() - self.cache_idle
+        idle = [key_id for key_id, record in self._cache.items()
+                if record.touched < cutoff and key_id not in self._dirty]
+        for key_id in idle:
+            del self._cache[key_id]
+        purged = purge_fsm_records(time.time() - self.state_ttl)
+        if self._on_disk is not None:
+            self._on_disk.difference_update(purged)
+        if idle or purged:
+            logger.info(f"ℹ️ FSM: {len(idle)} registros liberados de memoria, {len(purged)} caducados purgados")
+
+    async def _flusher(self):
+        while self._dirty or self._cache:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                self.flush()
+                if time.monotonic() - self._last_maintenance >= MAINTENANCE_INTERVAL:
+                    self._last_maintenance = time.monotonic()
+                    self._maintenance()
+            except Exception as e:
+                logger.error(f"❌ Error volcando el storage FSM: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "cached": len(self._cache),
+            "dirty": len(self._dirty),
+            "writes": self.writes,
+            "flushes": self.flushes,
+            "rows_flushed": self.rows_flushed,
+        }
+
+    async def close(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+        self.flush()
+
+class BoundedMemoryStorage(BaseStorage):
+    """Storage FSM en memoria con LRU, caducidad por inactividad y tope duro de entradas
+
+    A diferencia de MemoryStorage, leer una clave desconocida no crea nada y un
+    contexto sin estado ni datos se borra: un visitante de una sola vez que no
+    deja datos no ocupa memoria, y los que sí dejan datos caducan o se desalojan
+    """
+
+    def __init__(self, max_entries: int = FSM_MEMORY_MAX_ENTRIES, idle_ttl: float = FSM_MEMORY_IDLE_TTL):
+        self.max_entries = max_entries
+        self.idle_ttl = idle_ttl
+        # Orden LRU: el primero es el usado hace más tiempo
+        self._entries: "OrderedDict[StorageKey, _Record]" = OrderedDict()
+        self.evicted_lru = 0
+        self.evicted_idle = 0
+
+    def _expire_idle(self):
+        """Caduca desde la cabeza del LRU; O(1) amortizado por operación"""
+        cutoff = time.monotonic() - self.idle_ttl
+        while self._entries:
+            record = next(iter(self._entries.values()))
+            if record.touched >= cutoff:
+                break
+            self._entries.popitem(last=False)
+            self.evicted_idle += 1
+
+    def _get(self, key: StorageKey) -> Optional[_Record]:
+        self._expire_idle()
+        record = self._entries.get(key)
+        if record is not None:
+            record.touched = time.monotonic()
+            self._entries.move_to_end(key)
+        return record
+
+    def _put(self, key: StorageKey) -> _Record:
+        record = self._get(key)
+        if record is None:
+            record = _Record()
+            self._entries[key] = record
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evicted_lru += 1
+        return record
+
+    def _discard_if_empty(self, key: StorageKey, record: _Record):
+        if record.state is None and not record.data:
+            self._entries.pop(key, None)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = self._put(key)
+        record.state = state.state if isinstance(state, State) else state
+        self._discard_if_empty(key, record)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        record = self._get(key)
+        return record.state if record else None
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        record = self._put(key)
+        record.data = data.copy()
+        self._discard_if_empty(key, record)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        record = self._get(key)
+        return record.data.copy() if record else {}
+
+    async def update_data(self, key: StorageKey, data: Dict[str, Any]) -> Dict[str, Any]:
+        record = self._put(key)
+        record.data.update(data)
+        self._discard_if_empty(key, record)
+        return record.data.copy()
+
+    async def modify_data(self, key: StorageKey, func: Callable[[Dict[str, Any]], T], readonly: bool = False) -> T:
+        """Aplica func a los datos en sitio, sin copiarlos; devuelve lo que devuelva func"""
+        if readonly:
+            record = self._get(key)
+            return func(record.data if record else {})
+        record = self._put(key)
+        result = func(record.data)
+        self._discard_if_empty(key, record)
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "cached": len(self._entries),
+            "max_entries": self.max_entries,
+            "evicted_lru": self.evicted_lru,
+            "evicted_idle": self.evicted_idle,
+        }
+
+    async def close(self) -> None:
+        self._entries.clear()
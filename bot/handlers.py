@@ -6,24 +6,33 @@ from aiogram.fsm.context import FSMContext
 from database import init_db, get_creator_by_id, is_user_banned
 from keyboards import get_main_keyboard, get_fan_keyboard, get_main_menu
 from nav_states import MenuState, NavigationManager
+from menu_router import MenuButton
+from callbacks import DeleteContent, ConfirmDelete
+from payment_router import router as payment_router
 from payments import router as payments_router
 from creator_handlers import router as creator_router
 from admin_handlers import router as admin_router
 from ppv_handlers import router as ppv_router
 from catalog_handlers import router as catalog_router
 from nav_handlers import router as nav_router
-from videocall_handlers import router as videocall_router
+from settings import settings
 
 router = Router()
 
 # Include all handlers
 router.include_router(nav_router)  # Sistema de navegación jerárquica
+router.include_router(payment_router)  # Único punto de entrada de pre_checkout y successful_payment
 router.include_router(payments_router)
 router.include_router(creator_router)
 router.include_router(admin_router)
 router.include_router(ppv_router)
 router.include_router(catalog_router)
-router.include_router(videocall_router)  # Sistema de videollamadas
+if settings.videocalls_enabled:
+    # Sistema de videollamadas: importa Pyrogram, solo se carga con credenciales
+    from videocall_handlers import router as videocall_router
+    router.include_router(videocall_router)
+
+VIDEOCALLS_DISABLED_TEXT = "❌ Sistema de videollamadas no disponible temporalmente."
 
 @router.message(Command("start"))
 async def cmd_start(message: Message, state: FSMContext):
@@ -65,7 +74,7 @@ async def cmd_start(message: Message, state: FSMContext):
 
 # HANDLERS PARA BOTONES DEL TECLADO (solo los no manejados por navegación jerárquica)
 
-@router.message(F.text == "📺 Mis Catálogos")
+@router.message(MenuButton("📺 Mis Catálogos"))
 async def keyboard_my_catalogs(message: Message, state: FSMContext):
     from catalog_handlers import show_my_catalogs
     await show_my_catalogs(message, state)
@@ -77,7 +86,7 @@ async def keyboard_my_catalogs(message: Message, state: FSMContext):
 # - "ℹ️ Ayuda"
 # - "⬅️ Volver"
 
-@router.message(F.text == "💰 Enviar Propina")
+@router.message(MenuButton("💰 Enviar Propina"))
 async def keyboard_send_tip(message: Message):
     await message.answer(
         "💰 <b>ENVIAR PROPINA</b>\n\n"
@@ -89,20 +98,26 @@ async def keyboard_send_tip(message: Message):
         "💡 Puedes encontrar el ID de los creadores en 🔍 Explorar Creadores"
     )
 
-@router.message(F.text == "🎥 Videollamadas")
+@router.message(MenuButton("🎥 Videollamadas"))
 async def keyboard_videocalls_fan(message: Message):
     """Handler para botón de videollamadas para fans"""
+    if not settings.videocalls_enabled:
+        await message.answer(VIDEOCALLS_DISABLED_TEXT)
+        return
     from videocall_handlers import show_available_creators_for_videocall
     await show_available_creators_for_videocall(message)
 
-@router.message(F.text == "🎥 Configurar Videollamadas")
+@router.message(MenuButton("🎥 Configurar Videollamadas"))
 async def keyboard_videocall_config(message: Message):
     """Handler para botón de configuración de videollamadas para creadores"""
+    if not settings.videocalls_enabled:
+        await message.answer(VIDEOCALLS_DISABLED_TEXT)
+        return
     from videocall_handlers import show_videocall_config
     await show_videocall_config(message)
 
 
-@router.message(F.text == "👤 Mi Perfil")
+@router.message(MenuButton("👤 Mi Perfil"))
 async def keyboard_my_profile(message: Message):
     from creator_handlers import my_profile
     from keyboards import get_creator_profile_menu
@@ -114,17 +129,17 @@ async def keyboard_my_profile(message: Message):
         reply_markup=get_creator_profile_menu()
     )
 
-@router.message(F.text == "💎 Balance")
+@router.message(MenuButton("💎 Balance"))
 async def keyboard_balance(message: Message):
     from creator_handlers import check_balance
     await check_balance(message)
 
-@router.message(F.text == "📸 Crear PPV")
+@router.message(MenuButton("📸 Crear PPV"))
 async def keyboard_create_ppv(message: Message, state: FSMContext):
     from creator_handlers import create_ppv_content
     await create_ppv_content(message, state)
 
-@router.message(F.text == "📊 Mi Catálogo")
+@router.message(MenuButton("📊 Mi Catálogo"))
 async def keyboard_my_catalog(message: Message):
     if is_user_banned(message.from_user.id):
         await message.answer("❌ Tu cuenta está baneada.")
@@ -195,7 +210,7 @@ async def keyboard_my_catalog(message: Message):
         
         # Botón de gestión: solo eliminar
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="🗑️ Eliminar", callback_data=f"delete_content_{content_id}")]
+            [InlineKeyboardButton(text="🗑️ Eliminar", callback_data=DeleteContent(content_id=content_id).pack())]
         ])
         
         try:
@@ -270,16 +285,16 @@ async def keyboard_my_catalog(message: Message):
 
 # Handlers para el botón de gestión de contenido del catálogo profesional
 
-@router.callback_query(F.data.startswith("delete_content_"))
-async def delete_content_callback(callback: CallbackQuery):
+@router.callback_query(DeleteContent.filter())
+async def delete_content_callback(callback: CallbackQuery, callback_data: DeleteContent):
     await callback.answer()
-    content_id = int(callback.data.split("_")[2])
+    content_id = callback_data.content_id
     
     # Crear confirmación de eliminación
     from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [
-            InlineKeyboardButton(text="✅ Confirmar Eliminación", callback_data=f"confirm_delete_{content_id}"),
+            InlineKeyboardButton(text="✅ Confirmar Eliminación", callback_data=ConfirmDelete(content_id=content_id).pack()),
             InlineKeyboardButton(text="❌ Cancelar", callback_data="cancel_delete")
         ]
     ])
@@ -293,10 +308,10 @@ async def delete_content_callback(callback: CallbackQuery):
         reply_markup=keyboard
     )
 
-@router.callback_query(F.data.startswith("confirm_delete_"))
-async def confirm_delete_callback(callback: CallbackQuery):
+@router.callback_query(ConfirmDelete.filter())
+async def confirm_delete_callback(callback: CallbackQuery, callback_data: ConfirmDelete):
     await callback.answer()
-    content_id = int(callback.data.split("_")[2])
+    content_id = callback_data.content_id
     
     from database import delete_ppv_content
     success, message_text = delete_ppv_content(content_id, callback.from_user.id)
@@ -322,17 +337,17 @@ async def cancel_delete_callback(callback: CallbackQuery):
     )
 
 
-@router.message(F.text == "⚙️ Editar Perfil")
+@router.message(MenuButton("⚙️ Editar Perfil"))
 async def keyboard_edit_profile(message: Message):
     from creator_handlers import edit_profile_menu
     await edit_profile_menu(message)
 
-@router.message(F.text == "🔍 Explorar")
+@router.message(MenuButton("🔍 Explorar"))
 async def keyboard_explore_as_creator(message: Message):
     from creator_handlers import explore_creators
     await explore_creators(message)
 
-@router.message(F.text == "👥 Ver Como Fan")
+@router.message(MenuButton("👥 Ver Como Fan"))
 async def keyboard_view_as_fan(message: Message):
     if is_user_banned(message.from_user.id):
         await message.answer("❌ Tu cuenta está baneada.")
@@ -347,7 +362,7 @@ async def keyboard_view_as_fan(message: Message):
         reply_markup=keyboard
     )
 
-@router.message(F.text == "🎨 Volver a Creador")
+@router.message(MenuButton("🎨 Volver a Creador"))
 async def keyboard_back_to_creator(message: Message, state: FSMContext):
     if is_user_banned(message.from_user.id):
         await message.answer("❌ Tu cuenta está baneada.")
@@ -372,12 +387,12 @@ async def keyboard_back_to_creator(message: Message, state: FSMContext):
 
 # ==================== HANDLERS PARA SUBMENÚ DE PERFIL ====================
 
-@router.message(F.text == "💰 Ver Balance")
+@router.message(MenuButton("💰 Ver Balance"))
 async def profile_check_balance(message: Message):
     from creator_handlers import check_balance
     await check_balance(message)
 
-@router.message(F.text == "💸 Retirar Ganancias")
+@router.message(MenuButton("💸 Retirar Ganancias"))
 async def profile_withdraw_menu(message: Message):
     if is_user_banned(message.from_user.id):
         await message.answer("❌ Tu cuenta está baneada.")
@@ -397,17 +412,17 @@ async def profile_withdraw_menu(message: Message):
         "💡 Verifica tu balance primero con '💰 Ver Balance'"
     )
 
-@router.message(F.text == "🎥 Crear Contenido PPV")
+@router.message(MenuButton("🎥 Crear Contenido PPV"))
 async def profile_create_ppv(message: Message, state: FSMContext):
     from creator_handlers import create_ppv_content
     await create_ppv_content(message, state)
 
-@router.message(F.text == "✏️ Editar Perfil")
+@router.message(MenuButton("✏️ Editar Perfil"))
 async def profile_edit_profile(message: Message):
     from creator_handlers import edit_profile_menu
     await edit_profile_menu(message)
 
-@router.message(F.text == "📈 Mis Estadísticas")
+@router.message(MenuButton("📈 Mis Estadísticas"))
 async def profile_my_stats(message: Message):
     if is_user_banned(message.from_user.id):
         await message.answer("❌ Tu cuenta está baneada.")
@@ -428,7 +443,7 @@ async def profile_my_stats(message: Message):
         "• Y mucho más..."
     )
 
-@router.message(F.text == "🔙 Volver al Menú")
+@router.message(MenuButton("🔙 Volver al Menú"))
 async def profile_back_to_main(message: Message, state: FSMContext):
     if is_user_banned(message.from_user.id):
         await message.answer("❌ Tu cuenta está baneada.")
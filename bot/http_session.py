@@ -0,0 +1,146 @@
+# bot/http_session.py
+"""
+Sesión HTTP compartida para el cliente de la Bot API (aiogram)
+Permite ajustar el pool de conexiones, keep-alive, caché DNS y timeouts,
+con un pool separado para subidas pesadas (videos, álbumes, Paid Media)
+"""
+
+import os
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+
+# Métodos que pueden transportar archivos grandes y usan el pool de subidas
+UPLOAD_METHODS = frozenset({
+    "sendVideo",
+    "sendDocument",
+    "sendAnimation",
+    "sendMediaGroup",
+    "sendPaidMedia",
+})
+
+@dataclass(frozen=True)
+class HttpSessionConfig:
+    """Parámetros del pool HTTP de la Bot API"""
+    pool_limit: int = 100               # Conexiones simultáneas totales
+    pool_limit_per_host: int = 0        # 0 = sin límite por host
+    keepalive_timeout: float = 60.0     # Segundos que una conexión ociosa sigue abierta
+    dns_cache_ttl: int = 3600           # Segundos de caché DNS
+    request_timeout: float = 60.0       # Timeout por petición normal
+    upload_pool_limit: int = 10         # Conexiones simultáneas para subidas
+    upload_timeout: float = 300.0       # Timeout por subida
+
+    @classmethod
+    def from_env(cls) -> "HttpSessionConfig":
+        """Construye la configuración desde variables de entorno"""
+        return cls(
+            pool_limit=int(os.getenv("BOT_HTTP_POOL_LIMIT", 100)),
+            pool_limit_per_host=int(os.getenv("BOT_HTTP_POOL_LIMIT_PER_HOST", 0)),
+            keepalive_timeout=float(os.getenv("BOT_HTTP_KEEPALIVE", 60)),
+            dns_cache_ttl=int(os.getenv("BOT_HTTP_DNS_TTL", 3600)),
+            request_timeout=float(os.getenv("BOT_HTTP_TIMEOUT", 60)),
+            upload_pool_limit=int(os.getenv("BOT_UPLOAD_POOL_LIMIT", 10)),
+            upload_timeout=float(os.getenv("BOT_UPLOAD_TIMEOUT", 300)),
+        )
+
+class PoolMetrics:
+    """Contadores de uso de un pool de conexiones"""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def as_dict(self) -> dict:
+        avg = self.total_latency / self.requests if self.requests else 0.0
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "avg_latency_ms": round(avg * 1000, 2),
+            "max_latency_ms": round(self.max_latency * 1000, 2),
+        }
+
+def _configure_connector(session: AiohttpSession, limit: int, config: HttpSessionConfig):
+    """Aplica los parámetros del pool al TCPConnector que crea aiogram"""
+    session._connector_init.update({
+        "limit": limit,
+        "limit_per_host": config.pool_limit_per_host,
+        "keepalive_timeout": config.keepalive_timeout,
+        "use_dns_cache": True,
+        "ttl_dns_cache": config.dns_cache_ttl,
+    })
+
+class TunedAiohttpSession(AiohttpSession):
+    """AiohttpSession con pool configurable, pool de subidas separado y métricas"""
+
+    def __init__(self, config: Optional[HttpSessionConfig] = None):
+        config = config or HttpSessionConfig()
+        super().__init__(limit=config.pool_limit, timeout=config.request_timeout)
+        _configure_connector(self, config.pool_limit, config)
+
+        self.config = config
+        self.upload_session = AiohttpSession(limit=config.upload_pool_limit, timeout=config.upload_timeout)
+        _configure_connector(self.upload_session, config.upload_pool_limit, config)
+
+        self.metrics = {"default": PoolMetrics(), "upload": PoolMetrics()}
+
+    async def make_request(
+        self, bot: Bot, method: TelegramMethod[TelegramType], timeout: Optional[int] = None
+    ) -> TelegramType:
+        if method.__api_method__ in UPLOAD_METHODS:
+            pool_name = "upload"
+            request = self.upload_session.make_request
+        else:
+            pool_name = "default"
+            request = super().make_request
+
+        metrics = self.metrics[pool_name]
+        metrics.requests += 1
+        metrics.in_flight += 1
+        metrics.peak_in_flight = max(metrics.peak_in_flight, metrics.in_flight)
+        started = time.perf_counter()
+        try:
+            return await request(bot, method, timeout=timeout)
+        except Exception:
+            metrics.errors += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.in_flight -= 1
+            metrics.total_latency += elapsed
+            metrics.max_latency = max(metrics.max_latency, elapsed)
+
+    def pool_stats(self) -> dict:
+        """Devuelve métricas de peticiones y ocupación de cada pool"""
+        stats = {}
+        for pool_name, session in (("default", self), ("upload", self.upload_session)):
+            pool = self.metrics[pool_name].as_dict()
+            connector = session._session.connector if session._session and not session._session.closed else None
+            if connector is not None:
+                # Atributos internos de aiohttp: conexiones en uso y ociosas en el pool
+                pool["connections_in_use"] = len(getattr(connector, "_acquired", ()))
+                pool["connections_idle"] = sum(len(conns) for conns in getattr(connector, "_conns", {}).values())
+            else:
+                pool["connections_in_use"] = 0
+                pool["connections_idle"] = 0
+            pool["limit"] = session._connector_init["limit"]
+            stats[pool_name] = pool
+        return stats
+
+    async def close(self) -> None:
+        await self.upload_session.close()
+        await super().close()
+
+def create_bot_session(config: Optional[HttpSessionConfig] = None) -> TunedAiohttpSession:
+    """Fábrica de la sesión HTTP compartida del bot"""
+    return TunedAiohttpSession(config or HttpSessionConfig.from_env())
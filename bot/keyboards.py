@@ -1,16 +1,14 @@
 # bot/keyboards.py
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
 from database import get_creator_by_id
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
+from callbacks import SubscriptionPrice, Subscribe, ConfirmSubscription, CreatorPage, ConfirmWithdraw
+from settings import settings
 
 def is_admin_user(username: str) -> bool:
     """Verificar si un usuario es administrador"""
     if not username:
         return False
-    admin_username = os.getenv("ADMIN_USERNAME", "@admin")
+    admin_username = settings.admin_username
     user_at = f"@{username}" if not username.startswith("@") else username
     return user_at == admin_username or username == admin_username.replace("@", "")
 
@@ -164,7 +162,7 @@ def get_creator_onboarding_menu() -> ReplyKeyboardMarkup:
 def get_main_keyboard(user_id: int, username: str = None) -> ReplyKeyboardMarkup:
     """Genera el teclado principal simplificado según el rol del usuario"""
     creator = get_creator_by_id(user_id)
-    admin_username = os.getenv("ADMIN_USERNAME", "@admin")
+    admin_username = settings.admin_username
     
     # Función para verificar si es admin por username
     def is_admin_user(check_username: str) -> bool:
@@ -256,7 +254,7 @@ def get_profile_edit_keyboard() -> InlineKeyboardMarkup:
 def get_withdrawal_confirmation_keyboard(amount: int) -> InlineKeyboardMarkup:
     """Teclado de confirmación para retiro"""
     keyboard = [
-        [InlineKeyboardButton(text=f"✅ Confirmar Retiro de {amount} ⭐️", callback_data=f"confirm_withdraw_{amount}")],
+        [InlineKeyboardButton(text=f"✅ Confirmar Retiro de {amount} ⭐️", callback_data=ConfirmWithdraw(amount=amount).pack())],
         [InlineKeyboardButton(text="❌ Cancelar", callback_data="profile_balance")]
     ]
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
@@ -289,13 +287,13 @@ def get_price_selection_keyboard() -> InlineKeyboardMarkup:
     """Teclado inline para selección rápida de precios"""
     keyboard = [
         [
-            InlineKeyboardButton(text="💎 50 ⭐️", callback_data="price_50"),
-            InlineKeyboardButton(text="💎 100 ⭐️", callback_data="price_100"),
-            InlineKeyboardButton(text="💎 200 ⭐️", callback_data="price_200")
+            InlineKeyboardButton(text="💎 50 ⭐️", callback_data=SubscriptionPrice(price=50).pack()),
+            InlineKeyboardButton(text="💎 100 ⭐️", callback_data=SubscriptionPrice(price=100).pack()),
+            InlineKeyboardButton(text="💎 200 ⭐️", callback_data=SubscriptionPrice(price=200).pack())
         ],
         [
-            InlineKeyboardButton(text="💎 500 ⭐️", callback_data="price_500"),
-            InlineKeyboardButton(text="💎 1000 ⭐️", callback_data="price_1000"),
+            InlineKeyboardButton(text="💎 500 ⭐️", callback_data=SubscriptionPrice(price=500).pack()),
+            InlineKeyboardButton(text="💎 1000 ⭐️", callback_data=SubscriptionPrice(price=1000).pack()),
             InlineKeyboardButton(text="✏️ Precio Personalizado", callback_data="custom_price")
         ]
     ]
@@ -325,7 +323,7 @@ def get_creator_card_keyboard(creator_id: int, current_page: int = 0, total_page
     
     # Botón principal de suscripción
     keyboard.append([
-        InlineKeyboardButton(text="🌟 Suscribirme", callback_data=f"subscribe_{creator_id}")
+        InlineKeyboardButton(text="🌟 Suscribirme", callback_data=Subscribe(creator_id=creator_id).pack())
     ])
     
     # Navegación entre creadores si hay más de uno
@@ -333,13 +331,13 @@ def get_creator_card_keyboard(creator_id: int, current_page: int = 0, total_page
         nav_buttons = []
         
         if current_page > 0:
-            nav_buttons.append(InlineKeyboardButton(text="◀️ Anterior", callback_data=f"creator_prev_{current_page}"))
+            nav_buttons.append(InlineKeyboardButton(text="◀️ Anterior", callback_data=CreatorPage(page=current_page - 1).pack()))
         
         # Mostrar página actual
         nav_buttons.append(InlineKeyboardButton(text=f"📄 {current_page + 1}/{total_pages}", callback_data="page_info"))
         
         if current_page < total_pages - 1:
-            nav_buttons.append(InlineKeyboardButton(text="▶️ Siguiente", callback_data=f"creator_next_{current_page}"))
+            nav_buttons.append(InlineKeyboardButton(text="▶️ Siguiente", callback_data=CreatorPage(page=current_page + 1).pack()))
         
         keyboard.append(nav_buttons)
     
@@ -348,7 +346,7 @@ def get_creator_card_keyboard(creator_id: int, current_page: int = 0, total_page
 def get_subscription_confirmation_keyboard(creator_id: int, price: int) -> InlineKeyboardMarkup:
     """Teclado de confirmación de suscripción"""
     keyboard = [
-        [InlineKeyboardButton(text=f"✅ Confirmar Suscripción ({price} ⭐️)", callback_data=f"confirm_sub_{creator_id}")],
+        [InlineKeyboardButton(text=f"✅ Confirmar Suscripción ({price} ⭐️)", callback_data=ConfirmSubscription(creator_id=creator_id).pack())],
         [InlineKeyboardButton(text="❌ Cancelar", callback_data="cancel_subscription")]
     ]
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
@@ -377,16 +375,16 @@ def get_creator_price_keyboard() -> InlineKeyboardMarkup:
     """Teclado para seleccionar precio de suscripción"""
     keyboard = [
         [
-            InlineKeyboardButton(text="🆓 GRATIS (0 ⭐️)", callback_data="price_0"),
-            InlineKeyboardButton(text="⭐️ 50 Stars", callback_data="price_50")
+            InlineKeyboardButton(text="🆓 GRATIS (0 ⭐️)", callback_data=SubscriptionPrice(price=0).pack()),
+            InlineKeyboardButton(text="⭐️ 50 Stars", callback_data=SubscriptionPrice(price=50).pack())
         ],
         [
-            InlineKeyboardButton(text="⭐️ 100 Stars", callback_data="price_100"),
-            InlineKeyboardButton(text="⭐️ 200 Stars", callback_data="price_200")
+            InlineKeyboardButton(text="⭐️ 100 Stars", callback_data=SubscriptionPrice(price=100).pack()),
+            InlineKeyboardButton(text="⭐️ 200 Stars", callback_data=SubscriptionPrice(price=200).pack())
         ],
         [
-            InlineKeyboardButton(text="⭐️ 500 Stars", callback_data="price_500"),
-            InlineKeyboardButton(text="⭐️ 1000 Stars", callback_data="price_1000")
+            InlineKeyboardButton(text="⭐️ 500 Stars", callback_data=SubscriptionPrice(price=500).pack()),
+            InlineKeyboardButton(text="⭐️ 1000 Stars", callback_data=SubscriptionPrice(price=1000).pack())
         ],
         [InlineKeyboardButton(text="✏️ Precio Personalizado", callback_data="custom_price")],
         [InlineKeyboardButton(text="❌ Cancelar Registro", callback_data="cancel_registration")]
@@ -1,18 +1,29 @@
 # bot/main.py
 import asyncio
 import logging
+import signal
+from settings import settings, reload_settings  # primero: carga el .env antes que el resto de módulos
 from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
-from aiogram.fsm.storage.memory import MemoryStorage
+from fsm_storage import SQLiteStorage, BoundedMemoryStorage
 from handlers import router
-from database import init_db
-from videocall_system import videocall_manager
+from database import init_db, warm_checkout_cache
+from http_session import create_bot_session
+from catalog_handlers import sweep_paid_media_tracking
+from scheduler import scheduler
+from event_bus import event_bus
+from outbox_relay import outbox_relay
+from menu_router import menu_dispatch
+from callbacks import callback_dispatch
+import payment_subscribers  # registra los suscriptores de eventos de pago
 
-from dotenv import load_dotenv
-import os
-
-load_dotenv()
+def reload_settings_on_sighup():
+    """SIGHUP: recarga la configuración; si no es válida se mantiene la actual"""
+    try:
+        reload_settings()
+    except ValueError as e:
+        logging.error(f"❌ Recarga de configuración rechazada: {e}")
 
 async def main():
     # Configure logging
@@ -22,26 +33,35 @@ async def main():
     )
     
     # Validate BOT_TOKEN is present
-    bot_token = os.getenv("BOT_TOKEN")
+    bot_token = settings.bot_token
     if not bot_token:
         logging.error("❌ BOT_TOKEN environment variable is required but not set!")
         logging.error("Please set BOT_TOKEN in your environment or Replit Secrets.")
         exit(1)
     
+    # Sesión HTTP compartida con pool, keep-alive y timeouts configurables
     bot = Bot(
         token=bot_token,
+        session=create_bot_session(),
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
     
-    # Use memory storage for FSM
-    storage = MemoryStorage()
+    # Estados FSM persistentes en SQLite (sobreviven a reinicios); "memory" usa memoria acotada sin persistencia
+    storage = BoundedMemoryStorage() if settings.fsm_storage == "memory" else SQLiteStorage()
     dp = Dispatcher(storage=storage)
     dp.include_router(router)
+    # Botones de menú: búsqueda directa por texto antes de la cadena de filtros
+    menu_dispatch.build(dp)
+    dp.message.outer_middleware(menu_dispatch)
+    # Callbacks tipados: búsqueda directa por prefijo
+    callback_dispatch.build(dp)
+    dp.callback_query.outer_middleware(callback_dispatch)
 
     # Initialize database
     try:
         init_db()
         logging.info("✅ Database initialized successfully")
+        logging.info(f"✅ Índice de pre-checkout precargado ({warm_checkout_cache()} entradas)")
     except Exception as e:
         logging.error(f"❌ Database initialization failed: {e}")
         exit(1)
@@ -53,25 +73,65 @@ async def main():
         logging.error(f"❌ Failed to get bot info: {e}")
         exit(1)
     
-    # Initialize videocall manager
-    try:
-        success = await videocall_manager.initialize(bot_info.id)
-        if success:
-            logging.info("✅ VideoCall system initialized successfully")
-            print("🎥 Sistema de videollamadas inicializado")
-        else:
-            logging.warning("⚠️ VideoCall system initialization failed")
-            print("⚠️ Sistema de videollamadas no disponible (verifica credenciales)")
-    except Exception as e:
-        logging.error(f"❌ VideoCall system initialization error: {e}")
-        print("⚠️ Sistema de videollamadas no disponible")
+    # Subsistema de videollamadas (Pyrogram): solo se importa si hay credenciales
+    videocall_manager = videocall_waitlist = None
+    if settings.videocalls_enabled:
+        from videocall_system import videocall_manager
+        from videocall_booking import booking_engine
+        from videocall_waitlist import videocall_waitlist
+        try:
+            success = await videocall_manager.initialize(bot_info.id)
+            if success:
+                logging.info("✅ VideoCall system initialized successfully")
+                print("🎥 Sistema de videollamadas inicializado")
+            else:
+                logging.warning("⚠️ VideoCall system initialization failed")
+                print("⚠️ Sistema de videollamadas no disponible (verifica credenciales)")
+        except Exception as e:
+            logging.error(f"❌ VideoCall system initialization error: {e}")
+            print("⚠️ Sistema de videollamadas no disponible")
+        booking_engine.bot = bot
+        videocall_waitlist.bot = bot
+    else:
+        logging.info("ℹ️ Videollamadas desactivadas (faltan TELEGRAM_API_ID/HASH/PHONE_NUMBER)")
+    
+    # Planificador persistente: recarga trabajos pendientes y ejecuta los vencidos
+    event_bus.bot = bot
+    event_bus.start()
+    # Envía los mensajes del outbox (incluidos los que quedaron pendientes antes de un reinicio)
+    outbox_relay.bot = bot
+    outbox_relay.start()
+    scheduler.start()
+    if videocall_manager is not None:
+        # Cerrar sesiones y grupos que quedaron huérfanos tras una caída
+        await videocall_manager.reconciler.start()
+        # Atender las colas de espera que quedaron pendientes
+        await videocall_waitlist.start()
+    
+    # Limpieza periódica del tracking de Paid Media vencido
+    paid_media_sweeper = asyncio.create_task(sweep_paid_media_tracking())
     
     print(f"🤖 Bot iniciado: @{bot_info.username}")
     print("📊 Base de datos inicializada")
     print("💫 Esperando mensajes...")
     
+    # kill -HUP <pid> recarga la configuración sin reiniciar (no disponible en Windows)
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, reload_settings_on_sighup)
+    except (AttributeError, NotImplementedError):
+        pass
+    
     await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        paid_media_sweeper.cancel()
+        await scheduler.stop()
+        await event_bus.stop()
+        await outbox_relay.stop()
+        await storage.close()
+        if videocall_manager is not None:
+            await videocall_manager.shutdown()
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
@@ -0,0 +1,81 @@
+# bot/menu_router.py
+"""
+Despacho O(1) de los botones del teclado de menú
+Los handlers de botones se registran con el filtro MenuButton("texto") en
+vez de F.text == "texto". Al arrancar, MenuDispatch recorre el árbol de
+routers en el mismo orden en que aiogram los prueba y arma un dict
+texto -> handler; como middleware externo de mensajes, si el texto está en
+el dict llama al handler directamente sin recorrer la cadena de filtros de
+todos los routers. Cualquier otro mensaje sigue el enrutado normal
+"""
+
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware, Router
+from aiogram.dispatcher.event.handler import HandlerObject
+from aiogram.filters import BaseFilter
+from aiogram.types import Message
+
+logger = logging.getLogger(__name__)
+
+class MenuButton(BaseFilter):
+    """Filtro de botón de menú: equivale a F.text == text y además lo indexa MenuDispatch"""
+
+    def __init__(self, text: str):
+        self.text = text
+
+    async def __call__(self, message: Message) -> bool:
+        return message.text == self.text
+
+def _menu_text(handler: HandlerObject):
+    """Texto del botón si el único filtro del handler es MenuButton"""
+    if handler.filters and len(handler.filters) == 1:
+        menu_filter = handler.filters[0].callback
+        if isinstance(menu_filter, MenuButton):
+            return menu_filter.text
+    return None
+
+class MenuDispatch(BaseMiddleware):
+    """Middleware externo con la tabla texto -> handler de los botones de menú"""
+
+    def __init__(self):
+        self._table: Dict[str, HandlerObject] = {}
+        self.hits = 0
+        self.fallthrough = 0
+
+    def build(self, root: Router) -> int:
+        """Indexa los botones de menú del árbol; gana el primero en orden de aiogram"""
+        self._table.clear()
+        self._index(root)
+        logger.info(f"✅ Tabla de menú: {len(self._table)} botones")
+        return len(self._table)
+
+    def _index(self, router: Router):
+        # aiogram prueba primero los handlers propios del router y luego sus sub-routers
+        for handler in router.message.handlers:
+            text = _menu_text(handler)
+            if text is not None:
+                self._table.setdefault(text, handler)
+        for sub_router in router.sub_routers:
+            self._index(sub_router)
+
+    async def __call__(
+        self,
+        handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
+        event: Message,
+        data: Dict[str, Any],
+    ) -> Any:
+        menu_handler = self._table.get(event.text) if event.text else None
+        if menu_handler is None:
+            self.fallthrough += 1
+            return await handler(event, data)
+        self.hits += 1
+        data["handler"] = menu_handler
+        return await menu_handler.call(event, **data)
+
+    def stats(self) -> dict:
+        return {"buttons": len(self._table), "hits": self.hits, "fallthrough": self.fallthrough}
+
+# Instancia global del despacho de menú
+menu_dispatch = MenuDispatch()
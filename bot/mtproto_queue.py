@@ -0,0 +1,191 @@
+# bot/mtproto_queue.py
+"""
+Cola de operaciones MTProto (Pyrogram)
+Todas las llamadas del cliente de usuario pasan por una cola acotada
+atendida por un número fijo de workers. Un FloodWait pausa la cola completa
+durante la ventana indicada por Telegram, y los reintentos están acotados
+"""
+
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from pyrogram.errors import FloodWait
+
+logger = logging.getLogger(__name__)
+
+Operation = Callable[[], Awaitable[Any]]
+
+# Métodos con límites de flood estrictos: como mucho N llamadas simultáneas
+DEFAULT_METHOD_LIMITS = {
+    "create_supergroup": 1,
+    "delete_supergroup": 1,
+    "add_chat_members": 1,
+}
+
+class QueueMetrics:
+    """Contadores de la cola de operaciones MTProto"""
+
+    def __init__(self):
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.flood_waits = 0
+        self.retries = 0
+        self.flood_seconds = 0.0
+        self.per_method: Dict[str, int] = {}
+
+    def as_dict(self) -> dict:
+        return {
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "flood_waits": self.flood_waits,
+            "retries": self.retries,
+            "flood_seconds": round(self.flood_seconds, 1),
+            "per_method": dict(self.per_method),
+        }
+
+class MTProtoOperationQueue:
+    """Cola acotada de operaciones; cada llamador recibe un future con el resultado"""
+
+    def __init__(
+        self,
+        maxsize: int = 100,
+        workers: int = 2,
+        max_retries: int = 3,
+        max_flood_wait: int = 300,
+        method_limits: Optional[Dict[str, int]] = None,
+    ):
+        self.maxsize = maxsize
+        self.workers = workers
+        self.max_retries = max_retries
+        # Un FloodWait más largo que esto se propaga al llamador en lugar de esperar
+        self.max_flood_wait = max_flood_wait
+        self.metrics = QueueMetrics()
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_tasks: list[asyncio.Task] = []
+        self._flood_until = 0.0
+        self._method_limits = DEFAULT_METHOD_LIMITS if method_limits is None else method_limits
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    @property
+    def running(self) -> bool:
+        return bool(self._worker_tasks)
+
+    @property
+    def flood_remaining(self) -> float:
+        """Segundos que faltan para que termine la ventana de flood global"""
+        return max(0.0, self._flood_until - time.monotonic())
+
+    def start(self):
+        """Arranca los workers (idempotente)"""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._worker_tasks = [
+            asyncio.create_task(self._worker(), name=f"mtproto-worker-{i}")
+            for i in range(self.workers)
+        ]
+
+    async def stop(self):
+        """Detiene los workers y cancela las operaciones pendientes"""
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+        if self._queue is not None:
+            while not self._queue.empty():
+                _, _, future = self._queue.get_nowait()
+                if not future.done():
+                    future.cancel()
+
+    async def submit(self, name: str, operation: Operation) -> asyncio.Future:
+        """Encola una operación y devuelve su future (espera si la cola está llena)"""
+        if not self.running:
+            raise RuntimeError("La cola MTProto no está en ejecución")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((name, operation, future))
+        self.metrics.submitted += 1
+        self.metrics.per_method[name] = self.metrics.per_method.get(name, 0) + 1
+        return future
+
+    async def run(self, name: str, operation: Operation) -> Any:
+        """Encola una operación y espera su resultado"""
+        return await (await self.submit(name, operation))
+
+    def stats(self) -> dict:
+        """Métricas de la cola para diagnóstico"""
+        stats = self.metrics.as_dict()
+        stats.update({
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "maxsize": self.maxsize,
+            "workers": self.workers,
+            "flood_remaining": round(self.flood_remaining, 1),
+        })
+        return stats
+
+    def _semaphore(self, name: str) -> Optional[asyncio.Semaphore]:
+        limit = self._method_limits.get(name)
+        if not limit:
+            return None
+        if name not in self._semaphores:
+            self._semaphores[name] = asyncio.Semaphore(limit)
+        return self._semaphores[name]
+
+    def _register_flood(self, seconds: int):
+        """Extiende la ventana de flood global; el jitter evita que todos los workers despierten a la vez"""
+        wait = seconds + random.uniform(0, min(5.0, seconds * 0.1 + 1))
+        self._flood_until = max(self._flood_until, time.monotonic() + wait)
+        self.metrics.flood_waits += 1
+        self.metrics.flood_seconds += seconds
+
+    async def _execute(self, name: str, operation: Operation) -> Any:
+        attempt = 0
+        while True:
+            # Ninguna operación sale mientras dure la ventana de flood
+            remaining = self.flood_remaining
+            if remaining > 0:
+                await asyncio.sleep(remaining)
+
+            semaphore = self._semaphore(name)
+            try:
+                if semaphore is None:
+                    return await operation()
+                async with semaphore:
+                    return await operation()
+            except FloodWait as e:
+                if e.value > self.max_flood_wait or attempt >= self.max_retries:
+                    self._register_flood(e.value)
+                    raise
+                attempt += 1
+                self.metrics.retries += 1
+                self._register_flood(e.value)
+                logger.warning(
+                    f"⚠️ FloodWait de {e.value}s en {name}, reintento {attempt}/{self.max_retries}"
+                )
+
+    async def _worker(self):
+        while True:
+            name, operation, future = await self._queue.get()
+            try:
+                if future.cancelled():
+                    continue
+                result = await self._execute(name, operation)
+                self.metrics.completed += 1
+                if not future.done():
+                    future.set_result(result)
+            except asyncio.CancelledError:
+                if not future.done():
+                    future.cancel()
+                raise
+            except Exception as e:
+                self.metrics.failed += 1
+                logger.debug(f"Operación MTProto {name} falló: {e}")
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self._queue.task_done()
@@ -8,6 +8,8 @@ from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKe
 from aiogram.fsm.context import FSMContext
 from database import get_creator_by_id, is_user_banned, get_user_balance, get_ppv_by_creator
 from nav_states import MenuState, NavigationManager
+from menu_router import MenuButton
+from settings import settings
 from keyboards import get_main_menu, get_main_keyboard, get_creator_menu, get_explore_menu, get_admin_menu, get_creator_onboarding_menu, is_admin_user, get_creator_profile_main_keyboard, get_creator_profile_submenu_keyboard
 
 router = Router()
@@ -86,7 +88,7 @@ async def show_menu(state: MenuState, message: Message, context: FSMContext):
 
 # ==================== HANDLERS DEL MENÚ PRINCIPAL ====================
 
-@router.message(F.text == "🎨 Ser Creador")
+@router.message(MenuButton("🎨 Ser Creador"))
 async def handle_ser_creador(message: Message, state: FSMContext):
     """Manejar selección de 'Ser Creador'"""
     print(f"🚀 DEBUG: Handler 'Ser Creador' ejecutado por usuario {message.from_user.id}")
@@ -108,7 +110,7 @@ async def handle_ser_creador(message: Message, state: FSMContext):
         await NavigationManager.push_state(MenuState.CREATOR, state)
         await show_menu(MenuState.CREATOR, message, state)
 
-@router.message(F.text == "🔍 Explorar Creadores")
+@router.message(MenuButton("🔍 Explorar Creadores"))
 async def handle_explorar_creadores(message: Message, state: FSMContext):
     """Manejar selección de 'Explorar Creadores' - mostrar directamente los creadores"""
     print(f"🚀 DEBUG: Handler 'Explorar Creadores' ejecutado por usuario {message.from_user.id}")
@@ -118,16 +120,14 @@ async def handle_explorar_creadores(message: Message, state: FSMContext):
         return
     
     # Solo hacer push del estado si no estamos ya en EXPLORE para evitar duplicados
-    current_state = await NavigationManager.get_current_state(state)
-    if current_state != MenuState.EXPLORE:
-        await NavigationManager.push_state(MenuState.EXPLORE, state)
+    await NavigationManager.push_state(MenuState.EXPLORE, state, skip_if_current=True)
     
     # Siempre ejecutar explore_creators directamente, sin mensajes intermedios
     print(f"🚀 DEBUG: Ejecutando explore_creators directamente")
     from creator_handlers import explore_creators
     await explore_creators(message)
 
-@router.message(F.text == "🎥 Videollamadas")
+@router.message(MenuButton("🎥 Videollamadas"))
 async def handle_videollamadas_main(message: Message, state: FSMContext):
     """Manejar botón 'Videollamadas' del menú principal"""
     print(f"🎥 DEBUG: Handler 'Videollamadas' desde menú principal ejecutado por usuario {message.from_user.id}")
@@ -137,6 +137,9 @@ async def handle_videollamadas_main(message: Message, state: FSMContext):
         return
     
     # Importar y ejecutar la función de solicitud de videollamadas
+    if not settings.videocalls_enabled:
+        await message.answer("❌ Sistema de videollamadas no disponible temporalmente.")
+        return
     try:
         from videocall_handlers import show_available_creators_for_videocall
         await show_available_creators_for_videocall(message)
@@ -146,12 +149,12 @@ async def handle_videollamadas_main(message: Message, state: FSMContext):
         print(f"❌ Error en videollamadas: {e}")
         await message.answer("❌ Error al cargar videollamadas. Inténtalo más tarde.")
 
-@router.message(F.text == "ℹ️ Ayuda")
+@router.message(MenuButton("ℹ️ Ayuda"))
 async def handle_ayuda(message: Message, state: FSMContext):
     """Manejar selección de 'Ayuda'"""
     await show_menu(MenuState.HELP, message, state)
 
-@router.message(F.text == "🛡️ Admin Panel")
+@router.message(MenuButton("🛡️ Admin Panel"))
 async def handle_admin_panel(message: Message, state: FSMContext):
     """Manejar selección de 'Admin Panel'"""
     username = message.from_user.username
@@ -165,7 +168,7 @@ async def handle_admin_panel(message: Message, state: FSMContext):
 
 # ==================== HANDLERS DEL MENÚ ADMIN ====================
 
-@router.message(F.text == "📊 Estadísticas")
+@router.message(MenuButton("📊 Estadísticas"))
 async def handle_admin_stats(message: Message, state: FSMContext):
     """Manejar selección de 'Estadísticas' del admin panel"""
     username = message.from_user.username
@@ -176,7 +179,7 @@ async def handle_admin_stats(message: Message, state: FSMContext):
     from admin_handlers import admin_panel
     await admin_panel(message)
 
-@router.message(F.text == "👥 Usuarios")
+@router.message(MenuButton("👥 Usuarios"))
 async def handle_admin_users(message: Message, state: FSMContext):
     """Manejar selección de 'Usuarios' del admin panel"""
     username = message.from_user.username
@@ -194,7 +197,7 @@ async def handle_admin_users(message: Message, state: FSMContext):
         "Pide al usuario que te envíe cualquier mensaje y verás su ID en los logs del bot."
     )
 
-@router.message(F.text == "💰 Comisiones")
+@router.message(MenuButton("💰 Comisiones"))
 async def handle_admin_commissions(message: Message, state: FSMContext):
     """Manejar selección de 'Comisiones' del admin panel"""
     username = message.from_user.username
@@ -212,7 +215,7 @@ async def handle_admin_commissions(message: Message, state: FSMContext):
         "💡 Para cambiar la configuración de comisiones, edita las variables de entorno en el código."
     )
 
-@router.message(F.text == "🚫 Baneos")
+@router.message(MenuButton("🚫 Baneos"))
 async def handle_admin_bans(message: Message, state: FSMContext):
     """Manejar selección de 'Baneos' del admin panel"""
     username = message.from_user.username
@@ -232,7 +235,7 @@ async def handle_admin_bans(message: Message, state: FSMContext):
         "• No pueden acceder a contenido"
     )
 
-@router.message(F.text == "📢 Anuncio Global")
+@router.message(MenuButton("📢 Anuncio Global"))
 async def handle_admin_broadcast(message: Message, state: FSMContext):
     """Manejar selección de 'Anuncio Global' del admin panel"""
     username = message.from_user.username
@@ -254,7 +257,7 @@ async def handle_admin_broadcast(message: Message, state: FSMContext):
 
 # ==================== HANDLERS DE VIDEOLLAMADAS ====================
 
-@router.message(F.text == "🎥 Videollamadas")
+@router.message(MenuButton("🎥 Videollamadas"))
 async def handle_videollamadas_fans(message: Message, state: FSMContext):
     """Manejar botón 'Videollamadas' para fans"""
     print(f"🎥 DEBUG: Handler 'Videollamadas' ejecutado por usuario {message.from_user.id}")
@@ -264,6 +267,9 @@ async def handle_videollamadas_fans(message: Message, state: FSMContext):
         return
     
     # Importar y ejecutar la función de solicitud de videollamadas
+    if not settings.videocalls_enabled:
+        await message.answer("❌ Sistema de videollamadas no disponible temporalmente.")
+        return
     try:
         from videocall_handlers import show_available_creators_for_videocall
         await show_available_creators_for_videocall(message)
@@ -273,7 +279,7 @@ async def handle_videollamadas_fans(message: Message, state: FSMContext):
         print(f"❌ Error en videollamadas: {e}")
         await message.answer("❌ Error al cargar videollamadas. Inténtalo más tarde.")
 
-@router.message(F.text == "🎥 Configurar Videollamadas")
+@router.message(MenuButton("🎥 Configurar Videollamadas"))
 async def handle_configurar_videollamadas(message: Message, state: FSMContext):
     """Manejar botón 'Configurar Videollamadas' para creadores"""
     print(f"⚙️ DEBUG: Handler 'Configurar Videollamadas' ejecutado por usuario {message.from_user.id}")
@@ -289,6 +295,9 @@ async def handle_configurar_videollamadas(message: Message, state: FSMContext):
         return
     
     # Importar y ejecutar la función de configuración
+    if not settings.videocalls_enabled:
+        await message.answer("❌ Sistema de videollamadas no disponible temporalmente.")
+        return
     try:
         from videocall_handlers import show_videocall_config
         await show_videocall_config(message)
@@ -298,7 +307,7 @@ async def handle_configurar_videollamadas(message: Message, state: FSMContext):
         print(f"❌ Error en configuración de videollamadas: {e}")
         await message.answer("❌ Error al cargar configuración. Inténtalo más tarde.")
 
-@router.message(F.text == "🔧 Configuración")
+@router.message(MenuButton("🔧 Configuración"))
 async def handle_admin_config(message: Message, state: FSMContext):
     """Manejar selección de 'Configuración' del admin panel"""
     username = message.from_user.username
@@ -322,7 +331,7 @@ async def handle_admin_config(message: Message, state: FSMContext):
 
 # ==================== HANDLERS DEL MENÚ CREATOR ONBOARDING ====================
 
-@router.message(F.text == "✅ Registrarme como Creador")
+@router.message(MenuButton("✅ Registrarme como Creador"))
 async def handle_registrar_creador(message: Message, state: FSMContext):
     """Manejar selección de 'Registrarme como Creador'"""
     if is_user_banned(message.from_user.id):
@@ -345,7 +354,7 @@ async def handle_registrar_creador(message: Message, state: FSMContext):
     )
     await state.set_state(CreatorRegistration.waiting_for_name)
 
-@router.message(F.text == "ℹ️ Más Información")
+@router.message(MenuButton("ℹ️ Más Información"))
 async def handle_mas_informacion_creador(message: Message, state: FSMContext):
     """Manejar selección de 'Más Información' sobre ser creador"""
     await message.answer(
@@ -370,7 +379,7 @@ async def handle_mas_informacion_creador(message: Message, state: FSMContext):
 
 # ==================== HANDLER PARA VOLVER ====================
 
-@router.message(F.text == "⬅️ Volver")
+@router.message(MenuButton("⬅️ Volver"))
 async def handle_volver(message: Message, state: FSMContext):
     """Manejar botón 'Volver' - navegar al menú anterior"""
     previous_state = await NavigationManager.pop_state(state)
@@ -487,10 +496,9 @@ async def handle_profile_withdraw(callback: CallbackQuery, state: FSMContext):
         return
     
     from database import get_user_balance
-    import os
     
     balance = get_user_balance(callback.from_user.id)
-    min_withdrawal = int(os.getenv("MIN_WITHDRAWAL", 1000))
+    min_withdrawal = settings.min_withdrawal
     
     if balance < min_withdrawal:
         await callback.answer(
@@ -609,6 +617,9 @@ async def handle_profile_videocalls(callback: CallbackQuery, state: FSMContext):
         await callback.answer("❌ Error: No se encontró tu perfil de creador.", show_alert=True)
         return
     
+    if not settings.videocalls_enabled:
+        await callback.answer("❌ Sistema de videollamadas no disponible temporalmente.", show_alert=True)
+        return
     try:
         from videocall_handlers import show_videocall_config_inline
         await show_videocall_config_inline(callback)
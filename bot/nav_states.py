@@ -1,12 +1,22 @@
 """
 Sistema de estados de navegación para el bot OnlyStars
 Implementa navegación jerárquica con menús y submenús
+
+El stack de navegación se guarda en los datos FSM como un string compacto con
+un carácter por menú ("mce" = principal > creador > explorar), con una
+profundidad máxima. Cada operación es una sola operación sobre el storage
 """
 
 from enum import Enum
-from typing import List
+from typing import Callable, Dict, List, TypeVar
 from aiogram.fsm.context import FSMContext
 
+T = TypeVar("T")
+
+# Profundidad máxima del stack; al superarla se descartan los menús más antiguos
+# (salvo la raíz)
+MAX_NAV_DEPTH = 8
+
 class MenuState(Enum):
     """Estados de los diferentes menús del bot"""
     MAIN = "main"           # Menú principal
@@ -15,56 +25,95 @@ class MenuState(Enum):
     ADMIN = "admin"         # Menú de administración
     HELP = "help"           # Menú de ayuda
 
+# Código de un carácter por menú (no cambiar: se guardan en el storage)
+_CODES = {
+    MenuState.MAIN: "m",
+    MenuState.CREATOR: "c",
+    MenuState.EXPLORE: "e",
+    MenuState.ADMIN: "a",
+    MenuState.HELP: "h",
+}
+_STATES = {code: state for state, code in _CODES.items()}
+_MAIN = _CODES[MenuState.MAIN]
+
+def _decode_stack(value) -> str:
+    """Acepta el formato compacto y el antiguo (lista de valores de MenuState)"""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, list):
+        return "".join(_CODES[MenuState(item)] for item in value)
+    return ""
+
+def _cap(stack: str) -> str:
+    if len(stack) > MAX_NAV_DEPTH:
+        return stack[:1] + stack[-(MAX_NAV_DEPTH - 1):]
+    return stack
+
+async def _with_data(context: FSMContext, func: Callable[[Dict], T], readonly: bool = False) -> T:
+    """Ejecuta func sobre los datos FSM en una sola operación del storage
+
+    Los storages propios (fsm_storage) lo hacen en sitio con modify_data; con
+    otros storages se cae a get_data + update_data solo de la clave del stack
+    """
+    modify_data = getattr(context.storage, "modify_data", None)
+    if modify_data is not None:
+        return await modify_data(context.key, func, readonly=readonly)
+    data = await context.get_data()
+    result = func(data)
+    if not readonly:
+        await context.update_data({NavigationManager.NAV_STACK_KEY: data[NavigationManager.NAV_STACK_KEY]})
+    return result
+
 class NavigationManager:
     """Gestiona la navegación entre menús usando FSM context"""
-    
+
     NAV_STACK_KEY = "nav_stack"
-    
+
     @classmethod
-    async def push_state(cls, state: MenuState, context: FSMContext):
-        """Agregar un nuevo estado al stack de navegación"""
-        data = await context.get_data()
-        nav_stack = data.get(cls.NAV_STACK_KEY, [])
-        nav_stack.append(state.value)
-        await context.update_data({cls.NAV_STACK_KEY: nav_stack})
-    
+    async def push_state(cls, state: MenuState, context: FSMContext, skip_if_current: bool = False):
+        """Agregar un nuevo estado al stack de navegación
+
+        Con skip_if_current no se apila si ya es el menú actual
+        """
+        code = _CODES[state]
+
+        def push(data):
+            stack = _decode_stack(data.get(cls.NAV_STACK_KEY))
+            if not (skip_if_current and stack[-1:] == code):
+                stack = _cap(stack + code)
+            data[cls.NAV_STACK_KEY] = stack
+
+        await _with_data(context, push)
+
     @classmethod
     async def pop_state(cls, context: FSMContext) -> MenuState:
         """Remover el estado actual y retornar al anterior"""
-        data = await context.get_data()
-        nav_stack = data.get(cls.NAV_STACK_KEY, [])
-        
-        if nav_stack:
-            nav_stack.pop()  # Remover estado actual
-        
-        if nav_stack:
-            current = nav_stack[-1]
-        else:
-            current = MenuState.MAIN.value
-            nav_stack = [MenuState.MAIN.value]
-        
-        await context.update_data({cls.NAV_STACK_KEY: nav_stack})
-        return MenuState(current)
-    
+        def pop(data):
+            stack = _decode_stack(data.get(cls.NAV_STACK_KEY))[:-1] or _MAIN
+            data[cls.NAV_STACK_KEY] = stack
+            return _STATES[stack[-1]]
+
+        return await _with_data(context, pop)
+
     @classmethod
     async def get_current_state(cls, context: FSMContext) -> MenuState:
         """Obtener el estado actual de navegación"""
-        data = await context.get_data()
-        nav_stack = data.get(cls.NAV_STACK_KEY, [])
-        
-        if nav_stack:
-            return MenuState(nav_stack[-1])
-        else:
-            return MenuState.MAIN
-    
+        def current(data):
+            stack = _decode_stack(data.get(cls.NAV_STACK_KEY))
+            return _STATES[stack[-1]] if stack else MenuState.MAIN
+
+        return await _with_data(context, current, readonly=True)
+
     @classmethod
     async def reset_to_main(cls, context: FSMContext):
         """Resetear navegación al menú principal"""
-        await context.update_data({cls.NAV_STACK_KEY: [MenuState.MAIN.value]})
-    
+        await context.update_data({cls.NAV_STACK_KEY: _MAIN})
+
     @classmethod
     async def get_nav_path(cls, context: FSMContext) -> List[MenuState]:
         """Obtener el camino completo de navegación"""
-        data = await context.get_data()
-        nav_stack = data.get(cls.NAV_STACK_KEY, [MenuState.MAIN.value])
-        return [MenuState(state) for state in nav_stack]
\ No newline at end of file
+        def path(data):
+            stack = _decode_stack(data.get(cls.NAV_STACK_KEY)) or _MAIN
+            return [_STATES[code] for code in stack]
+
+        return await _with_data(context, path, readonly=True)
@@ -0,0 +1,172 @@
+# bot/outbox_relay.py
+"""
+Relay del outbox de mensajes
+Los recibos y avisos se guardan en la tabla outbox dentro de la misma
+transacción que el cambio de estado; este worker los envía después por
+lotes, respetando el límite de envíos de Telegram y reintentando con backoff.
+Una caída entre el commit y el envío ya no pierde el mensaje
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict
+
+from aiogram.exceptions import TelegramRetryAfter, TelegramForbiddenError, TelegramBadRequest
+
+from database import (
+    claim_outbox_batch, mark_outbox_sent, retry_outbox_message, fail_outbox_message,
+    purge_sent_outbox, count_outbox
+)
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 50))
+# Telegram admite ~30 mensajes/s en total; se deja margen para el resto del bot
+OUTBOX_RATE_PER_SECOND = float(os.getenv("OUTBOX_RATE_PER_SECOND", 20))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", 5))
+MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = 10  # segundos, se duplica en cada reintento
+# Un mensaje en 'sending' más tiempo que esto se considera abandonado y se reintenta
+STALE_CLAIM_SECONDS = 300
+SENT_RETENTION_SECONDS = 24 * 60 * 60
+
+Renderer = Callable[[dict], str]
+# Para mensajes que no son texto (p. ej. contenido PPV): sender(bot, chat_id, payload)
+Sender = Callable[..., Awaitable[None]]
+
+class OutboxRelay:
+    """Vacía el outbox: un lote por vuelta, despertado tras cada commit o por sondeo"""
+
+    def __init__(self, batch_size: int = OUTBOX_BATCH_SIZE, rate_per_second: float = OUTBOX_RATE_PER_SECOND):
+        self.batch_size = batch_size
+        self.min_interval = 1 / rate_per_second
+        self.bot = None  # se asigna al arrancar
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self._renderers: Dict[str, Renderer] = {}
+        self._senders: Dict[str, Sender] = {}
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._last_send = 0.0
+        self._last_purge = 0.0
+
+    def register(self, template: str, renderer: Renderer):
+        """Asocia una plantilla con la función que arma el texto a partir del payload"""
+        self._renderers[template] = renderer
+
+    def register_sender(self, template: str, sender: Sender):
+        """Asocia una plantilla con una corrutina que hace el envío completo
+
+        Debe ser una sola llamada a Telegram: si falla, el reintento repite el envío entero
+        """
+        self._senders[template] = sender
+
+    def notify(self):
+        """Avisa de que hay mensajes nuevos (llamar tras el commit que los escribió)"""
+        self._wakeup.set()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="outbox-relay")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                delivered = await self.relay_once()
+            except Exception as e:
+                logger.error(f"❌ Error en el relay del outbox: {e}")
+                delivered = 0
+            if delivered >= self.batch_size:
+                continue  # hay más pendientes: siguiente lote sin esperar
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), OUTBOX_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def relay_once(self) -> int:
+        """Envía un lote de mensajes vencidos; devuelve cuántos se reservaron"""
+        batch = claim_outbox_batch(self.batch_size, STALE_CLAIM_SECONDS)
+        sent_ids = []
+        try:
+            for index, (message_id, chat_id, template, payload, attempts) in enumerate(batch):
+                retry_after = await self._deliver(message_id, chat_id, template, payload, attempts)
+                if retry_after is None:
+                    sent_ids.append(message_id)
+                elif retry_after > 0:
+                    # Flood de Telegram: se devuelve el resto del lote y se espera
+                    for pending_id, _, _, _, pending_attempts in batch[index + 1:]:
+                        retry_outbox_message(pending_id, pending_attempts, time.time() + retry_after, "RetryAfter")
+                    break
+        finally:
+            if sent_ids:
+                mark_outbox_sent(sent_ids)
+
+        if time.monotonic() - self._last_purge > 3600:
+            self._last_purge = time.monotonic()
+            purge_sent_outbox(SENT_RETENTION_SECONDS)
+        return len(batch)
+
+    async def _throttle(self):
+        wait = self._last_send + self.min_interval - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        self._last_send = time.monotonic()
+
+    async def _deliver(self, message_id, chat_id, template, payload, attempts):
+        """None si se envió, 0 si falló o se reprogramó, >0 si Telegram pidió esperar esos segundos"""
+        renderer = self._renderers.get(template)
+        sender = self._senders.get(template)
+        if renderer is None and sender is None:
+            fail_outbox_message(message_id, f"Plantilla desconocida: {template}")
+            self.failed += 1
+            return 0
+
+        await self._throttle()
+        try:
+            if sender is not None:
+                await sender(self.bot, chat_id, payload)
+            else:
+                await self.bot.send_message(chat_id, renderer(payload))
+            self.sent += 1
+            return None
+        except TelegramRetryAfter as e:
+            retry_outbox_message(message_id, attempts, time.time() + e.retry_after, str(e))
+            self.retried += 1
+            return e.retry_after
+        except (TelegramForbiddenError, TelegramBadRequest) as e:
+            # Bot bloqueado o chat inexistente: reintentar no sirve
+            fail_outbox_message(message_id, str(e))
+            self.failed += 1
+            return 0
+        except Exception as e:
+            attempts += 1
+            if attempts >= MAX_ATTEMPTS:
+                fail_outbox_message(message_id, str(e))
+                self.failed += 1
+                logger.error(f"❌ Mensaje {message_id} del outbox descartado tras {attempts} intentos: {e}")
+            else:
+                retry_outbox_message(message_id, attempts, time.time() + RETRY_BASE_DELAY * 2 ** (attempts - 1), str(e))
+                self.retried += 1
+            return 0
+
+    def stats(self) -> dict:
+        return {
+            "pending": count_outbox('pending'),
+            "failed_total": count_outbox('failed'),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+        }
+
+# Instancia global del relay
+outbox_relay = OutboxRelay()
@@ -0,0 +1,137 @@
+# bot/payment_router.py
+"""
+Router único de pagos en Stars
+Todas las facturas usan un payload compacto y versionado. pre_checkout_query
+y successful_payment se decodifican y validan una sola vez y se despachan con
+una búsqueda O(1) en el registro tipo -> handlers
+"""
+
+import logging
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, NamedTuple, Tuple
+
+from aiogram import Router, F
+from aiogram.types import Message, PreCheckoutQuery
+
+from checkout_cache import checkout_cache
+
+logger = logging.getLogger(__name__)
+
+router = Router()
+
+PAYLOAD_VERSION = 1
+_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+class PayloadError(ValueError):
+    """Payload de factura mal formado o de un tipo desconocido"""
+
+class PaymentPayload(NamedTuple):
+    kind: str
+    version: int
+    fields: Dict[str, int]
+
+@dataclass(frozen=True)
+class PaymentType:
+    kind: str
+    fields: Tuple[str, ...]
+    payer_field: str
+    pre_checkout: Callable[[PreCheckoutQuery, Dict[str, int]], Awaitable[None]]
+    settle: Callable[[Message, Dict[str, int]], Awaitable[None]]
+
+_registry: Dict[str, PaymentType] = {}
+
+def register_payment(kind, fields, payer_field, pre_checkout, settle):
+    """Registra un tipo de pago: nombre de los campos, cuál identifica al pagador y sus handlers"""
+    if kind in _registry:
+        raise ValueError(f"Tipo de pago duplicado: {kind}")
+    if payer_field not in fields:
+        raise ValueError(f"El campo del pagador {payer_field} no está en {fields}")
+    _registry[kind] = PaymentType(kind, tuple(fields), payer_field, pre_checkout, settle)
+
+# === CODEC ===
+
+def _b36(value: int) -> str:
+    if value < 0:
+        return "-" + _b36(-value)
+    digits = ""
+    while True:
+        value, remainder = divmod(value, 36)
+        digits = _DIGITS[remainder] + digits
+        if not value:
+            return digits
+
+def encode_payload(kind: str, *values: int) -> str:
+    """Ej.: encode_payload("vc", creator_id, fan_id, 30, 0) -> 'vc.1:1kqsg2:...'"""
+    payment_type = _registry.get(kind)
+    if payment_type and len(values) != len(payment_type.fields):
+        raise PayloadError(f"{kind} espera {len(payment_type.fields)} campos")
+    return f"{kind}.{PAYLOAD_VERSION}:" + ":".join(_b36(int(value)) for value in values)
+
+def decode_payload(payload: str) -> PaymentPayload:
+    """Decodifica y valida un payload; acepta el formato heredado 'tipo_campo_campo'"""
+    try:
+        if ":" in payload:
+            head, _, body = payload.partition(":")
+            kind, _, version = head.partition(".")
+            version = int(version)
+            raw = [int(value, 36) for value in body.split(":")]
+        else:
+            # Facturas emitidas antes del codec versionado
+            kind, *parts = payload.split("_")
+            version = 0
+            raw = [int(value) for value in parts]
+    except ValueError:
+        raise PayloadError(f"Payload inválido: {payload!r}")
+
+    if version > PAYLOAD_VERSION:
+        raise PayloadError(f"Versión de payload no soportada: {version}")
+    payment_type = _registry.get(kind)
+    if payment_type is None:
+        raise PayloadError(f"Tipo de pago desconocido: {kind!r}")
+    if len(raw) != len(payment_type.fields):
+        raise PayloadError(f"Payload de {kind} con {len(raw)} campos, se esperaban {len(payment_type.fields)}")
+    return PaymentPayload(kind, version, dict(zip(payment_type.fields, raw)))
+
+# === DESPACHO ===
+
+@router.pre_checkout_query()
+async def dispatch_pre_checkout(pre_checkout_query: PreCheckoutQuery):
+    # Telegram exige respuesta en 10 s: se mide cada validación completa
+    started = time.perf_counter()
+    try:
+        await _pre_checkout(pre_checkout_query)
+    finally:
+        checkout_cache.pre_checkout_latency.observe((time.perf_counter() - started) * 1000)
+
+async def _pre_checkout(pre_checkout_query: PreCheckoutQuery):
+    try:
+        payload = decode_payload(pre_checkout_query.invoice_payload)
+    except PayloadError as e:
+        logger.warning(f"⚠️ Pre-checkout rechazado: {e}")
+        await pre_checkout_query.answer(ok=False, error_message="Datos de pago inválidos")
+        return
+
+    payment_type = _registry[payload.kind]
+    # CRÍTICO: el pagador del payload debe ser quien paga
+    if payload.fields[payment_type.payer_field] != pre_checkout_query.from_user.id:
+        await pre_checkout_query.answer(ok=False, error_message="Error de autenticación")
+        return
+
+    await payment_type.pre_checkout(pre_checkout_query, payload.fields)
+
+@router.message(F.successful_payment)
+async def dispatch_successful_payment(message: Message):
+    try:
+        payload = decode_payload(message.successful_payment.invoice_payload)
+    except PayloadError as e:
+        logger.error(f"❌ Pago recibido con payload inválido: {e}")
+        await message.answer("❌ Error en los datos de la transacción.")
+        return
+
+    payment_type = _registry[payload.kind]
+    if payload.fields[payment_type.payer_field] != message.from_user.id:
+        await message.answer("❌ Error: ID de pagador no coincide.")
+        return
+
+    await payment_type.settle(message, payload.fields)
@@ -0,0 +1,158 @@
+# bot/payment_subscribers.py
+"""
+Trabajo posterior a los pagos, fuera del handler de successful_payment
+Recibos al pagador, la entrega de contenido PPV y los avisos al creador
+viajan por el outbox (se escriben en la transacción de la liquidación); las
+reentregas de un pago ya liquidado y las estadísticas son suscriptores del
+bus de eventos
+"""
+
+import logging
+from collections import Counter
+
+from aiogram.utils.media_group import MediaGroupBuilder
+
+from database import get_creator_by_id, get_ppv_content, get_ppv_album_items
+from event_bus import event_bus, PaymentSettled, SubscriptionGranted, ContentPurchased
+from outbox_relay import outbox_relay
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+def _creator_name(creator_id):
+    creator = get_creator_by_id(creator_id)
+    return (creator[3] or creator[2]) if creator else "Creador"
+
+def render_subscription_receipt(payload):
+    earnings = payload["amount"] - payload["commission"]
+    return (
+        f"🎉 ¡Suscripción exitosa a {_creator_name(payload['creator_id'])}!\n\n"
+        f"💰 Pagaste: {payload['amount']} ⭐️\n"
+        f"📝 Comisión de plataforma: {payload['commission']} ⭐️\n"
+        f"💎 Ganancia del creador: {earnings} ⭐️\n\n"
+        f"✅ ¡Ya tienes acceso al contenido exclusivo por 30 días!"
+    )
+
+def render_tip_receipt(payload):
+    earnings = payload["amount"] - payload["commission"]
+    # Porcentaje vigente al liquidar: una recarga posterior no cambia el recibo (filas antiguas: el actual)
+    percentage = payload.get("commission_percentage", settings.commission_percentage)
+    return (
+        f"✅ <b>¡Propina enviada exitosamente!</b>\n\n"
+        f"👤 Para: {_creator_name(payload['creator_id'])}\n"
+        f"💰 Monto: {payload['amount']} ⭐️\n"
+        f"💫 El creador ha recibido {earnings} ⭐️ (después de comisión del {percentage}%)"
+    )
+
+def render_creator_income(payload):
+    earnings = payload["amount"] - payload["commission"]
+    if payload["kind"] == "sub":
+        return f"🎉 <b>Nuevo suscriptor</b>\n\n💎 Recibiste {earnings} ⭐️"
+    if payload["kind"] == "tip":
+        return f"💝 <b>¡Recibiste una propina!</b>\n\n💎 {earnings} ⭐️ (después de comisión)"
+    return f"🛒 <b>Nueva venta PPV</b>\n\n💎 Recibiste {earnings} ⭐️"
+
+def payment_outbox(kind, payer_chat_id, creator_id, amount, commission, content_id=None):
+    """Mensajes del outbox de un pago: recibo al pagador (en PPV, la entrega con el recibo) y aviso al creador
+
+    Se llama sin await de por medio tras calcular la comisión, así que el porcentaje
+    guardado es el mismo con el que se calculó
+    """
+    messages = []
+    if kind == "ppv":
+        messages.append((payer_chat_id, "ppv_delivery", {"content_id": content_id, "amount": amount}))
+    else:
+        receipt = {"sub": "sub_receipt", "tip": "tip_receipt"}[kind]
+        messages.append((payer_chat_id, receipt, {
+            "creator_id": creator_id, "amount": amount, "commission": commission,
+            "commission_percentage": settings.commission_percentage,
+        }))
+    messages.append((creator_id, "creator_income", {"kind": kind, "amount": amount, "commission": commission}))
+    return messages
+
+async def send_ppv_delivery(bot, chat_id, payload):
+    """Sender del outbox: contenido PPV comprado con el recibo como pie, en un solo envío"""
+    await send_ppv_content(
+        bot, chat_id, payload["content_id"],
+        f"✅ ¡Compra exitosa! Pagaste: {payload['amount']} ⭐️"
+    )
+
+outbox_relay.register("sub_receipt", render_subscription_receipt)
+outbox_relay.register("tip_receipt", render_tip_receipt)
+outbox_relay.register("creator_income", render_creator_income)
+outbox_relay.register_sender("ppv_delivery", send_ppv_delivery)
+
+@event_bus.on(ContentPurchased)
+async def deliver_purchased_content(event: ContentPurchased):
+    """Reentrega el contenido de un pago ya liquidado (la primera entrega va por el outbox)"""
+    if not event.redelivery:
+        return
+    await send_ppv_content(event_bus.bot, event.chat_id, event.content_id, "✅ Contenido ya desbloqueado")
+
+async def send_ppv_content(bot, chat_id, content_id, header):
+    """Envía un contenido PPV (álbum o archivo individual) con header al inicio del pie"""
+    content = get_ppv_content(content_id)
+    if not content:
+        await bot.send_message(chat_id, "❌ Error: Contenido no encontrado")
+        return
+
+    # Manejo flexible de la estructura de datos para compatibilidad: album_type va antes de
+    # created_at si la tabla se creó con la columna y después si se agregó por migración
+    _, _, title, description, _, file_id, file_type = content[:7]
+    album_type = 'album' if 'album' in content[7:9] else 'single'
+
+    if album_type == 'album':
+        album_items = get_ppv_album_items(content_id)
+        if album_items:
+            caption = f"{header}\n\n📁 {title}\n📝 {description}" if description else f"{header}\n\n📁 {title}"
+            media_group = MediaGroupBuilder(caption=caption)
+            for item in album_items:
+                item_file_id = item[2]  # file_id en ppv_album_items
+                item_file_type = item[3]  # file_type en ppv_album_items
+                if item_file_type == "photo":
+                    media_group.add_photo(media=item_file_id)
+                elif item_file_type == "video":
+                    media_group.add_video(media=item_file_id)
+            await bot.send_media_group(chat_id, media=media_group.build())
+    else:
+        caption = f"{header}\n\n📸 {title}\n📝 {description}" if description else f"{header}\n\n📸 {title}"
+        if file_type == "photo":
+            await bot.send_photo(chat_id, photo=file_id, caption=caption)
+        elif file_type == "video":
+            await bot.send_video(chat_id, video=file_id, caption=caption)
+
+class PaymentStats:
+    """Contadores en memoria de pagos liquidados desde el arranque"""
+
+    def __init__(self):
+        self.payments = Counter()
+        self.stars = Counter()
+        self.commission = Counter()
+        self.subscriptions_granted = 0
+        self.contents_delivered = 0
+
+    async def on_payment(self, event: PaymentSettled):
+        self.payments[event.kind] += 1
+        self.stars[event.kind] += event.amount_stars
+        self.commission[event.kind] += event.commission_stars
+
+    async def on_subscription(self, event: SubscriptionGranted):
+        self.subscriptions_granted += 1
+
+    async def on_content(self, event: ContentPurchased):
+        self.contents_delivered += 1
+
+    def as_dict(self) -> dict:
+        return {
+            "payments": dict(self.payments),
+            "stars": dict(self.stars),
+            "commission": dict(self.commission),
+            "subscriptions_granted": self.subscriptions_granted,
+            "contents_delivered": self.contents_delivered,
+        }
+
+# Instancia global de estadísticas de pagos
+payment_stats = PaymentStats()
+event_bus.subscribe(PaymentSettled, payment_stats.on_payment, name="payment_stats")
+event_bus.subscribe(SubscriptionGranted, payment_stats.on_subscription, name="subscription_stats")
+event_bus.subscribe(ContentPurchased, payment_stats.on_content, name="content_stats")
@@ -1,22 +1,20 @@
 # bot/payments.py
-from aiogram import Router, F
+from aiogram import Router
 from aiogram.types import Message, PreCheckoutQuery, LabeledPrice
 from aiogram.filters import Command
-from database import (add_transaction, update_balance, add_subscriber, get_creator_by_id, 
-                     is_user_banned, get_ppv_content, add_ppv_purchase)
+from database import (add_subscriber, get_creator_by_id, is_user_banned, settle_payment)
+from payment_router import register_payment, encode_payload
+from checkout_cache import checkout_cache
+from event_bus import event_bus, PaymentSettled, SubscriptionGranted
+from outbox_relay import outbox_relay
+from payment_subscribers import payment_outbox
 import asyncio
 import time
 import math
-from dotenv import load_dotenv
-import os
-
-load_dotenv()
+from settings import settings
 
 router = Router()
 
-COMMISSION_PERCENTAGE = int(os.getenv("COMMISSION_PERCENTAGE", 20))
-EXCHANGE_RATE = float(os.getenv("EXCHANGE_RATE", 0.013))
-
 @router.message(Command("suscribirme_a"))
 async def subscribe_to_creator(message: Message):
     if is_user_banned(message.from_user.id):
@@ -61,7 +59,7 @@ async def subscribe_to_creator(message: Message):
         chat_id=message.chat.id,
         title=f"Suscripción a {creator[3]}",
         description=f"Acceso por 30 días a contenido exclusivo.",
-        payload=f"sub_{creator_id}_{message.from_user.id}",
+        payload=encode_payload("sub", creator_id, message.from_user.id),
         provider_token="",  # Vacío para Stars
         currency="XTR",
         prices=[LabeledPrice(label="Suscripción Mensual", amount=subscription_price_stars)],
@@ -74,69 +72,51 @@ async def subscribe_to_creator(message: Message):
         reply_to_message_id=message.message_id
     )
 
-@router.pre_checkout_query()
-async def pre_checkout_handler(pre_checkout_query: PreCheckoutQuery):
-    """Handler específico para suscripciones - PPV se maneja en ppv_handlers.py"""
-    payload = pre_checkout_query.invoice_payload
+async def validate_subscription_checkout(pre_checkout_query: PreCheckoutQuery, data):
+    """Pre-checkout de suscripciones (el pagador ya lo verificó el router de pagos)"""
+    price = checkout_cache.creators.get(data["creator_id"])
+    if price is None:
+        await pre_checkout_query.answer(ok=False, error_message="Creador no encontrado")
+        return
+    if checkout_cache.banned.get(data["payer_id"]):
+        await pre_checkout_query.answer(ok=False, error_message="Usuario baneado")
+        return
+    if price != pre_checkout_query.total_amount:
+        await pre_checkout_query.answer(ok=False, error_message="El precio de la suscripción cambió")
+        return
     
-    # Solo manejar suscripciones, dejar PPV y propinas a ppv_handlers.py
-    if payload.startswith("sub_"):
-        await pre_checkout_query.answer(ok=True)
-    # No hacer nada si es PPV o propina - lo maneja ppv_handlers.py
+    await pre_checkout_query.answer(ok=True)
 
-@router.message(F.successful_payment)
-async def successful_payment_handler(message: Message):
-    """Handler EXCLUSIVO para suscripciones - PPV y propinas se manejan en ppv_handlers.py"""
+async def handle_subscription_payment(message: Message, data):
+    """Liquidación de una suscripción: comisión, balance del creador y alta del suscriptor"""
     payment = message.successful_payment
-    payload = payment.invoice_payload  # Ej: "sub_12345_67890"
     amount_stars = payment.total_amount
-    payer_id = message.from_user.id
-
-    parts = payload.split("_")
-    payment_type = parts[0]
-    
-    # SOLO manejar suscripciones aquí - el resto lo maneja ppv_handlers.py
-    if payment_type == "sub":
-        await handle_subscription_payment(message, parts, amount_stars, payer_id)
-    # PPV y propinas se manejan en ppv_handlers.py para evitar conflictos
-
-async def handle_subscription_payment(message, parts, amount_stars, payer_id):
-    if len(parts) < 3:
-        await message.answer("❌ Error en la transacción.")
-        return
-    
-    try:
-        creator_id = int(parts[1])
-        payer_id_confirmed = int(parts[2])
-    except ValueError:
-        await message.answer("❌ Error en los datos de la transacción.")
-        return
-    
-    if payer_id != payer_id_confirmed:
-        await message.answer("❌ Error: ID de pagador no coincide.")
-        return
+    payer_id = data["payer_id"]
+    creator_id = data["creator_id"]
     
     # CRÍTICO: Asegurar comisión mínima para evitar fuga en montos pequeños
-    commission_stars = max(1, math.ceil(amount_stars * COMMISSION_PERCENTAGE / 100)) if amount_stars > 0 else 0
-    creator_earnings = amount_stars - commission_stars
-    
-    add_transaction(payer_id, creator_id, amount_stars, commission_stars, "subscription")
-    update_balance(creator_id, creator_earnings)
+    commission_stars = max(1, math.ceil(amount_stars * settings.commission_percentage / 100)) if amount_stars > 0 else 0
     
     expires_at = int(time.time()) + 30 * 24 * 60 * 60
-    add_subscriber(payer_id, creator_id, expires_at)
-    
-    creator = get_creator_by_id(creator_id)
-    creator_name = creator[3] if creator else "Creador"
+    # CRÍTICO: Idempotente por charge_id, una reentrega no acredita dos veces
+    if not settle_payment(
+        payment.telegram_payment_charge_id, "sub", payer_id, amount_stars,
+        receiver_id=creator_id, commission_stars=commission_stars, tx_type="subscription",
+        subscription_expires_at=expires_at,
+        outbox=payment_outbox("sub", message.chat.id, creator_id, amount_stars, commission_stars)
+    ):
+        await message.answer("ℹ️ Este pago ya fue procesado.")
+        return
     
-    await message.answer(
-        f"🎉 ¡Suscripción exitosa a {creator_name}!\n\n"
-        f"💰 Pagaste: {amount_stars} ⭐️\n"
-        f"📝 Comisión de plataforma: {commission_stars} ⭐️\n"
-        f"💎 Ganancia del creador: {creator_earnings} ⭐️\n\n"
-        f"✅ ¡Ya tienes acceso al contenido exclusivo por 30 días!"
-    )
+    # Recibo y aviso al creador ya están en el outbox; el relay los envía
+    outbox_relay.notify()
+    await event_bus.publish(PaymentSettled(
+        "sub", payment.telegram_payment_charge_id, payer_id, creator_id,
+        amount_stars, commission_stars, message.chat.id
+    ))
+    await event_bus.publish(SubscriptionGranted(payer_id, creator_id, expires_at, message.chat.id))
 
-# ELIMINADO: handle_ppv_payment y handle_tip_payment 
-# Estas funciones se movieron COMPLETAMENTE a ppv_handlers.py para evitar conflictos
-# TODOS los pagos PPV y propinas se manejan exclusivamente en ppv_handlers.py
+register_payment(
+    "sub", ("creator_id", "payer_id"), "payer_id",
+    validate_subscription_checkout, handle_subscription_payment
+)
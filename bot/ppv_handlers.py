@@ -1,19 +1,19 @@
 # bot/ppv_handlers.py
-from aiogram import Router, F
-from aiogram.types import Message, PreCheckoutQuery, LabeledPrice, SuccessfulPayment
+from aiogram import Router
+from aiogram.types import Message, PreCheckoutQuery, LabeledPrice
 from aiogram.filters import Command
-from database import (get_ppv_content, has_purchased_ppv, add_ppv_purchase, 
-                     add_transaction, update_balance, is_user_banned, get_ppv_album_items, get_creator_by_id)
-from dotenv import load_dotenv
-import os
+from database import (get_ppv_content, has_purchased_ppv, is_user_banned, get_ppv_album_items,
+                     get_creator_by_id, settle_payment)
+from payment_router import register_payment, encode_payload
+from checkout_cache import checkout_cache
+from event_bus import event_bus, PaymentSettled, ContentPurchased
+from outbox_relay import outbox_relay
+from payment_subscribers import payment_outbox
+from settings import settings
 import math
 
-load_dotenv()
-
 router = Router()
 
-COMMISSION_PERCENTAGE = int(os.getenv("COMMISSION_PERCENTAGE", 20))
-
 @router.message(Command("comprar_ppv"))
 async def buy_ppv_content(message: Message):
     if is_user_banned(message.from_user.id):
@@ -85,7 +85,7 @@ async def buy_ppv_content(message: Message):
         chat_id=message.chat.id,
         title=f"{content_type_label} PPV: {title}",
         description=description or "Contenido exclusivo",
-        payload=f"ppv_{content_id}_{message.from_user.id}",
+        payload=encode_payload("ppv", content_id, message.from_user.id),
         provider_token="",
         currency="XTR",
         prices=[LabeledPrice(label="Contenido PPV", amount=price_stars)],
@@ -125,7 +125,6 @@ async def send_tip(message: Message):
         return
     
     # Verificar que el creador existe
-    from database import get_creator_by_id
     creator = get_creator_by_id(creator_id)
     if not creator:
         await message.answer("❌ Creador no encontrado.")
@@ -141,7 +140,7 @@ async def send_tip(message: Message):
         chat_id=message.chat.id,
         title=f"Propina para {creator_name}",
         description=f"Enviar {amount} ⭐️ como propina",
-        payload=f"tip_{creator_id}_{message.from_user.id}_{amount}",
+        payload=encode_payload("tip", creator_id, message.from_user.id, amount),
         provider_token="",
         currency="XTR",
         prices=[LabeledPrice(label="Propina", amount=amount)],
@@ -156,201 +155,113 @@ async def send_tip(message: Message):
 
 # === CRITICAL PAYMENT PROCESSING HANDLERS ===
 
-@router.pre_checkout_query()
-async def process_pre_checkout(pre_checkout_query: PreCheckoutQuery):
-    """Valida el pago antes de procesarlo CON SEGURIDAD REFORZADA"""
-    payload = pre_checkout_query.invoice_payload
+async def validate_ppv_checkout(pre_checkout_query: PreCheckoutQuery, data):
+    """Valida una compra PPV antes de cobrarla (el pagador ya lo verificó el router de pagos)"""
+    content_id = data["content_id"]
+    buyer_id = data["buyer_id"]
     
-    if payload.startswith("ppv_"):
-        # Validar compra PPV
-        parts = payload.split("_")
-        if len(parts) >= 3:
-            try:
-                content_id = int(parts[1])
-                buyer_id = int(parts[2])
-            except ValueError:
-                await pre_checkout_query.answer(ok=False, error_message="Datos de pago inválidos")
-                return
-            
-            # CRÍTICO: Verificar que buyer_id coincida con el usuario actual
-            if buyer_id != pre_checkout_query.from_user.id:
-                await pre_checkout_query.answer(ok=False, error_message="Error de autenticación")
-                return
-            
-            # Verificar que el contenido aún existe
-            content = get_ppv_content(content_id)
-            if not content:
-                await pre_checkout_query.answer(ok=False, error_message="Contenido no disponible")
-                return
-            
-            # Verificar que el usuario no esté baneado
-            if is_user_banned(buyer_id):
-                await pre_checkout_query.answer(ok=False, error_message="Usuario baneado")
-                return
-            
-            # Verificar que el usuario no haya comprado ya este contenido
-            if has_purchased_ppv(buyer_id, content_id):
-                await pre_checkout_query.answer(ok=False, error_message="Ya has comprado este contenido")
-                return
+    # Verificar que el contenido aún existe y que el precio no cambió
+    content = checkout_cache.ppv.get(content_id)
+    if not content:
+        await pre_checkout_query.answer(ok=False, error_message="Contenido no disponible")
+        return
+    if content[1] != pre_checkout_query.total_amount:
+        await pre_checkout_query.answer(ok=False, error_message="El precio del contenido cambió")
+        return
     
-    elif payload.startswith("tip_"):
-        # Validar propina
-        parts = payload.split("_")
-        if len(parts) >= 4:
-            try:
-                creator_id = int(parts[1])
-                tipper_id = int(parts[2])
-                amount = int(parts[3])
-            except ValueError:
-                await pre_checkout_query.answer(ok=False, error_message="Datos de propina inválidos")
-                return
-            
-            # CRÍTICO: Verificar que tipper_id coincida con el usuario actual
-            if tipper_id != pre_checkout_query.from_user.id:
-                await pre_checkout_query.answer(ok=False, error_message="Error de autenticación")
-                return
-            
-            # Verificar que el creador existe
-            creator = get_creator_by_id(creator_id)
-            if not creator:
-                await pre_checkout_query.answer(ok=False, error_message="Creador no encontrado")
-                return
-            
-            # Verificar que el usuario no esté baneado
-            if is_user_banned(tipper_id):
-                await pre_checkout_query.answer(ok=False, error_message="Usuario baneado")
-                return
+    # Verificar que el usuario no esté baneado
+    if checkout_cache.banned.get(buyer_id):
+        await pre_checkout_query.answer(ok=False, error_message="Usuario baneado")
+        return
+    
+    # Verificar que el usuario no haya comprado ya este contenido
+    if checkout_cache.purchases.get((buyer_id, content_id)):
+        await pre_checkout_query.answer(ok=False, error_message="Ya has comprado este contenido")
+        return
+    
+    await pre_checkout_query.answer(ok=True)
+
+async def validate_tip_checkout(pre_checkout_query: PreCheckoutQuery, data):
+    """Valida una propina antes de cobrarla"""
+    # Verificar que el creador existe
+    if checkout_cache.creators.get(data["creator_id"]) is None:
+        await pre_checkout_query.answer(ok=False, error_message="Creador no encontrado")
+        return
+    
+    # Verificar que el usuario no esté baneado
+    if checkout_cache.banned.get(data["tipper_id"]):
+        await pre_checkout_query.answer(ok=False, error_message="Usuario baneado")
+        return
+    
+    if data["amount"] != pre_checkout_query.total_amount:
+        await pre_checkout_query.answer(ok=False, error_message="Datos de propina inválidos")
+        return
     
-    # Aprobar el pago
     await pre_checkout_query.answer(ok=True)
 
-@router.message(F.successful_payment)
-async def process_successful_payment(message: Message):
-    """Procesa pagos exitosos y entrega contenido CON SEGURIDAD REFORZADA"""
-    payment: SuccessfulPayment = message.successful_payment
-    payload = payment.invoice_payload
+async def handle_ppv_payment(message: Message, data):
+    """Liquida una compra PPV; la entrega del contenido sale por el outbox en la misma transacción"""
+    payment = message.successful_payment
     amount_stars = payment.total_amount
+    content_id = data["content_id"]
+    buyer_id = data["buyer_id"]
     
-    if payload.startswith("ppv_"):
-        # Procesar compra PPV
-        parts = payload.split("_")
-        if len(parts) < 3:
-            await message.answer("❌ Error: Datos de pago incompletos")
-            return
-            
-        try:
-            content_id = int(parts[1])
-            buyer_id = int(parts[2])
-        except ValueError:
-            await message.answer("❌ Error: Datos de pago inválidos")
-            return
-        
-        # CRÍTICO: Verificar que buyer_id coincida con el usuario actual
-        if buyer_id != message.from_user.id:
-            await message.answer("❌ Error de autenticación en el pago")
-            return
-        
-        # Obtener información del contenido
-        content = get_ppv_content(content_id)
-        if not content:
-            await message.answer("❌ Error: Contenido no encontrado")
-            return
-        
-        # Manejo flexible de la estructura de datos para compatibilidad
-        if len(content) >= 9:
-            _, creator_id, title, description, price_stars, file_id, file_type, created_at, album_type = content[:9]
-        else:
-            _, creator_id, title, description, price_stars, file_id, file_type = content[:7]
-            album_type = 'single'  # Compatibilidad con registros antiguos
-        
-        # CRÍTICO: Registrar la compra de manera atómica (evita duplicados)
-        purchase_added = add_ppv_purchase(buyer_id, content_id)
-        if not purchase_added:
-            # Ya fue comprado, entregar contenido sin procesar pago nuevamente
-            await message.answer("✅ <b>Contenido ya desbloqueado</b>\n\n📦 Tu contenido:")
-        else:
-            # Nueva compra: procesar pago completo
-            # Calcular comisión y ganancia del creador
-            # CRÍTICO: Asegurar comisión mínima para evitar fuga en montos pequeños
-            commission = max(1, math.ceil(amount_stars * COMMISSION_PERCENTAGE / 100)) if amount_stars > 0 else 0
-            creator_earnings = amount_stars - commission
-            
-            # Actualizar balance del creador
-            update_balance(creator_id, creator_earnings)
-            
-            # Registrar transacción
-            add_transaction(buyer_id, creator_id, amount_stars, commission, "ppv")
-            
-            await message.answer(f"✅ <b>¡Compra exitosa!</b>\n\n💰 Pagaste: {amount_stars} ⭐️\n\n📦 Tu contenido:")
-        
-        # Mostrar álbum o contenido individual según corresponda (independiente de si es nueva compra o ya existía)
-        if album_type == 'album':
-            from aiogram.utils.media_group import MediaGroupBuilder
-            album_items = get_ppv_album_items(content_id)
-            
-            if album_items:
-                media_group = MediaGroupBuilder(caption=f"📁 {title}\n📝 {description}" if description else f"📁 {title}")
-                
-                for item in album_items:
-                    item_file_id = item[2]  # file_id en ppv_album_items
-                    item_file_type = item[3]  # file_type en ppv_album_items
-                    
-                    if item_file_type == "photo":
-                        media_group.add_photo(media=item_file_id)
-                    elif item_file_type == "video":
-                        media_group.add_video(media=item_file_id)
-                
-                await message.answer_media_group(media=media_group.build())
-        else:
-            # Contenido individual
-            caption = f"📸 {title}\n📝 {description}" if description else f"📸 {title}"
-            if file_type == "photo":
-                await message.answer_photo(photo=file_id, caption=caption)
-            elif file_type == "video":
-                await message.answer_video(video=file_id, caption=caption)
+    content = checkout_cache.ppv.get(content_id)
+    if not content:
+        await message.answer("❌ Error: Contenido no encontrado")
+        return
+    creator_id = content[0]
     
-    elif payload.startswith("tip_"):
-        # Procesar propina
-        parts = payload.split("_")
-        if len(parts) < 4:
-            await message.answer("❌ Error: Datos de propina incompletos")
-            return
-            
-        try:
-            creator_id = int(parts[1])
-            tipper_id = int(parts[2])
-            amount = int(parts[3])
-        except ValueError:
-            await message.answer("❌ Error: Datos de propina inválidos")
-            return
-        
-        # CRÍTICO: Verificar que tipper_id coincida con el usuario actual
-        if tipper_id != message.from_user.id:
-            await message.answer("❌ Error de autenticación en la propina")
-            return
-        
-        # Obtener información del creador
-        creator = get_creator_by_id(creator_id)
-        if not creator:
-            await message.answer("❌ Error: Creador no encontrado")
-            return
-        
-        creator_name = creator[3]  # display_name
-        
-        # Calcular comisión y ganancia del creador
-        # CRÍTICO: Asegurar comisión mínima para evitar fuga en montos pequeños
-        commission = max(1, math.ceil(amount_stars * COMMISSION_PERCENTAGE / 100)) if amount_stars > 0 else 0
-        creator_earnings = amount_stars - commission
-        
-        # Actualizar balance del creador
-        update_balance(creator_id, creator_earnings)
-        
-        # Registrar transacción
-        add_transaction(tipper_id, creator_id, amount_stars, commission, "tip")
-        
-        await message.answer(
-            f"✅ <b>¡Propina enviada exitosamente!</b>\n\n"
-            f"👤 Para: {creator_name}\n"
-            f"💰 Monto: {amount_stars} ⭐️\n"
-            f"💫 El creador ha recibido {creator_earnings} ⭐️ (después de comisión del {COMMISSION_PERCENTAGE}%)"
-        )
\ No newline at end of file
+    # CRÍTICO: Compra, comisión y balance en una sola transacción idempotente por charge_id
+    # CRÍTICO: Asegurar comisión mínima para evitar fuga en montos pequeños
+    commission = max(1, math.ceil(amount_stars * settings.commission_percentage / 100)) if amount_stars > 0 else 0
+    settled = settle_payment(
+        payment.telegram_payment_charge_id, "ppv", buyer_id, amount_stars,
+        receiver_id=creator_id, commission_stars=commission, tx_type="ppv", ppv_content_id=content_id,
+        outbox=payment_outbox("ppv", message.chat.id, creator_id, amount_stars, commission, content_id)
+    )
+    if settled:
+        outbox_relay.notify()
+        await event_bus.publish(PaymentSettled(
+            "ppv", payment.telegram_payment_charge_id, buyer_id, creator_id,
+            amount_stars, commission, message.chat.id
+        ))
+    # Una reentrega de un pago ya procesado vuelve a entregar el contenido sin cobrar (por el bus);
+    # el evento de la primera entrega solo alimenta las estadísticas
+    await event_bus.publish(ContentPurchased(buyer_id, content_id, amount_stars, message.chat.id, redelivery=not settled))
+
+async def handle_tip_payment(message: Message, data):
+    """Liquida una propina; recibo y aviso al creador salen por el outbox"""
+    payment = message.successful_payment
+    amount_stars = payment.total_amount
+    creator_id = data["creator_id"]
+    tipper_id = data["tipper_id"]
+    
+    if checkout_cache.creators.get(creator_id) is None:
+        await message.answer("❌ Error: Creador no encontrado")
+        return
+    
+    # Calcular comisión y ganancia del creador
+    # CRÍTICO: Asegurar comisión mínima para evitar fuga en montos pequeños
+    commission = max(1, math.ceil(amount_stars * settings.commission_percentage / 100)) if amount_stars > 0 else 0
+    
+    # CRÍTICO: Idempotente por charge_id, una reentrega no acredita dos veces
+    if not settle_payment(
+        payment.telegram_payment_charge_id, "tip", tipper_id, amount_stars,
+        receiver_id=creator_id, commission_stars=commission, tx_type="tip",
+        outbox=payment_outbox("tip", message.chat.id, creator_id, amount_stars, commission)
+    ):
+        await message.answer("ℹ️ Esta propina ya fue procesada.")
+        return
+    
+    outbox_relay.notify()
+    await event_bus.publish(PaymentSettled(
+        "tip", payment.telegram_payment_charge_id, tipper_id, creator_id,
+        amount_stars, commission, message.chat.id
+    ))
+
+register_payment("ppv", ("content_id", "buyer_id"), "buyer_id", validate_ppv_checkout, handle_ppv_payment)
+register_payment(
+    "tip", ("creator_id", "tipper_id", "amount"), "tipper_id",
+    validate_tip_checkout, handle_tip_payment
+)
@@ -0,0 +1,157 @@
+# bot/scheduler.py
+"""
+Planificador de trabajos persistente
+Los vencimientos se guardan en SQLite y un único bucle, guiado por un heap,
+duerme hasta el siguiente vencimiento. Al arrancar se recargan los trabajos
+pendientes y los vencidos se ejecutan de inmediato.
+"""
+
+import asyncio
+import heapq
+import json
+import logging
+import time
+from typing import Awaitable, Callable, Dict
+
+from database import add_scheduled_job, get_pending_scheduled_jobs, update_scheduled_job, cancel_scheduled_job
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[..., Awaitable[None]]
+
+MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = 30  # segundos, se duplica en cada reintento
+
+class DurableScheduler:
+    """Temporizadores persistentes: miles de trabajos pendientes cuestan una sola corrutina"""
+
+    def __init__(self):
+        self._handlers: Dict[str, JobHandler] = {}
+        self._heap: list = []  # (due_at, job_id, job_type, payload, attempts)
+        self._cancelled: set = set()
+        self._running: set = set()
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def register(self, job_type: str, handler: JobHandler):
+        """Asocia un tipo de trabajo con su corrutina; recibe el payload como kwargs"""
+        self._handlers[job_type] = handler
+
+    async def schedule(self, job_type: str, due_at: float, **payload) -> int:
+        """Programa un trabajo para la marca de tiempo due_at (epoch en segundos)"""
+        job_id = add_scheduled_job(job_type, json.dumps(payload), due_at)
+        self._push(due_at, job_id, job_type, payload, 0)
+        return job_id
+
+    async def schedule_in(self, job_type: str, delay_seconds: float, **payload) -> int:
+        return await self.schedule(job_type, time.time() + delay_seconds, **payload)
+
+    def cancel(self, job_id: int) -> bool:
+        """Cancela un trabajo pendiente (se descarta al salir del heap)
+
+        Un trabajo ya terminado, fallido o cancelado no se toca y devuelve False
+        """
+        if not cancel_scheduled_job(job_id):
+            return False
+        # Solo se marca si sigue en el heap: al salir de él se quita de _cancelled
+        if any(entry[1] == job_id for entry in self._heap):
+            self._cancelled.add(job_id)
+        return True
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._heap)
+
+    def has_pending(self, job_type: str) -> bool:
+        """Indica si hay algún trabajo pendiente de ese tipo (útil para trabajos recurrentes)"""
+        return any(
+            entry[2] == job_type and entry[1] not in self._cancelled
+            for entry in self._heap
+        )
+
+    def start(self):
+        """Recarga los trabajos pendientes y arranca el bucle del temporizador"""
+        if self._task:
+            return
+        overdue = skipped = 0
+        now = time.time()
+        # Los programados antes de arrancar ya están en el heap: no duplicarlos
+        queued = {entry[1] for entry in self._heap}
+        for job_id, job_type, payload, due_at, attempts in get_pending_scheduled_jobs():
+            if job_id in queued:
+                continue
+            if job_type not in self._handlers:
+                # Subsistema no cargado (p. ej. videollamadas desactivadas): se queda pendiente en disco
+                skipped += 1
+                continue
+            heapq.heappush(self._heap, (due_at, job_id, job_type, json.loads(payload or "{}"), attempts))
+            if due_at <= now:
+                overdue += 1
+        logger.info(f"⏰ Planificador: {len(self._heap)} trabajos pendientes ({overdue} vencidos)")
+        if skipped:
+            logger.info(f"ℹ️ Planificador: {skipped} trabajos sin handler registrado se dejan pendientes")
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+
+    def _push(self, due_at, job_id, job_type, payload, attempts):
+        earliest = self._heap[0][0] if self._heap else None
+        heapq.heappush(self._heap, (due_at, job_id, job_type, payload, attempts))
+        # Despertar el bucle solo si el nuevo trabajo vence antes que el siguiente
+        if earliest is None or due_at < earliest:
+            self._wakeup.set()
+
+    async def _loop(self):
+        while True:
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+
+            delay = self._heap[0][0] - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            due_at, job_id, job_type, payload, attempts = heapq.heappop(self._heap)
+            if job_id in self._cancelled:
+                self._cancelled.discard(job_id)
+                continue
+
+            # Cada trabajo corre en su propia tarea para no retrasar al resto
+            task = asyncio.create_task(self._run(job_id, job_type, payload, attempts))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, job_id, job_type, payload, attempts):
+        handler = self._handlers.get(job_type)
+        if handler is None:
+            logger.error(f"❌ Sin handler para el trabajo {job_id} de tipo {job_type}")
+            update_scheduled_job(job_id, 'failed', last_error="handler no registrado")
+            return
+
+        try:
+            await handler(**payload)
+            update_scheduled_job(job_id, 'done', attempts=attempts + 1)
+        except Exception as e:
+            attempts += 1
+            if attempts >= MAX_ATTEMPTS:
+                logger.error(f"❌ Trabajo {job_id} ({job_type}) falló definitivamente: {e}")
+                update_scheduled_job(job_id, 'failed', attempts=attempts, last_error=str(e))
+                return
+            retry_at = time.time() + RETRY_BASE_DELAY * 2 ** (attempts - 1)
+            logger.warning(f"⚠️ Trabajo {job_id} ({job_type}) falló, reintento {attempts}: {e}")
+            update_scheduled_job(job_id, 'pending', due_at=retry_at, attempts=attempts, last_error=str(e))
+            self._push(retry_at, job_id, job_type, payload, attempts)
+
+# Instancia global del planificador
+scheduler = DurableScheduler()
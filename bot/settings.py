@@ -0,0 +1,121 @@
+# bot/settings.py
+"""
+Configuración del bot
+El .env se carga una sola vez aquí y los valores quedan en un objeto tipado
+e inmutable compartido por todos los módulos. Debe importarse antes que
+cualquier módulo que lea variables de entorno al importarse.
+
+Recarga en caliente: reload_settings() (SIGHUP o /reload_settings) relee
+el .env y sustituye la instantánea de una vez; quien lee settings.campo ve
+siempre una instantánea completa, nunca una mezcla de valores viejos y nuevos
+"""
+
+import logging
+import os
+from dataclasses import dataclass, fields, replace
+from typing import Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Se leen al arrancar y una recarga no los cambia
+RESTART_ONLY = ("bot_token", "fsm_storage", "telegram_api_id", "telegram_api_hash", "telegram_phone_number")
+
+def _optional_int(value: Optional[str]) -> Optional[int]:
+    return int(value) if value else None
+
+@dataclass(frozen=True)
+class Settings:
+    """Valores de configuración del proceso"""
+    bot_token: Optional[str] = None
+    admin_username: str = "@admin"
+    commission_percentage: int = 20
+    exchange_rate: float = 0.013         # USD por Star
+    min_withdrawal: int = 1000           # Stars
+    withdrawal_mode: str = "REAL"
+    fsm_storage: str = "sqlite"          # "sqlite" o "memory"
+    # Cliente de usuario de Pyrogram para videollamadas (opcional)
+    telegram_api_id: Optional[int] = None
+    telegram_api_hash: Optional[str] = None
+    telegram_phone_number: Optional[str] = None
+
+    @property
+    def videocalls_enabled(self) -> bool:
+        """El subsistema de videollamadas (y Pyrogram) solo se carga con credenciales completas"""
+        return bool(self.telegram_api_id and self.telegram_api_hash and self.telegram_phone_number)
+
+def load_settings() -> Settings:
+    """Construye la configuración a partir del entorno"""
+    return Settings(
+        bot_token=os.getenv("BOT_TOKEN"),
+        admin_username=os.getenv("ADMIN_USERNAME", "@admin"),
+        commission_percentage=int(os.getenv("COMMISSION_PERCENTAGE", 20)),
+        exchange_rate=float(os.getenv("EXCHANGE_RATE", 0.013)),
+        min_withdrawal=int(os.getenv("MIN_WITHDRAWAL", 1000)),
+        withdrawal_mode=os.getenv("WITHDRAWAL_MODE", "REAL"),
+        fsm_storage=os.getenv("FSM_STORAGE", "sqlite"),
+        telegram_api_id=_optional_int(os.getenv("TELEGRAM_API_ID")),
+        telegram_api_hash=os.getenv("TELEGRAM_API_HASH"),
+        telegram_phone_number=os.getenv("TELEGRAM_PHONE_NUMBER"),
+    )
+
+def validate_settings(new: Settings):
+    """ValueError si la configuración no es utilizable"""
+    if not 0 <= new.commission_percentage <= 100:
+        raise ValueError(f"COMMISSION_PERCENTAGE fuera de rango: {new.commission_percentage}")
+    if new.exchange_rate <= 0:
+        raise ValueError(f"EXCHANGE_RATE debe ser positivo: {new.exchange_rate}")
+    if new.min_withdrawal < 0:
+        raise ValueError(f"MIN_WITHDRAWAL no puede ser negativo: {new.min_withdrawal}")
+
+class SettingsHolder:
+    """Acceso a la instantánea vigente: settings.commission_percentage, etc.
+
+    Para leer varios valores coherentes entre sí dentro de una operación,
+    usar settings.snapshot() una vez y leer de ella
+    """
+
+    def __init__(self, initial: Settings):
+        self._current = initial
+        self.reloads = 0
+
+    def __getattr__(self, name):
+        return getattr(self._current, name)
+
+    def snapshot(self) -> Settings:
+        return self._current
+
+    def reload(self) -> Tuple[Dict[str, tuple], Dict[str, tuple]]:
+        """Relee el .env y cambia la instantánea de una vez
+
+        Devuelve (aplicados, pendientes_de_reinicio) como {campo: (antes, después)}.
+        Si la nueva configuración no es válida lanza ValueError y no cambia nada
+        """
+        load_dotenv(override=True)
+        old = self._current
+        loaded = load_settings()
+        validate_settings(loaded)
+        # Los campos de arranque se conservan hasta el próximo reinicio
+        new = replace(loaded, **{name: getattr(old, name) for name in RESTART_ONLY})
+        applied, pending = {}, {}
+        for field in fields(Settings):
+            before, after = getattr(old, field.name), getattr(loaded, field.name)
+            if before != after:
+                (pending if field.name in RESTART_ONLY else applied)[field.name] = (before, after)
+        self._current = new
+        self.reloads += 1
+        if applied:
+            logger.info(f"✅ Configuración recargada: {', '.join(applied)}")
+        if pending:
+            logger.warning(f"⚠️ Cambios que requieren reinicio: {', '.join(pending)}")
+        return applied, pending
+
+# Configuración compartida del proceso
+settings = SettingsHolder(load_settings())
+
+def reload_settings():
+    """Recarga la configuración compartida (ver SettingsHolder.reload)"""
+    return settings.reload()
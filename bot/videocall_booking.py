@@ -0,0 +1,260 @@
+# bot/videocall_booking.py
+"""
+Reservas de videollamadas en horarios concretos
+Los creadores publican ventanas de disponibilidad y los fans reservan
+franjas de 10/30/60 minutos. Los conflictos se detectan con un índice de
+intervalos en memoria (listas ordenadas + bisect) respaldado por SQLite, y
+las sesiones reservadas arrancan a su hora mediante el planificador persistente
+"""
+
+import logging
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from database import (
+    add_videocall_availability, get_videocall_availability,
+    add_videocall_booking, get_videocall_booking, get_upcoming_videocall_bookings,
+    update_videocall_booking_status, get_creator_by_id
+)
+from scheduler import scheduler
+from videocall_system import videocall_manager, charge_videocall, refund_videocall
+
+logger = logging.getLogger(__name__)
+
+# Las franjas ofrecidas empiezan en múltiplos de este paso (segundos)
+SLOT_STEP = 10 * 60
+BOOKABLE_DURATIONS = (10, 30, 60)
+# Reintentos de arranque de una reserva: se duplican y el último cae al final de la franja
+BOOKING_RETRY_DELAY = 30
+
+class BookingConflict(Exception):
+    """La franja solicitada se solapa con otra reserva o está fuera de la disponibilidad"""
+
+class IntervalIndex:
+    """Intervalos semiabiertos [inicio, fin) ordenados y sin solapamiento"""
+
+    def __init__(self):
+        self._starts: List[float] = []
+        self._ends: List[float] = []
+        self._ids: List[int] = []
+
+    def __len__(self):
+        return len(self._starts)
+
+    def __iter__(self):
+        return iter(zip(self._starts, self._ends, self._ids))
+
+    def overlapping(self, start: float, end: float) -> Optional[int]:
+        """Posición del primer intervalo que se solapa con [start, end), o None. O(log n)"""
+        i = bisect_right(self._starts, start)
+        if i > 0 and self._ends[i - 1] > start:
+            return i - 1
+        if i < len(self._starts) and self._starts[i] < end:
+            return i
+        return None
+
+    def covering(self, start: float, end: float) -> Optional[int]:
+        """Posición del intervalo que contiene por completo [start, end), o None"""
+        i = bisect_right(self._starts, start) - 1
+        if i >= 0 and self._ends[i] >= end:
+            return i
+        return None
+
+    def add(self, start: float, end: float, item_id: int):
+        if self.overlapping(start, end) is not None:
+            raise BookingConflict("El intervalo se solapa con otro existente")
+        i = bisect_left(self._starts, start)
+        self._starts.insert(i, start)
+        self._ends.insert(i, end)
+        self._ids.insert(i, item_id)
+
+    def remove(self, item_id: int):
+        i = self._ids.index(item_id)
+        del self._starts[i], self._ends[i], self._ids[i]
+
+    def from_time(self, after: float):
+        """Intervalos que terminan después de 'after', en orden"""
+        i = bisect_right(self._starts, after)
+        if i > 0 and self._ends[i - 1] > after:
+            i -= 1
+        for j in range(i, len(self._starts)):
+            yield self._starts[j], self._ends[j], self._ids[j]
+
+    def end_at(self, position: int) -> float:
+        return self._ends[position]
+
+class CreatorCalendar:
+    """Disponibilidad y reservas de un creador"""
+
+    def __init__(self):
+        self.windows = IntervalIndex()
+        self.bookings = IntervalIndex()
+
+def _align(timestamp: float) -> float:
+    """Redondea hacia arriba al siguiente múltiplo de SLOT_STEP"""
+    return -(-timestamp // SLOT_STEP) * SLOT_STEP
+
+class BookingEngine:
+    """Motor de reservas; carga el calendario de cada creador bajo demanda"""
+
+    def __init__(self):
+        self._calendars: Dict[int, CreatorCalendar] = {}
+        self.bot = None  # se asigna al arrancar para enviar notificaciones
+
+    def _calendar(self, creator_id: int) -> CreatorCalendar:
+        calendar = self._calendars.get(creator_id)
+        if calendar is None:
+            calendar = CreatorCalendar()
+            now = time.time()
+            for window_id, start_at, end_at in get_videocall_availability(creator_id, now):
+                try:
+                    calendar.windows.add(start_at, end_at, window_id)
+                except BookingConflict:
+                    logger.warning(f"⚠️ Ventana {window_id} solapada ignorada (creador {creator_id})")
+            for booking_id, start_at, end_at in get_upcoming_videocall_bookings(creator_id, now):
+                calendar.bookings.add(start_at, end_at, booking_id)
+            self._calendars[creator_id] = calendar
+        return calendar
+
+    def add_availability(self, creator_id: int, start_at: float, end_at: float) -> int:
+        """Publica una ventana de disponibilidad; no puede solaparse con otra del creador"""
+        if end_at <= start_at:
+            raise BookingConflict("La ventana debe terminar después de empezar")
+        calendar = self._calendar(creator_id)
+        if calendar.windows.overlapping(start_at, end_at) is not None:
+            raise BookingConflict("La ventana se solapa con otra ya publicada")
+        window_id = add_videocall_availability(creator_id, start_at, end_at)
+        calendar.windows.add(start_at, end_at, window_id)
+        return window_id
+
+    def availability(self, creator_id: int, after: float = None):
+        return list(self._calendar(creator_id).windows.from_time(after or time.time()))
+
+    def has_availability(self, creator_id: int) -> bool:
+        return bool(self.availability(creator_id))
+
+    def free_slots(self, creator_id: int, duration_minutes: int, after: float = None, limit: int = 6):
+        """Próximas franjas libres; cada franja cuesta O(log n) búsquedas en el índice"""
+        calendar = self._calendar(creator_id)
+        duration = duration_minutes * 60
+        after = after or time.time()
+        slots = []
+
+        for window_start, window_end, _ in calendar.windows.from_time(after):
+            cursor = _align(max(window_start, after))
+            while cursor + duration <= window_end:
+                conflict = calendar.bookings.overlapping(cursor, cursor + duration)
+                if conflict is None:
+                    slots.append(cursor)
+                    if len(slots) >= limit:
+                        return slots
+                    cursor += duration
+                else:
+                    # Saltar al final de la reserva que bloquea la franja
+                    cursor = _align(calendar.bookings.end_at(conflict))
+        return slots
+
+    def check_slot(self, creator_id: int, start_at: float, duration_minutes: int):
+        """Valida que la franja se pueda reservar. Lanza BookingConflict si no"""
+        if duration_minutes not in BOOKABLE_DURATIONS:
+            raise BookingConflict("Duración no válida")
+        end_at = start_at + duration_minutes * 60
+        if start_at < time.time():
+            raise BookingConflict("La franja ya empezó")
+
+        calendar = self._calendar(creator_id)
+        if calendar.windows.covering(start_at, end_at) is None:
+            raise BookingConflict("La franja está fuera de la disponibilidad del creador")
+        if calendar.bookings.overlapping(start_at, end_at) is not None:
+            raise BookingConflict("La franja ya está reservada")
+
+    async def book(self, creator_id: int, fan_id: int, start_at: float, duration_minutes: int,
+                   price_stars: int, charge_id: str = None) -> int:
+        """Reserva una franja y programa el inicio de la sesión. Lanza BookingConflict si no está libre"""
+        self.check_slot(creator_id, start_at, duration_minutes)
+        end_at = start_at + duration_minutes * 60
+        calendar = self._calendar(creator_id)
+
+        # Comprobación y alta sin await intermedio: no hay carrera entre dos fans
+        booking_id = add_videocall_booking(
+            creator_id, fan_id, start_at, end_at, duration_minutes, price_stars, charge_id
+        )
+        calendar.bookings.add(start_at, end_at, booking_id)
+
+        await scheduler.schedule("videocall_booking_start", start_at, booking_id=booking_id)
+        logger.info(f"✅ Reserva {booking_id}: creador {creator_id}, fan {fan_id}, {format_slot(start_at)}")
+        return booking_id
+
+    async def cancel(self, booking_id: int):
+        """Cancela una reserva, libera la franja y reembolsa si estaba pagada"""
+        booking = get_videocall_booking(booking_id)
+        if not booking or booking[7] != 'booked':
+            return False
+        update_videocall_booking_status(booking_id, 'cancelled')
+        self._forget(booking[1], booking_id)
+        await refund_videocall(self.bot, booking[2], booking[10])
+        return True
+
+    def _forget(self, creator_id: int, booking_id: int):
+        calendar = self._calendars.get(creator_id)
+        if calendar:
+            calendar.bookings.remove(booking_id)
+
+    async def start_booked_session(self, booking_id: int, attempt: int = 0):
+        """Handler del planificador: arranca la sesión de una reserva a su hora
+
+        Los reintentos se programan aquí y no con el backoff del planificador, que
+        se rinde antes de que acabe la franja: el último cae en end_at y reembolsa
+        """
+        booking = get_videocall_booking(booking_id)
+        if not booking or booking[7] != 'booked':
+            return
+
+        _, creator_id, fan_id, start_at, end_at, duration_minutes, price_stars, _, _, _, charge_id = booking
+        if time.time() >= end_at:
+            # La franja ya pasó: no tiene sentido seguir reintentando
+            update_videocall_booking_status(booking_id, 'failed')
+            self._forget(creator_id, booking_id)
+            await refund_videocall(self.bot, fan_id, charge_id)
+            logger.error(f"❌ Reserva {booking_id} no se pudo prestar, se reembolsa")
+            return
+
+        creator = get_creator_by_id(creator_id)
+        creator_name = (creator[3] or creator[2]) if creator else "Sin nombre"
+
+        session_id, group_id = await videocall_manager.start_videocall_session(
+            creator_id, fan_id, duration_minutes, price_stars, creator_name
+        )
+        if not session_id:
+            retry_at = min(time.time() + BOOKING_RETRY_DELAY * 2 ** attempt, end_at)
+            await scheduler.schedule(
+                "videocall_booking_start", retry_at, booking_id=booking_id, attempt=attempt + 1
+            )
+            logger.warning(f"⚠️ Reserva {booking_id}: no se pudo iniciar ({group_id}), reintento {attempt + 1}")
+            return
+
+        update_videocall_booking_status(booking_id, 'started', session_id)
+        self._forget(creator_id, booking_id)
+        if price_stars > 0:
+            charge_videocall(fan_id, creator_id, price_stars)
+
+        if self.bot:
+            for user_id in (creator_id, fan_id):
+                try:
+                    await self.bot.send_message(
+                        user_id,
+                        f"📹 <b>Tu videollamada reservada ha comenzado</b>\n\n"
+                        f"⏱️ <b>Duración:</b> {duration_minutes} minutos\n"
+                        f"🆔 <b>Sesión:</b> {session_id}"
+                    )
+                except Exception as e:
+                    logger.error(f"Error notificando inicio de reserva a {user_id}: {e}")
+
+def format_slot(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp).strftime("%d/%m %H:%M")
+
+# Instancia global del motor de reservas
+booking_engine = BookingEngine()
+scheduler.register("videocall_booking_start", booking_engine.start_booked_session)
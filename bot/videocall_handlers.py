@@ -1,17 +1,24 @@
 # bot/videocall_handlers.py
 import asyncio
 import logging
+import time
+from datetime import datetime
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, LabeledPrice, PreCheckoutQuery
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.filters import Command
 
 from database import (
     get_creator_by_id, set_videocall_settings, get_videocall_settings,
-    get_all_creators, add_transaction, update_balance
+    get_all_creators, settle_payment
 )
-from videocall_system import videocall_manager
+from payment_router import register_payment, encode_payload
+from callbacks import VcSelectCreator, VcDuration, VcPay, VcQueue, VcLeaveQueue, VcSchedule, VcSlots, VcBook
+from checkout_cache import checkout_cache
+from videocall_system import videocall_manager, charge_videocall, refund_videocall
+from videocall_waitlist import videocall_waitlist
+from videocall_booking import booking_engine, BookingConflict, BOOKABLE_DURATIONS, format_slot
 
 logger = logging.getLogger(__name__)
 router = Router()
@@ -31,6 +38,37 @@ class VideocallRequest(StatesGroup):
 
 # ==================== FUNCIONES PARA BOTONES ====================
 
+def waitlist_text(creator_name, position, eta_minutes, paid=False):
+    note = "Si sales de la cola se te reembolsa el pago." if paid else "No se cobra nada hasta entonces."
+    return f"""⏳ <b>En cola para videollamada</b>
+
+🎥 <b>Creador:</b> {creator_name}
+👥 <b>Tu posición:</b> {position}
+🕒 <b>Espera estimada:</b> ~{int(eta_minutes)} minutos
+
+Te avisaremos cuando sea tu turno. {note}"""
+
+def waitlist_keyboard(creator_id, entry_id):
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="🔄 Actualizar posición", callback_data=VcQueue(creator_id=creator_id, entry_id=entry_id).pack())],
+        [InlineKeyboardButton(text="🚪 Salir de la cola", callback_data=VcLeaveQueue(entry_id=entry_id).pack())]
+    ])
+
+async def send_pending_invite_links(bot, group_id, user_ids):
+    """Enviar el enlace del grupo a quienes no se pudo agregar directamente (privacidad)"""
+    for user_id in user_ids:
+        link = videocall_manager.get_pending_invite_link(group_id, user_id)
+        if not link:
+            continue
+        try:
+            await bot.send_message(
+                user_id,
+                "🔗 <b>Tu configuración de privacidad no permite agregarte al grupo</b>\n\n"
+                f"Únete a la videollamada con este enlace:\n{link}"
+            )
+        except Exception as e:
+            logger.error(f"Error enviando enlace de invitación a {user_id}: {e}")
+
 async def show_available_creators_for_videocall(message: Message):
     """Mostrar creadores disponibles para videollamadas (para fans)"""
     creators = get_all_creators()
@@ -71,7 +109,7 @@ async def show_available_creators_for_videocall(message: Message):
         keyboard.append([
             InlineKeyboardButton(
                 text=f"📞 {creator_name}",
-                callback_data=f"vc_select_creator:{creator[1]}"
+                callback_data=VcSelectCreator(creator_id=creator[1]).pack()
             )
         ])
     
@@ -298,10 +336,10 @@ Los fans podrán solicitar videollamadas contigo desde el botón '🎥 Videollam
         await message.reply("❌ Por favor ingresa solo números. Ejemplo: 500")
 
 
-@router.callback_query(F.data.startswith("vc_select_creator:"))
-async def select_creator_for_videocall(callback: CallbackQuery, state: FSMContext):
+@router.callback_query(VcSelectCreator.filter())
+async def select_creator_for_videocall(callback: CallbackQuery, callback_data: VcSelectCreator, state: FSMContext):
     """Seleccionar creador para videollamada"""
-    creator_id = int(callback.data.split(":")[1])
+    creator_id = callback_data.creator_id
     creator = get_creator_by_id(creator_id)
     settings = get_videocall_settings(creator_id)
     
@@ -320,7 +358,7 @@ async def select_creator_for_videocall(callback: CallbackQuery, state: FSMContex
         keyboard.inline_keyboard.append([
             InlineKeyboardButton(
                 text=f"🕙 10 minutos - {price_text}",
-                callback_data=f"vc_duration:{creator_id}:10:{settings[2]}"
+                callback_data=VcDuration(creator_id=creator_id, duration=10, price=settings[2]).pack()
             )
         ])
     
@@ -329,7 +367,7 @@ async def select_creator_for_videocall(callback: CallbackQuery, state: FSMContex
         keyboard.inline_keyboard.append([
             InlineKeyboardButton(
                 text=f"🕕 30 minutos - {price_text}",
-                callback_data=f"vc_duration:{creator_id}:30:{settings[3]}"
+                callback_data=VcDuration(creator_id=creator_id, duration=30, price=settings[3]).pack()
             )
         ])
     
@@ -338,10 +376,15 @@ async def select_creator_for_videocall(callback: CallbackQuery, state: FSMContex
         keyboard.inline_keyboard.append([
             InlineKeyboardButton(
                 text=f"🕐 60 minutos - {price_text}",
-                callback_data=f"vc_duration:{creator_id}:60:{settings[4]}"
+                callback_data=VcDuration(creator_id=creator_id, duration=60, price=settings[4]).pack()
             )
         ])
     
+    if booking_engine.has_availability(creator_id):
+        keyboard.inline_keyboard.append([
+            InlineKeyboardButton(text="📅 Reservar para más tarde", callback_data=VcSchedule(creator_id=creator_id).pack())
+        ])
+    
     keyboard.inline_keyboard.append([
         InlineKeyboardButton(text="⬅️ Volver", callback_data="vc_back_to_creators")
     ])
@@ -353,20 +396,28 @@ Selecciona la duración que prefieras:""",
         reply_markup=keyboard
     )
 
-@router.callback_query(F.data.startswith("vc_duration:"))
-async def confirm_videocall_payment(callback: CallbackQuery):
+@router.callback_query(VcDuration.filter())
+async def confirm_videocall_payment(callback: CallbackQuery, callback_data: VcDuration):
     """Confirmar pago y crear videollamada"""
     try:
-        _, creator_id, duration, price = callback.data.split(":")
-        creator_id = int(creator_id)
-        duration = int(duration)
-        price = int(price)
+        creator_id = callback_data.creator_id
+        duration = callback_data.duration
+        price = callback_data.price
         
         fan_id = callback.from_user.id
         creator = get_creator_by_id(creator_id)
         creator_name = creator[3] or creator[2] or "Sin nombre"
         
         if price == 0:
+            # Creador al límite de sesiones simultáneas: el fan entra en la cola
+            if not videocall_waitlist.has_capacity(creator_id):
+                entry_id, position, eta = videocall_waitlist.enqueue(creator_id, fan_id, duration, 0)
+                await callback.message.edit_text(
+                    waitlist_text(creator_name, position, eta),
+                    reply_markup=waitlist_keyboard(creator_id, entry_id)
+                )
+                return
+            
             # Videollamada gratuita - crear inmediatamente
             await callback.message.edit_text("🔄 Creando videollamada gratuita...")
             
@@ -386,6 +437,7 @@ async def confirm_videocall_payment(callback: CallbackQuery):
 📱 <b>¡Ya puedes iniciar la videollamada!</b>
 El grupo se eliminará automáticamente después de {duration + 5} minutos."""
                 )
+                await send_pending_invite_links(callback.bot, group_id, [creator_id, fan_id])
                 
                 # Notificar al creador
                 # TODO: Enviar notificación al creador sobre nueva videollamada
@@ -399,7 +451,7 @@ El grupo se eliminará automáticamente después de {duration + 5} minutos."""
             keyboard = InlineKeyboardMarkup(inline_keyboard=[
                 [InlineKeyboardButton(
                     text=f"💳 Pagar {price} ⭐",
-                    callback_data=f"vc_pay:{creator_id}:{duration}:{price}"
+                    callback_data=VcPay(creator_id=creator_id, duration=duration, price=price).pack()
                 )],
                 [InlineKeyboardButton(text="❌ Cancelar", callback_data="vc_cancel")]
             ])
@@ -419,43 +471,149 @@ El grupo se eliminará automáticamente después de {duration + 5} minutos."""
         logger.error(f"Error en confirmación de videollamada: {e}")
         await callback.answer("❌ Error interno", show_alert=True)
 
-@router.callback_query(F.data.startswith("vc_pay:"))
-async def process_videocall_payment(callback: CallbackQuery):
-    """Procesar pago de videollamada (simulado)"""
+@router.callback_query(VcPay.filter())
+async def process_videocall_payment(callback: CallbackQuery, callback_data: VcPay):
+    """Enviar la factura en Stars de una videollamada inmediata"""
     try:
-        _, creator_id, duration, price = callback.data.split(":")
-        creator_id = int(creator_id)
-        duration = int(duration)
-        price = int(price)
-        
-        fan_id = callback.from_user.id
-        creator = get_creator_by_id(creator_id)
-        creator_name = creator[3] or creator[2] or "Sin nombre"
-        
-        await callback.message.edit_text("🔄 Procesando pago...")
-        
-        # TODO: Integrar con sistema de pago real de Telegram Stars
-        # Por ahora simulamos el pago exitoso
-        
-        # Calcular comisión (20%)
-        commission_percentage = int(os.getenv("COMMISSION_PERCENTAGE", 20))
-        commission = (price * commission_percentage) // 100
-        creator_earnings = price - commission
-        
-        # Registrar transacción
-        add_transaction(fan_id, creator_id, price, commission, 'videocall')
-        
-        # Actualizar balance del creador
-        update_balance(creator_id, creator_earnings)
-        
-        # Crear videollamada
-        session_id, group_id = await videocall_manager.start_videocall_session(
-            creator_id, fan_id, duration, price, creator_name
+        await send_videocall_invoice(callback, callback_data.creator_id, callback_data.duration)
+    except Exception as e:
+        logger.error(f"Error en pago de videollamada: {e}")
+        await callback.answer("❌ Error en el pago", show_alert=True)
+
+def videocall_price(creator_id, duration):
+    """Precio vigente de una duración según la configuración del creador (None si no está disponible)"""
+    prices = checkout_cache.videocall.get(creator_id)
+    if not prices or not prices[0] or duration not in BOOKABLE_DURATIONS:
+        return None
+    return prices[1 + BOOKABLE_DURATIONS.index(duration)]
+
+async def send_videocall_invoice(callback: CallbackQuery, creator_id, duration, start_at=0):
+    """Factura de videollamada; start_at > 0 indica una franja reservada"""
+    price = videocall_price(creator_id, duration)
+    if not price:
+        await callback.answer("❌ Creador no disponible", show_alert=True)
+        return
+    
+    creator = get_creator_by_id(creator_id)
+    creator_name = creator[3] or creator[2] or "Sin nombre"
+    when = f" • {format_slot(start_at)}" if start_at else ""
+    
+    await callback.message.edit_text("💳 Te enviamos la factura para completar el pago.")
+    await callback.bot.send_invoice(
+        chat_id=callback.from_user.id,
+        title=f"Videollamada con {creator_name}",
+        description=f"Videollamada privada de {duration} minutos{when}",
+        payload=encode_payload("vc", creator_id, callback.from_user.id, duration, int(start_at)),
+        provider_token="",  # Vacío para Stars
+        currency="XTR",
+        prices=[LabeledPrice(label=f"Videollamada {duration} min", amount=price)]
+    )
+    await callback.answer()
+
+async def validate_videocall_checkout(pre_checkout_query: PreCheckoutQuery, data):
+    """Pre-checkout de videollamadas: precio vigente y, si es reserva, franja libre"""
+    creator_id, fan_id, duration, start_at = data["creator_id"], data["fan_id"], data["duration"], data["start_at"]
+    
+    if checkout_cache.banned.get(fan_id):
+        await pre_checkout_query.answer(ok=False, error_message="Usuario baneado")
+        return
+    if videocall_price(creator_id, duration) != pre_checkout_query.total_amount:
+        await pre_checkout_query.answer(ok=False, error_message="El precio de la videollamada cambió")
+        return
+    if start_at:
+        try:
+            booking_engine.check_slot(creator_id, start_at, duration)
+        except BookingConflict as e:
+            await pre_checkout_query.answer(ok=False, error_message=str(e))
+            return
+    
+    await pre_checkout_query.answer(ok=True)
+
+async def handle_videocall_payment(message: Message, data):
+    """Liquidación de una videollamada pagada: reserva, cola o inicio en segundo plano"""
+    payment = message.successful_payment
+    charge_id = payment.telegram_payment_charge_id
+    price = payment.total_amount
+    creator_id, fan_id, duration, start_at = data["creator_id"], data["fan_id"], data["duration"], data["start_at"]
+    
+    # CRÍTICO: Reclamar el charge_id antes de reservar o encolar; una reentrega no duplica la sesión.
+    # El ingreso del creador se registra más tarde, al prestar el servicio (charge_videocall)
+    if not settle_payment(charge_id, "vc", fan_id, price, receiver_id=creator_id):
+        await message.answer("ℹ️ Este pago ya fue procesado.")
+        return
+    
+    creator = get_creator_by_id(creator_id)
+    creator_name = (creator[3] or creator[2]) if creator else "Sin nombre"
+    
+    if start_at:
+        try:
+            booking_id = await booking_engine.book(creator_id, fan_id, start_at, duration, price, charge_id)
+        except BookingConflict as e:
+            # Otro fan reservó la franja entre el pre-checkout y el pago
+            await refund_videocall(message.bot, fan_id, charge_id)
+            await message.answer(f"❌ {e}. Tu pago fue reembolsado.")
+            return
+        await message.answer(
+            f"""✅ <b>Videollamada Reservada</b>
+
+🗓️ <b>Horario:</b> {format_slot(start_at)}
+⏱️ <b>Duración:</b> {duration} minutos
+💳 <b>Pagaste:</b> {price} ⭐
+🆔 <b>Reserva:</b> #{booking_id}
+
+El grupo se creará automáticamente a la hora reservada."""
         )
-        
-        if session_id:
-            await callback.message.edit_text(
-                f"""✅ <b>¡Pago Exitoso!</b>
+        await notify_creator_booking(message.bot, creator_id, start_at, duration)
+        return
+    
+    if not videocall_waitlist.has_capacity(creator_id):
+        entry_id, position, eta = videocall_waitlist.enqueue(creator_id, fan_id, duration, price, charge_id)
+        await message.answer(
+            waitlist_text(creator_name, position, eta, paid=True),
+            reply_markup=waitlist_keyboard(creator_id, entry_id)
+        )
+        return
+    
+    # La creación del grupo es lenta: se hace fuera del camino de confirmación del pago
+    status = await message.answer("✅ <b>Pago recibido</b>\n\n🔄 Preparando tu videollamada...")
+    task = asyncio.create_task(prepare_paid_videocall(
+        status, creator_id, fan_id, duration, price, creator_name, charge_id
+    ))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+register_payment(
+    "vc", ("creator_id", "fan_id", "duration", "start_at"), "fan_id",
+    validate_videocall_checkout, handle_videocall_payment
+)
+
+# Referencias a las tareas en segundo plano para que no las recolecte el GC
+_background_tasks = set()
+
+async def prepare_paid_videocall(status: Message, creator_id, fan_id, duration, price, creator_name, charge_id):
+    """Crea la sesión pagada y va actualizando el mensaje de estado"""
+    async def progress(text):
+        await status.edit_text(f"✅ <b>Pago recibido</b>\n\n{text}")
+    
+    session_id, group_id = await videocall_manager.start_videocall_session(
+        creator_id, fan_id, duration, price, creator_name, progress=progress
+    )
+    
+    if not session_id:
+        refunded = await refund_videocall(status.bot, fan_id, charge_id)
+        await status.edit_text(
+            f"""❌ <b>Error al Crear Videollamada</b>
+
+Hubo un problema técnico al crear el grupo.
+
+{'↩️ <b>Tu pago de ' + str(price) + ' ⭐ fue reembolsado.</b>' if refunded else '🔄 Contacta al soporte para gestionar el reembolso.'}"""
+        )
+        return
+    
+    # El ingreso se registra una vez prestado el servicio
+    charge_videocall(fan_id, creator_id, price)
+    await status.edit_text(
+        f"""✅ <b>¡Pago Exitoso!</b>
 
 💳 <b>Pagaste:</b> {price} ⭐
 🎥 <b>Videollamada con:</b> {creator_name}
@@ -464,20 +622,8 @@ async def process_videocall_payment(callback: CallbackQuery):
 
 📱 <b>¡Ya puedes iniciar la videollamada!</b>
 El grupo se eliminará automáticamente después de {duration + 5} minutos."""
-            )
-        else:
-            await callback.message.edit_text(
-                f"""❌ <b>Error al Crear Videollamada</b>
-
-Tu pago de {price} ⭐ fue procesado exitosamente, pero hubo un problema técnico al crear el grupo.
-
-🔄 <b>Se procesará un reembolso automáticamente.</b>
-Contacta al soporte si no recibes el reembolso."""
-            )
-            
-    except Exception as e:
-        logger.error(f"Error en pago de videollamada: {e}")
-        await callback.answer("❌ Error en el pago", show_alert=True)
+    )
+    await send_pending_invite_links(status.bot, group_id, [creator_id, fan_id])
 
 @router.callback_query(F.data == "vc_cancel")
 async def cancel_videocall_action(callback: CallbackQuery, state: FSMContext):
@@ -505,4 +651,168 @@ async def toggle_videocall_status(callback: CallbackQuery):
     await callback.answer(f"Videollamadas {status_text}", show_alert=True)
     
     # Refrescar configuración
-    await cmd_configure_videocalls(callback.message, None)
\ No newline at end of file
+    await cmd_configure_videocalls(callback.message, None)
+
+# ==================== COLA DE ESPERA ====================
+
+@router.callback_query(VcQueue.filter())
+async def refresh_waitlist_position(callback: CallbackQuery, callback_data: VcQueue):
+    """Actualizar la posición del fan en la cola"""
+    creator_id = callback_data.creator_id
+    entry_id = callback_data.entry_id
+    
+    position, eta = videocall_waitlist.position(creator_id, entry_id)
+    if position is None:
+        await callback.message.edit_text("ℹ️ Ya no estás en la cola de esta videollamada.")
+        return
+    
+    creator = get_creator_by_id(creator_id)
+    creator_name = (creator[3] or creator[2]) if creator else "Sin nombre"
+    try:
+        await callback.message.edit_text(
+            waitlist_text(creator_name, position, eta),
+            reply_markup=waitlist_keyboard(creator_id, entry_id)
+        )
+    except Exception:
+        # Sin cambios en el texto: Telegram rechaza la edición
+        await callback.answer(f"👥 Posición {position}")
+
+@router.callback_query(VcLeaveQueue.filter())
+async def leave_waitlist(callback: CallbackQuery, callback_data: VcLeaveQueue):
+    """Salir de la cola de espera"""
+    entry_id = callback_data.entry_id
+    if not await videocall_waitlist.leave(entry_id, callback.from_user.id):
+        await callback.message.edit_text("ℹ️ Ya no estás en la cola de esta videollamada.")
+        return
+    await callback.message.edit_text("🚪 Saliste de la cola de videollamada.")
+
+# ==================== RESERVAS ====================
+
+def parse_availability_args(args):
+    """'AAAA-MM-DD HH:MM HH:MM' -> (inicio, fin) en epoch"""
+    date, start, end = args.split()
+    start_at = datetime.strptime(f"{date} {start}", "%Y-%m-%d %H:%M").timestamp()
+    end_at = datetime.strptime(f"{date} {end}", "%Y-%m-%d %H:%M").timestamp()
+    return start_at, end_at
+
+@router.message(Command("vc_horario"))
+async def publish_videocall_availability(message: Message):
+    """Publicar una ventana de disponibilidad (creadores)"""
+    user_id = message.from_user.id
+    if not get_creator_by_id(user_id):
+        await message.answer("❌ Solo los creadores registrados pueden publicar disponibilidad.")
+        return
+    
+    args = message.text.partition(" ")[2].strip()
+    if args:
+        try:
+            start_at, end_at = parse_availability_args(args)
+            if end_at <= time.time():
+                raise BookingConflict("La ventana ya terminó")
+            booking_engine.add_availability(user_id, start_at, end_at)
+        except ValueError:
+            await message.answer("❌ Formato inválido. Usa: <code>/vc_horario 2025-01-31 18:00 21:00</code>")
+            return
+        except BookingConflict as e:
+            await message.answer(f"❌ {e}")
+            return
+        await message.answer(f"✅ Disponibilidad publicada: {format_slot(start_at)} - {format_slot(end_at)}")
+        return
+    
+    windows = booking_engine.availability(user_id)
+    text = "📅 <b>TU DISPONIBILIDAD</b>\n\n"
+    if windows:
+        for start_at, end_at, _ in windows:
+            text += f"• {format_slot(start_at)} - {format_slot(end_at)}\n"
+    else:
+        text += "No tienes ventanas publicadas.\n"
+    text += "\nPublica una nueva con:\n<code>/vc_horario AAAA-MM-DD HH:MM HH:MM</code>"
+    await message.answer(text)
+
+@router.callback_query(VcSchedule.filter())
+async def choose_booking_duration(callback: CallbackQuery, callback_data: VcSchedule):
+    """Elegir duración para una reserva"""
+    creator_id = callback_data.creator_id
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=f"⏱️ {minutes} minutos", callback_data=VcSlots(creator_id=creator_id, duration=minutes).pack())]
+        for minutes in BOOKABLE_DURATIONS
+    ])
+    keyboard.inline_keyboard.append([
+        InlineKeyboardButton(text="⬅️ Volver", callback_data=VcSelectCreator(creator_id=creator_id).pack())
+    ])
+    await callback.message.edit_text("📅 <b>Reservar videollamada</b>\n\n¿Cuánto durará?", reply_markup=keyboard)
+    await callback.answer()
+
+@router.callback_query(VcSlots.filter())
+async def show_free_slots(callback: CallbackQuery, callback_data: VcSlots):
+    """Mostrar las próximas franjas libres del creador"""
+    creator_id = callback_data.creator_id
+    duration = callback_data.duration
+    
+    slots = booking_engine.free_slots(creator_id, duration)
+    if not slots:
+        await callback.answer("📭 No hay franjas libres para esa duración", show_alert=True)
+        return
+    
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=f"🗓️ {format_slot(slot)}", callback_data=VcBook(creator_id=creator_id, duration=duration, start_at=int(slot)).pack())]
+        for slot in slots
+    ])
+    keyboard.inline_keyboard.append([
+        InlineKeyboardButton(text="⬅️ Volver", callback_data=VcSchedule(creator_id=creator_id).pack())
+    ])
+    await callback.message.edit_text(
+        f"📅 <b>Franjas libres de {duration} minutos</b>\n\nElige un horario:",
+        reply_markup=keyboard
+    )
+    await callback.answer()
+
+@router.callback_query(VcBook.filter())
+async def book_videocall_slot(callback: CallbackQuery, callback_data: VcBook):
+    """Reservar una franja; las de pago se confirman al liquidar la factura"""
+    creator_id = callback_data.creator_id
+    duration = callback_data.duration
+    start_at = float(callback_data.start_at)
+    fan_id = callback.from_user.id
+    
+    price = videocall_price(creator_id, duration)
+    if price is None:
+        await callback.answer("❌ Creador no disponible", show_alert=True)
+        return
+    
+    try:
+        booking_engine.check_slot(creator_id, start_at, duration)
+    except BookingConflict as e:
+        await callback.answer(f"❌ {e}", show_alert=True)
+        return
+    
+    if price > 0:
+        await send_videocall_invoice(callback, creator_id, duration, start_at)
+        return
+    
+    try:
+        booking_id = await booking_engine.book(creator_id, fan_id, start_at, duration, 0)
+    except BookingConflict as e:
+        await callback.answer(f"❌ {e}", show_alert=True)
+        return
+    
+    await callback.message.edit_text(
+        f"""✅ <b>Videollamada Reservada</b>
+
+🗓️ <b>Horario:</b> {format_slot(start_at)}
+⏱️ <b>Duración:</b> {duration} minutos
+💰 <b>Precio:</b> GRATIS
+🆔 <b>Reserva:</b> #{booking_id}
+
+El grupo se creará automáticamente a la hora reservada."""
+    )
+    await notify_creator_booking(callback.bot, creator_id, start_at, duration)
+
+async def notify_creator_booking(bot, creator_id, start_at, duration):
+    try:
+        await bot.send_message(
+            creator_id,
+            f"📅 <b>Nueva reserva de videollamada</b>\n\n🗓️ {format_slot(start_at)} • {duration} minutos"
+        )
+    except Exception as e:
+        logger.error(f"Error notificando reserva al creador {creator_id}: {e}")
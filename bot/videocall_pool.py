@@ -0,0 +1,196 @@
+# bot/videocall_pool.py
+"""
+Pool de supergrupos precreados para videollamadas
+Un proceso en segundo plano mantiene N grupos listos (con el bot ya promovido)
+para que una sesión solo tenga que reservar uno y renombrarlo
+"""
+
+import asyncio
+import logging
+import os
+
+from pyrogram import raw
+from pyrogram.types import ChatPrivileges
+from database import (
+    add_pool_group, checkout_pool_group, set_pool_group_status, remove_pool_group,
+    is_pool_group, count_pool_groups, get_pool_groups, set_pool_invite_link
+)
+
+logger = logging.getLogger(__name__)
+
+# Número de grupos listos que se intenta mantener (0 desactiva el pool)
+POOL_SIZE = int(os.getenv("VIDEOCALL_POOL_SIZE", 3))
+# Grupos nuevos como máximo por minuto (create_supergroup tiene límites de flood estrictos)
+POOL_REFILL_PER_MINUTE = float(os.getenv("VIDEOCALL_POOL_REFILL_PER_MINUTE", 2))
+
+IDLE_GROUP_TITLE = "📹 Videollamada (disponible)"
+IDLE_GROUP_DESCRIPTION = "Sala privada de videollamadas OnlyStars"
+
+class VideoCallGroupPool:
+    """Mantiene un pool de supergrupos listos para videollamadas"""
+
+    def __init__(self, manager, size: int = POOL_SIZE, refill_per_minute: float = POOL_REFILL_PER_MINUTE):
+        self.manager = manager
+        self.size = size
+        self.refill_interval = 60 / refill_per_minute if refill_per_minute > 0 else 60
+        self._refill_task = None
+        self._refill_needed = asyncio.Event()
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    def start(self):
+        """Arranca el llenado en segundo plano"""
+        if not self.enabled or self._refill_task:
+            return
+        self._refill_task = asyncio.create_task(self._refill_loop())
+
+    async def stop(self):
+        if self._refill_task:
+            self._refill_task.cancel()
+            await asyncio.gather(self._refill_task, return_exceptions=True)
+            self._refill_task = None
+
+    async def checkout(self, session_id: str, title: str):
+        """Reserva un grupo listo para la sesión y lo renombra. Devuelve None si el pool está vacío"""
+        if not self.enabled:
+            return None
+
+        group_id = checkout_pool_group(session_id)
+        self._refill_needed.set()
+        if group_id is None:
+            logger.info("ℹ️ Pool de videollamadas vacío, se creará un grupo bajo demanda")
+            return None
+
+        try:
+            await self.manager._call(
+                "set_chat_title", self.manager.user_client.set_chat_title,
+                chat_id=group_id, title=title
+            )
+        except Exception as e:
+            # El nombre es cosmético: la sesión puede continuar con el título genérico
+            logger.warning(f"⚠️ No se pudo renombrar el grupo {group_id}: {e}")
+
+        logger.info(f"✅ Grupo {group_id} reservado del pool para la sesión {session_id}")
+        return group_id
+
+    def owns(self, group_id) -> bool:
+        return is_pool_group(group_id)
+
+    async def release(self, group_id):
+        """Devuelve un grupo al pool tras expulsar a los miembros y vaciar el historial"""
+        set_pool_group_status(group_id, 'recycling')
+        try:
+            await self._purge_members(group_id)
+            await self._purge_history(group_id)
+            # Rotar el enlace para que los invitados de la sesión anterior no puedan volver
+            set_pool_invite_link(group_id, await self._export_invite_link(group_id))
+            await self.manager._call(
+                "set_chat_title", self.manager.user_client.set_chat_title,
+                chat_id=group_id, title=IDLE_GROUP_TITLE
+            )
+        except Exception as e:
+            # Si no se puede limpiar, el grupo no es reutilizable: eliminarlo del todo
+            logger.error(f"❌ No se pudo reciclar el grupo {group_id}, se eliminará: {e}")
+            remove_pool_group(group_id)
+            try:
+                await self.manager._call(
+                    "delete_supergroup", self.manager.user_client.delete_supergroup, group_id
+                )
+            except Exception as delete_error:
+                logger.error(f"❌ Error al eliminar grupo {group_id}: {delete_error}")
+            self._refill_needed.set()
+            return False
+
+        set_pool_group_status(group_id, 'ready')
+        logger.info(f"♻️ Grupo {group_id} devuelto al pool")
+        return True
+
+    async def recover(self):
+        """Reanuda el reciclaje de grupos que quedaron a medias tras un reinicio"""
+        for group_id in get_pool_groups('recycling'):
+            await self.release(group_id)
+
+    async def _purge_members(self, group_id):
+        client = self.manager.user_client
+
+        async def list_members():
+            return [member async for member in client.get_chat_members(group_id)]
+
+        members = await self.manager._call("get_chat_members", list_members)
+        for member in members:
+            user = member.user
+            if user is None or user.is_self or user.id == self.manager.bot_user_id:
+                continue
+            # Expulsar sin dejar baneado: ban + unban
+            await self.manager._call("ban_chat_member", client.ban_chat_member, group_id, user.id)
+            await self.manager._call("unban_chat_member", client.unban_chat_member, group_id, user.id)
+
+    async def _purge_history(self, group_id):
+        client = self.manager.user_client
+
+        async def delete_history():
+            peer = await client.resolve_peer(group_id)
+            await client.invoke(
+                raw.functions.channels.DeleteHistory(channel=peer, max_id=0, for_everyone=True)
+            )
+
+        await self.manager._call("delete_history", delete_history)
+
+    async def _export_invite_link(self, group_id):
+        """Genera un nuevo enlace principal del grupo (revoca el anterior)"""
+        return await self.manager._call(
+            "export_chat_invite_link", self.manager.user_client.export_chat_invite_link, group_id
+        )
+
+    async def _create_ready_group(self):
+        """Crea un supergrupo nuevo con el bot promovido y lo agrega al pool"""
+        client = self.manager.user_client
+        chat = await self.manager._call(
+            "create_supergroup", client.create_supergroup,
+            title=IDLE_GROUP_TITLE,
+            description=IDLE_GROUP_DESCRIPTION
+        )
+        try:
+            await self.manager._call(
+                "promote_chat_member", client.promote_chat_member,
+                chat_id=chat.id,
+                user_id=self.manager.bot_user_id,
+                privileges=ChatPrivileges(
+                    can_manage_video_chats=True,
+                    can_restrict_members=True,
+                    can_delete_messages=True,
+                    can_invite_users=True
+                )
+            )
+            invite_link = await self._export_invite_link(chat.id)
+        except Exception:
+            # Un grupo sin el bot promovido no sirve para el pool
+            await self.manager._call("delete_supergroup", client.delete_supergroup, chat.id)
+            raise
+        add_pool_group(chat.id, invite_link)
+        logger.info(f"✅ Grupo {chat.id} agregado al pool de videollamadas")
+
+    async def _refill_loop(self):
+        await self.recover()
+        while True:
+            self._refill_needed.clear()
+            try:
+                if count_pool_groups('ready') < self.size:
+                    await self._create_ready_group()
+                    # Respetar el ritmo de llenado configurado
+                    await asyncio.sleep(self.refill_interval)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Error llenando el pool de videollamadas: {e}")
+                await asyncio.sleep(self.refill_interval)
+                continue
+
+            # Pool lleno: esperar a que se reserve un grupo
+            try:
+                await asyncio.wait_for(self._refill_needed.wait(), timeout=self.refill_interval * 10)
+            except asyncio.TimeoutError:
+                pass
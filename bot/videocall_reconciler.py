@@ -0,0 +1,134 @@
+# bot/videocall_reconciler.py
+"""
+Reconciliación de sesiones y grupos de videollamada huérfanos
+Tras una caída pueden quedar sesiones 'active' vencidas y grupos vivos en
+Telegram sin sesión. Este proceso los detecta con consultas indexadas y los
+cierra por lotes a través del cliente MTProto
+"""
+
+import asyncio
+import logging
+import os
+
+from database import (
+    get_expired_videocall_sessions, get_stale_pending_videocall_sessions,
+    close_videocall_sessions, get_orphan_videocall_groups, get_orphan_pool_groups
+)
+from scheduler import scheduler
+
+logger = logging.getLogger(__name__)
+
+# Cada cuánto se repite la reconciliación (segundos)
+RECONCILE_INTERVAL = int(os.getenv("VIDEOCALL_RECONCILE_INTERVAL", 900))
+# Grupos que se cierran en paralelo por lote
+RECONCILE_BATCH_SIZE = int(os.getenv("VIDEOCALL_RECONCILE_BATCH_SIZE", 10))
+# Una sesión 'pending' más antigua que esto se considera abandonada (minutos)
+STALE_PENDING_MINUTES = 30
+# Margen antes de considerar huérfano un grupo del pool reservado (segundos)
+POOL_CHECKOUT_GRACE = 300
+
+class VideoCallReconciler:
+    """Cierra sesiones vencidas y grupos huérfanos"""
+
+    def __init__(self, manager, batch_size: int = RECONCILE_BATCH_SIZE, grace_minutes: int = 5):
+        self.manager = manager
+        self.batch_size = batch_size
+        self.grace_minutes = grace_minutes
+        self._lock = asyncio.Lock()
+
+    async def run_once(self) -> dict:
+        """Una pasada completa de reconciliación; devuelve lo que se limpió"""
+        async with self._lock:
+            report = {
+                "expired_sessions": 0,
+                "stale_pending": 0,
+                "groups_closed": 0,
+                "pool_groups_released": 0,
+                "errors": 0,
+            }
+
+            # 1. Sesiones: solo base de datos, por lotes
+            report["expired_sessions"] = self._close_sessions(
+                lambda: get_expired_videocall_sessions(self.grace_minutes, self.batch_size * 10),
+                'completed'
+            )
+            report["stale_pending"] = self._close_sessions(
+                lambda: get_stale_pending_videocall_sessions(STALE_PENDING_MINUTES, self.batch_size * 10),
+                'cancelled'
+            )
+
+            # 2. Grupos: requieren el cliente MTProto
+            if self.manager.initialized:
+                await self._close_orphan_groups(report)
+                await self._release_orphan_pool_groups(report)
+            else:
+                logger.warning("⚠️ Reconciliación sin cliente MTProto: los grupos huérfanos quedan pendientes")
+
+            if any(report.values()):
+                logger.info(f"🧹 Reconciliación de videollamadas: {report}")
+
+        # Red de seguridad: cualquier hueco liberado por otra vía atiende las colas
+        await self.manager.notify_session_end(None)
+        return report
+
+    def _close_sessions(self, fetch, status) -> int:
+        closed = 0
+        while True:
+            rows = fetch()
+            if not rows:
+                return closed
+            close_videocall_sessions([session_id for session_id, _ in rows], status)
+            closed += len(rows)
+
+    async def _close_orphan_groups(self, report):
+        attempted = set()
+        while True:
+            batch = [
+                group_id for group_id, _ in get_orphan_videocall_groups(self.batch_size + len(attempted))
+                if group_id not in attempted
+            ][:self.batch_size]
+            if not batch:
+                return
+            attempted.update(batch)
+
+            results = await asyncio.gather(
+                *(self.manager.delete_videocall_group(group_id) for group_id in batch),
+                return_exceptions=True
+            )
+            for result in results:
+                if result is True:
+                    report["groups_closed"] += 1
+                else:
+                    report["errors"] += 1
+
+    async def _release_orphan_pool_groups(self, report):
+        for group_id in get_orphan_pool_groups(POOL_CHECKOUT_GRACE, self.batch_size * 10):
+            try:
+                if await self.manager.pool.release(group_id):
+                    report["pool_groups_released"] += 1
+                else:
+                    report["errors"] += 1
+            except Exception as e:
+                logger.error(f"❌ Error liberando grupo del pool {group_id}: {e}")
+                report["errors"] += 1
+
+    async def run_scheduled(self):
+        """Handler del trabajo recurrente: reconcilia y programa la siguiente pasada
+
+        Los errores se registran aquí y no llegan al planificador: un reintento
+        del trabajo programaría otra pasada recurrente en paralelo a esta
+        """
+        try:
+            await self.run_once()
+        except Exception as e:
+            logger.error(f"❌ Error en la reconciliación de videollamadas: {e}")
+        await scheduler.schedule_in("videocall_reconcile", RECONCILE_INTERVAL)
+
+    async def start(self):
+        """Pasada inicial al arrancar y alta del trabajo recurrente (si no estaba ya programado)"""
+        try:
+            await self.run_once()
+        except Exception as e:
+            logger.error(f"❌ Error en la reconciliación inicial de videollamadas: {e}")
+        if not scheduler.has_pending("videocall_reconcile"):
+            await scheduler.schedule_in("videocall_reconcile", RECONCILE_INTERVAL)
@@ -3,33 +3,103 @@ import asyncio
 import os
 import uuid
 import logging
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 from pyrogram import Client, filters
 from pyrogram.types import ChatPrivileges
-from pyrogram.errors import FloodWait, UserAlreadyParticipant
+from pyrogram.errors import (
+    FloodWait, UserAlreadyParticipant, UserPrivacyRestricted, UserNotMutualContact, UserChannelsTooMuch,
+    ChannelInvalid, ChannelPrivate, PeerIdInvalid
+)
 from database import (
     create_videocall_session, get_videocall_session, update_videocall_session_status,
-    create_videocall_group, delete_videocall_group, get_videocall_settings
+    create_videocall_group, delete_videocall_group, get_videocall_settings, get_videocall_group,
+    add_transaction, update_balance
 )
+from mtproto_queue import MTProtoOperationQueue
+from videocall_pool import VideoCallGroupPool
+from videocall_reconciler import VideoCallReconciler
+from scheduler import scheduler
+from settings import settings
 
 logger = logging.getLogger(__name__)
 
+# Intervalo del health check del cliente MTProto persistente (segundos)
+HEALTHCHECK_INTERVAL = int(os.getenv("VIDEOCALL_HEALTHCHECK_INTERVAL", 60))
+HEALTHCHECK_TIMEOUT = 30
+RECONNECT_MAX_BACKOFF = 300
+# Minutos de gracia tras la duración contratada antes de cerrar el grupo
+TEARDOWN_GRACE_MINUTES = 5
+# Tamaño máximo de la cola de operaciones MTProto
+MTPROTO_QUEUE_SIZE = int(os.getenv("MTPROTO_QUEUE_SIZE", 100))
+# Reintentos ante FloodWait y espera máxima aceptable antes de fallar
+MTPROTO_MAX_RETRIES = int(os.getenv("MTPROTO_MAX_RETRIES", 3))
+MTPROTO_MAX_FLOOD_WAIT = int(os.getenv("MTPROTO_MAX_FLOOD_WAIT", 300))
+
+def charge_videocall(fan_id, creator_id, price):
+    """Registra el cobro de una videollamada y acredita al creador su parte (menos comisión)"""
+    commission = (price * settings.commission_percentage) // 100
+    add_transaction(fan_id, creator_id, price, commission, 'videocall')
+    update_balance(creator_id, price - commission)
+
+async def refund_videocall(bot, user_id, charge_id):
+    """Reembolsa un pago en Stars de una videollamada que no se pudo prestar"""
+    if not bot or not charge_id:
+        return False
+    try:
+        await bot.refund_star_payment(user_id=user_id, telegram_payment_charge_id=charge_id)
+        logger.info(f"↩️ Reembolso de videollamada emitido a {user_id} ({charge_id})")
+        return True
+    except Exception as e:
+        logger.error(f"❌ No se pudo reembolsar el pago {charge_id} de {user_id}: {e}")
+        return False
+
+# Errores por los que no se puede agregar a un usuario directamente, pero sí puede unirse con enlace
+LINK_FALLBACK_ERRORS = (UserPrivacyRestricted, UserNotMutualContact, UserChannelsTooMuch)
+
+@dataclass
+class InviteResult:
+    """Desglose por usuario de una invitación a un grupo de videollamada"""
+    added: list = field(default_factory=list)
+    already_member: list = field(default_factory=list)
+    needs_link: list = field(default_factory=list)
+    failed: list = field(default_factory=list)
+    invite_link: str = None
+    
+    @property
+    def ok(self) -> bool:
+        """Todos los usuarios están dentro o tienen un enlace para entrar"""
+        return not self.failed
+
 class VideoCallManager:
     def __init__(self):
         self.user_client = None
         self.bot_user_id = None
         self.initialized = False
+        self.queue = MTProtoOperationQueue(
+            maxsize=MTPROTO_QUEUE_SIZE,
+            max_retries=MTPROTO_MAX_RETRIES,
+            max_flood_wait=MTPROTO_MAX_FLOOD_WAIT
+        )
+        self.pool = VideoCallGroupPool(self)
+        self.reconciler = VideoCallReconciler(self, grace_minutes=TEARDOWN_GRACE_MINUTES)
+        self._health_task = None
+        self._reconnect_lock = asyncio.Lock()
+        # Corrutinas notificadas con el creator_id cuando se libera un hueco
+        # (sesión terminada o inicio fallido); None si puede ser cualquier creador
+        self.session_end_listeners = []
+        # Enlaces de invitación pendientes por grupo: {group_id: {user_id: link}}
+        self._pending_links = {}
         
     async def initialize(self, bot_user_id):
-        """Inicializa el cliente de usuario de Pyrogram"""
+        """Inicializa y conecta el cliente de usuario de Pyrogram (una sola vez)"""
         try:
-            api_id = int(os.getenv("TELEGRAM_API_ID"))
-            api_hash = os.getenv("TELEGRAM_API_HASH")
-            phone_number = os.getenv("TELEGRAM_PHONE_NUMBER")
-            
-            if not all([api_id, api_hash, phone_number]):
+            if not settings.videocalls_enabled:
                 logger.error("❌ Faltan credenciales de Telegram API para videollamadas")
                 return False
+            api_id = settings.telegram_api_id
+            api_hash = settings.telegram_api_hash
+            phone_number = settings.telegram_phone_number
             
             # Crear cliente de usuario con session file
             session_path = os.path.join(os.path.dirname(__file__), "videocall_session")
@@ -40,7 +110,14 @@ class VideoCallManager:
                 phone_number=phone_number
             )
             
+            # Conexión persistente: el handshake se paga una sola vez al arrancar
+            await self.user_client.start()
+            self.queue.start()
+            self._health_task = asyncio.create_task(self._health_check_loop())
+            
             self.bot_user_id = bot_user_id
+            # Llenado en segundo plano de supergrupos listos
+            self.pool.start()
             logger.info("✅ VideoCallManager inicializado correctamente")
             self.initialized = True
             return True
@@ -49,6 +126,59 @@ class VideoCallManager:
             logger.error(f"❌ Error al inicializar VideoCallManager: {e}")
             return False
     
+    async def shutdown(self):
+        """Detiene la cola de operaciones y desconecta el cliente limpiamente"""
+        self.initialized = False
+        
+        if self._health_task:
+            self._health_task.cancel()
+            await asyncio.gather(self._health_task, return_exceptions=True)
+            self._health_task = None
+        
+        await self.pool.stop()
+        await self.queue.stop()
+        
+        if self.user_client and self.user_client.is_connected:
+            try:
+                await self.user_client.stop()
+                logger.info("✅ Cliente de videollamadas desconectado")
+            except Exception as e:
+                logger.error(f"❌ Error al desconectar cliente de videollamadas: {e}")
+    
+    async def _call(self, name, method, *args, **kwargs):
+        """Ejecuta un método del cliente Pyrogram a través de la cola de operaciones"""
+        return await self.queue.run(name, lambda: method(*args, **kwargs))
+    
+    async def _health_check_loop(self):
+        """Verifica periódicamente la conexión y reconecta si se perdió"""
+        while True:
+            await asyncio.sleep(HEALTHCHECK_INTERVAL)
+            try:
+                await asyncio.wait_for(self.user_client.get_me(), timeout=HEALTHCHECK_TIMEOUT)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️ Health check del cliente de videollamadas falló: {e}")
+                await self._reconnect()
+    
+    async def _reconnect(self):
+        """Reinicia la conexión del cliente con backoff exponencial"""
+        async with self._reconnect_lock:
+            backoff = 1
+            while True:
+                try:
+                    if self.user_client.is_connected:
+                        await self.user_client.stop()
+                    await self.user_client.start()
+                    logger.info("✅ Cliente de videollamadas reconectado")
+                    return
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"❌ Reconexión fallida, reintentando en {backoff}s: {e}")
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, RECONNECT_MAX_BACKOFF)
+    
     async def create_videocall_group(self, session_id, creator_name):
         """Crea un grupo temporal para videollamada"""
         if not self.initialized:
@@ -56,92 +186,161 @@ class VideoCallManager:
             return None
             
         try:
-            async with self.user_client:
-                # Crear título único para el grupo
-                group_title = f"📹 Videollamada - {creator_name}"
-                group_description = f"Sesión privada de videollamada • ID: {session_id}"
-                
-                # Crear supergrupo
-                chat = await self.user_client.create_supergroup(
-                    title=group_title,
-                    description=group_description
-                )
-                
-                # Promover bot como administrador con permisos de videollamada
-                try:
-                    await self.user_client.promote_chat_member(
-                        chat_id=chat.id,
-                        user_id=self.bot_user_id,
-                        privileges=ChatPrivileges(
-                            can_manage_video_chats=True,
-                            can_restrict_members=True,
-                            can_delete_messages=True,
-                            can_invite_users=True
-                        )
+            # Crear título único para el grupo
+            group_title = f"📹 Videollamada - {creator_name}"
+            group_description = f"Sesión privada de videollamada • ID: {session_id}"
+            
+            # Camino rápido: reservar un grupo precreado del pool
+            group_id = await self.pool.checkout(session_id, group_title)
+            if group_id:
+                create_videocall_group(group_id, session_id, group_title)
+                return group_id
+            
+            # Crear supergrupo
+            chat = await self._call(
+                "create_supergroup", self.user_client.create_supergroup,
+                title=group_title,
+                description=group_description
+            )
+            
+            # Promover bot como administrador con permisos de videollamada
+            try:
+                await self._call(
+                    "promote_chat_member", self.user_client.promote_chat_member,
+                    chat_id=chat.id,
+                    user_id=self.bot_user_id,
+                    privileges=ChatPrivileges(
+                        can_manage_video_chats=True,
+                        can_restrict_members=True,
+                        can_delete_messages=True,
+                        can_invite_users=True
                     )
-                except Exception as e:
-                    logger.warning(f"⚠️ No se pudo promover bot en grupo {chat.id}: {e}")
-                
-                # Registrar grupo en base de datos
-                create_videocall_group(chat.id, session_id, group_title)
-                
-                logger.info(f"✅ Grupo creado: {group_title} (ID: {chat.id})")
-                return chat.id
-                
+                )
+            except Exception as e:
+                logger.warning(f"⚠️ No se pudo promover bot en grupo {chat.id}: {e}")
+            
+            # Registrar grupo en base de datos
+            create_videocall_group(chat.id, session_id, group_title)
+            
+            logger.info(f"✅ Grupo creado: {group_title} (ID: {chat.id})")
+            return chat.id
+            
         except FloodWait as e:
-            logger.warning(f"⚠️ Rate limit alcanzado, esperando {e.x} segundos...")
-            await asyncio.sleep(e.x)
-            return await self.create_videocall_group(session_id, creator_name)
+            # La cola ya reintentó lo razonable; no bloquear al llamador más tiempo
+            logger.warning(f"⚠️ Rate limit persistente al crear grupo ({e.value}s), se aborta la sesión")
+            return None
             
         except Exception as e:
             logger.error(f"❌ Error al crear grupo para videollamada: {e}")
             return None
     
     async def invite_users_to_group(self, group_id, user_ids):
-        """Invita usuarios al grupo de videollamada"""
+        """Invita usuarios al grupo en una sola llamada y devuelve el desglose por usuario"""
+        result = InviteResult()
         if not self.initialized:
             logger.error("❌ VideoCallManager no inicializado")
-            return False
-            
+            result.failed = list(user_ids)
+            return result
+        
         try:
-            async with self.user_client:
-                for user_id in user_ids:
-                    try:
-                        await self.user_client.add_chat_members(
-                            chat_id=group_id,
-                            user_ids=[user_id]
-                        )
-                        logger.info(f"✅ Usuario {user_id} invitado al grupo {group_id}")
-                        
-                    except UserAlreadyParticipant:
-                        logger.info(f"ℹ️ Usuario {user_id} ya está en el grupo {group_id}")
-                        
-                    except Exception as e:
-                        logger.error(f"❌ Error al invitar usuario {user_id}: {e}")
-                        
-                return True
-                
+            await self._call(
+                "add_chat_members", self.user_client.add_chat_members,
+                chat_id=group_id,
+                user_ids=list(user_ids)
+            )
+            result.added = list(user_ids)
+            logger.info(f"✅ Usuarios {list(user_ids)} invitados al grupo {group_id}")
         except Exception as e:
-            logger.error(f"❌ Error general al invitar usuarios: {e}")
-            return False
+            # La llamada en lote falla entera: repetir por usuario para saber quién no pudo entrar
+            logger.warning(f"⚠️ Invitación en lote al grupo {group_id} falló ({e}), reintentando por usuario")
+            for user_id in user_ids:
+                try:
+                    await self._call(
+                        "add_chat_members", self.user_client.add_chat_members,
+                        chat_id=group_id,
+                        user_ids=[user_id]
+                    )
+                    result.added.append(user_id)
+                except UserAlreadyParticipant:
+                    result.already_member.append(user_id)
+                except LINK_FALLBACK_ERRORS as user_error:
+                    logger.info(f"ℹ️ Usuario {user_id} no se puede agregar ({user_error}), se usará enlace")
+                    result.needs_link.append(user_id)
+                except Exception as user_error:
+                    logger.error(f"❌ Error al invitar usuario {user_id}: {user_error}")
+                    result.failed.append(user_id)
+        
+        if result.needs_link:
+            result.invite_link = await self._get_invite_link(group_id, len(result.needs_link))
+            if result.invite_link:
+                self._pending_links.setdefault(group_id, {}).update(
+                    {user_id: result.invite_link for user_id in result.needs_link}
+                )
+            else:
+                result.failed.extend(result.needs_link)
+                result.needs_link = []
+        
+        return result
+    
+    async def _get_invite_link(self, group_id, member_limit):
+        """Enlace nuevo limitado a los usuarios pendientes (también en grupos del pool, cuyo
+        enlace principal no tiene límite y serviría a cualquiera a quien se reenvíe)"""
+        try:
+            invite = await self._call(
+                "create_chat_invite_link", self.user_client.create_chat_invite_link,
+                chat_id=group_id,
+                member_limit=member_limit
+            )
+            return invite.invite_link
+        except Exception as e:
+            logger.error(f"❌ No se pudo crear enlace de invitación para el grupo {group_id}: {e}")
+            return None
+    
+    async def _revoke_invite_links(self, group_id, links):
+        for link in links:
+            try:
+                await self._call(
+                    "revoke_chat_invite_link", self.user_client.revoke_chat_invite_link,
+                    chat_id=group_id,
+                    invite_link=link
+                )
+            except Exception as e:
+                # Queda acotado por member_limit; el reciclaje expulsa a quien haya entrado
+                logger.warning(f"⚠️ No se pudo revocar el enlace de la sesión en el grupo {group_id}: {e}")
+    
+    def get_pending_invite_link(self, group_id, user_id):
+        """Enlace que debe recibir un usuario que no se pudo agregar directamente (o None)"""
+        return self._pending_links.get(group_id, {}).get(user_id)
     
     async def delete_videocall_group(self, group_id):
-        """Elimina grupo de videollamada después de la sesión"""
+        """Elimina grupo de videollamada después de la sesión (o lo devuelve al pool)"""
         if not self.initialized:
             logger.error("❌ VideoCallManager no inicializado")
             return False
+        
+        session_links = set(self._pending_links.pop(group_id, {}).values())
+        if self.pool.owns(group_id):
+            # Los grupos del pool se reciclan en lugar de eliminarse: el enlace de la sesión no debe sobrevivirla
+            await self._revoke_invite_links(group_id, session_links)
+            delete_videocall_group(group_id)
+            return await self.pool.release(group_id)
             
         try:
-            async with self.user_client:
-                # Eliminar grupo
-                await self.user_client.delete_supergroup(group_id)
-                
-                # Marcar como eliminado en base de datos
-                delete_videocall_group(group_id)
-                
-                logger.info(f"✅ Grupo {group_id} eliminado correctamente")
-                return True
-                
+            # Eliminar grupo
+            await self._call("delete_supergroup", self.user_client.delete_supergroup, group_id)
+            
+            # Marcar como eliminado en base de datos
+            delete_videocall_group(group_id)
+            
+            logger.info(f"✅ Grupo {group_id} eliminado correctamente")
+            return True
+            
+        except (ChannelInvalid, ChannelPrivate, PeerIdInvalid) as e:
+            # El grupo ya no existe en Telegram: solo queda cerrar el registro
+            delete_videocall_group(group_id)
+            logger.info(f"ℹ️ Grupo {group_id} ya no existía ({e}), registro cerrado")
+            return True
+            
         except Exception as e:
             logger.error(f"❌ Error al eliminar grupo {group_id}: {e}")
             return False
@@ -150,8 +349,32 @@ class VideoCallManager:
         """Genera un ID único para la sesión de videollamada"""
         return f"vc_{uuid.uuid4().hex[:12]}"
     
-    async def start_videocall_session(self, creator_id, fan_id, duration_minutes, price_stars, creator_name):
-        """Inicia una sesión completa de videollamada"""
+    async def notify_session_end(self, creator_id=None):
+        """Avisa a los listeners de que el creador (None: cualquiera) puede tener un hueco libre"""
+        for listener in self.session_end_listeners:
+            try:
+                await listener(creator_id)
+            except Exception as e:
+                logger.error(f"❌ Error en listener de fin de sesión: {e}")
+    
+    async def start_videocall_session(self, creator_id, fan_id, duration_minutes, price_stars, creator_name, progress=None):
+        """Inicia una sesión completa de videollamada; progress(texto) recibe el avance de cada paso"""
+        session_id, result = await self._start_videocall_session(
+            creator_id, fan_id, duration_minutes, price_stars, creator_name, progress
+        )
+        if not session_id:
+            # La sesión fallida ya no ocupa hueco: quien esperaba puede pasar
+            await self.notify_session_end(creator_id)
+        return session_id, result
+    
+    async def _start_videocall_session(self, creator_id, fan_id, duration_minutes, price_stars, creator_name, progress):
+        async def report(text):
+            if progress:
+                try:
+                    await progress(text)
+                except Exception as e:
+                    logger.debug(f"No se pudo informar el progreso: {e}")
+        
         try:
             # 1. Generar ID de sesión
             session_id = self.generate_session_id()
@@ -160,21 +383,30 @@ class VideoCallManager:
             create_videocall_session(session_id, creator_id, fan_id, duration_minutes, price_stars)
             
             # 3. Crear grupo temporal
+            await report("🏗️ Preparando la sala privada...")
             group_id = await self.create_videocall_group(session_id, creator_name)
             if not group_id:
+                update_videocall_session_status(session_id, 'cancelled')
                 return None, "❌ No se pudo crear el grupo de videollamada"
             
             # 4. Actualizar sesión con ID de grupo
             update_videocall_session_status(session_id, 'active', group_id)
             
             # 5. Invitar usuarios al grupo
-            success = await self.invite_users_to_group(group_id, [creator_id, fan_id])
-            if not success:
+            await report("👥 Agregando participantes...")
+            invites = await self.invite_users_to_group(group_id, [creator_id, fan_id])
+            if not invites.ok:
+                update_videocall_session_status(session_id, 'cancelled')
                 await self.delete_videocall_group(group_id)
                 return None, "❌ No se pudo invitar los usuarios al grupo"
             
-            # 6. Programar eliminación automática del grupo
-            asyncio.create_task(self._schedule_group_deletion(group_id, session_id, duration_minutes))
+            # 6. Programar cierre automático (persistente, sobrevive a reinicios)
+            await scheduler.schedule_in(
+                "videocall_teardown",
+                (duration_minutes + TEARDOWN_GRACE_MINUTES) * 60,
+                group_id=group_id,
+                session_id=session_id
+            )
             
             logger.info(f"✅ Sesión de videollamada iniciada: {session_id}")
             return session_id, group_id
@@ -183,23 +415,30 @@ class VideoCallManager:
             logger.error(f"❌ Error al iniciar sesión de videollamada: {e}")
             return None, f"Error interno: {str(e)}"
     
-    async def _schedule_group_deletion(self, group_id, session_id, duration_minutes):
-        """Programa la eliminación automática del grupo después de la duración"""
-        try:
-            # Esperar la duración de la videollamada + 5 minutos de gracia
-            wait_seconds = (duration_minutes + 5) * 60
-            await asyncio.sleep(wait_seconds)
-            
-            # Marcar sesión como completada
-            update_videocall_session_status(session_id, 'completed')
-            
-            # Eliminar grupo
-            await self.delete_videocall_group(group_id)
-            
-            logger.info(f"✅ Sesión {session_id} completada y grupo {group_id} eliminado")
-            
-        except Exception as e:
-            logger.error(f"❌ Error en eliminación programada del grupo {group_id}: {e}")
+    async def teardown_session(self, group_id, session_id):
+        """Cierra una sesión vencida: la marca como completada y elimina o recicla el grupo"""
+        update_videocall_session_status(session_id, 'completed')
+        session = get_videocall_session(session_id)
+        creator_id = session[2] if session else None
+        
+        # El grupo pudo cerrarse ya (reconciliador) y, si es del pool, pertenecer a otra sesión
+        group = get_videocall_group(group_id)
+        if group is None or group[2] != session_id or group[5] is not None:
+            logger.info(f"ℹ️ Grupo {group_id} ya no pertenece a la sesión {session_id}, nada que cerrar")
+            await self.notify_session_end(creator_id)
+            return
+        
+        if not self.initialized:
+            # Sin cliente MTProto: el reintento del planificador volverá a intentarlo
+            raise RuntimeError("VideoCallManager no inicializado")
+        
+        if not await self.delete_videocall_group(group_id):
+            raise RuntimeError(f"No se pudo cerrar el grupo {group_id}")
+        
+        logger.info(f"✅ Sesión {session_id} completada y grupo {group_id} cerrado")
+        await self.notify_session_end(creator_id)
 
 # Instancia global del manejador de videollamadas
-videocall_manager = VideoCallManager()
\ No newline at end of file
+videocall_manager = VideoCallManager()
+scheduler.register("videocall_teardown", videocall_manager.teardown_session)
+scheduler.register("videocall_reconcile", videocall_manager.reconciler.run_scheduled)
@@ -0,0 +1,174 @@
+# bot/videocall_waitlist.py
+"""
+Límite de videollamadas simultáneas por creador y cola de espera FIFO
+Si el creador ya tiene el máximo de sesiones en curso, el fan entra en una
+cola persistente; cuando termina una sesión se atiende al siguiente
+"""
+
+import asyncio
+import heapq
+import logging
+import os
+
+from database import (
+    count_active_videocall_sessions, get_active_videocall_remaining,
+    add_waitlist_entry, get_waitlist, get_waitlist_entry, get_waitlist_entries_for_fan, get_waitlist_creators,
+    update_waitlist_status, get_creator_by_id
+)
+from videocall_system import videocall_manager, charge_videocall, refund_videocall
+
+logger = logging.getLogger(__name__)
+
+# Sesiones simultáneas permitidas por creador
+MAX_CONCURRENT_PER_CREATOR = int(os.getenv("VIDEOCALL_MAX_CONCURRENT_PER_CREATOR", 1))
+
+class VideoCallWaitlist:
+    """Reparte las sesiones de cada creador respetando el límite y el orden de llegada"""
+
+    def __init__(self, manager, max_concurrent: int = MAX_CONCURRENT_PER_CREATOR):
+        self.manager = manager
+        self.max_concurrent = max_concurrent
+        self.bot = None  # se asigna al arrancar para avisar a los fans atendidos
+        self._locks = {}
+        self._tasks = set()
+
+    def _lock(self, creator_id):
+        if creator_id not in self._locks:
+            self._locks[creator_id] = asyncio.Lock()
+        return self._locks[creator_id]
+
+    def has_capacity(self, creator_id) -> bool:
+        """Hay hueco y nadie esperando delante (los que esperan tienen prioridad)"""
+        return (
+            count_active_videocall_sessions(creator_id) < self.max_concurrent
+            and not get_waitlist(creator_id)
+        )
+
+    def enqueue(self, creator_id, fan_id, duration_minutes, price_stars, charge_id=None):
+        """Agrega al fan a la cola y devuelve (entry_id, posición, espera en minutos)
+
+        Sin pago previo hay una sola entrada por creador; cada pago (charge_id) tiene la suya
+        """
+        if charge_id is None:
+            for entry_id, waiting_creator_id in get_waitlist_entries_for_fan(fan_id):
+                if waiting_creator_id == creator_id:
+                    return (entry_id, *self.position(creator_id, entry_id))
+        entry_id = add_waitlist_entry(creator_id, fan_id, duration_minutes, price_stars, charge_id)
+        logger.info(f"ℹ️ Fan {fan_id} en cola para el creador {creator_id} (entrada {entry_id})")
+        position = self.position(creator_id, entry_id)
+        # El hueco pudo liberarse entre has_capacity() y el alta en la cola
+        self.kick(creator_id)
+        return (entry_id, *position)
+
+    def position(self, creator_id, entry_id):
+        """Posición (desde 1) y espera estimada en minutos de una entrada; (None, None) si ya no espera"""
+        queue = get_waitlist(creator_id)
+        # Cada hueco queda libre cuando termina su sesión actual (0 si ya está libre)
+        slots = get_active_videocall_remaining(creator_id)[:self.max_concurrent]
+        slots += [0] * (self.max_concurrent - len(slots))
+        heapq.heapify(slots)
+
+        for index, (queued_id, _, duration_minutes, _, _) in enumerate(queue):
+            free_at = heapq.heappop(slots)
+            if queued_id == entry_id:
+                return index + 1, -(-free_at // 60)
+            heapq.heappush(slots, free_at + duration_minutes * 60)
+        return None, None
+
+    async def leave(self, entry_id, fan_id):
+        """Saca al fan de la cola; si ya había pagado se le reembolsa"""
+        entry = get_waitlist_entry(entry_id)
+        if not entry or entry[2] != fan_id or entry[3] != 'waiting':
+            return False
+        update_waitlist_status(entry_id, 'left')
+        await refund_videocall(self.bot, fan_id, entry[4])
+        return True
+
+    async def serve(self, creator_id):
+        """Inicia sesiones para los primeros de la cola mientras haya hueco"""
+        async with self._lock(creator_id):
+            while count_active_videocall_sessions(creator_id) < self.max_concurrent:
+                queue = get_waitlist(creator_id)
+                if not queue:
+                    return
+                entry_id, fan_id, duration_minutes, price_stars, charge_id = queue[0]
+                update_waitlist_status(entry_id, 'served')
+                # Una entrada fallida queda como 'failed' y se sigue con la siguiente
+                await self._start_for(entry_id, creator_id, fan_id, duration_minutes, price_stars, charge_id)
+
+    def kick(self, creator_id):
+        """Atiende la cola del creador en segundo plano
+
+        No espera al resultado: quien llama puede estar dentro de serve() con el candado tomado
+        """
+        task = asyncio.create_task(self._serve_logged(creator_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _serve_logged(self, creator_id):
+        try:
+            await self.serve(creator_id)
+        except Exception as e:
+            logger.error(f"❌ Error atendiendo la cola del creador {creator_id}: {e}")
+
+    async def _start_for(self, entry_id, creator_id, fan_id, duration_minutes, price_stars, charge_id=None):
+        creator = get_creator_by_id(creator_id)
+        creator_name = (creator[3] or creator[2]) if creator else "Sin nombre"
+
+        session_id, group_id = await self.manager.start_videocall_session(
+            creator_id, fan_id, duration_minutes, price_stars, creator_name
+        )
+        if not session_id:
+            update_waitlist_status(entry_id, 'failed')
+            logger.error(f"❌ No se pudo atender la entrada {entry_id} de la cola: {group_id}")
+            refunded = await refund_videocall(self.bot, fan_id, charge_id)
+            await self._notify(
+                fan_id,
+                "❌ Era tu turno, pero no se pudo crear la videollamada."
+                + (" Tu pago fue reembolsado." if refunded else " Intenta de nuevo más tarde.")
+            )
+            return False
+
+        # El ingreso se registra al prestar el servicio: si no llega a prestarse se reembolsa.
+        # Sin charge_id no hubo cobro y no hay nada que acreditar
+        if price_stars > 0 and charge_id:
+            charge_videocall(fan_id, creator_id, price_stars)
+
+        await self._notify(
+            fan_id,
+            f"""🎉 <b>¡Es tu turno!</b>
+
+🎥 <b>Videollamada con:</b> {creator_name}
+⏱️ <b>Duración:</b> {duration_minutes} minutos
+🆔 <b>Sesión:</b> {session_id}
+
+📱 <b>¡Ya puedes iniciar la videollamada!</b>"""
+        )
+        for user_id in (creator_id, fan_id):
+            link = self.manager.get_pending_invite_link(group_id, user_id)
+            if link:
+                await self._notify(user_id, f"🔗 Únete a la videollamada con este enlace:\n{link}")
+        return True
+
+    async def _notify(self, user_id, text):
+        if not self.bot:
+            return
+        try:
+            await self.bot.send_message(user_id, text)
+        except Exception as e:
+            logger.error(f"Error notificando a {user_id} desde la cola de videollamadas: {e}")
+
+    async def on_session_ended(self, creator_id):
+        """Listener de hueco libre: atiende la cola del creador (None: todas las que tienen espera)"""
+        for waiting_creator_id in ([creator_id] if creator_id is not None else get_waitlist_creators()):
+            self.kick(waiting_creator_id)
+
+    async def start(self):
+        """Atiende las colas que quedaron pendientes antes de un reinicio"""
+        for creator_id in get_waitlist_creators():
+            await self._serve_logged(creator_id)
+
+# Instancia global de la cola de espera
+videocall_waitlist = VideoCallWaitlist(videocall_manager)
+videocall_manager.session_end_listeners.append(videocall_waitlist.on_session_ended)
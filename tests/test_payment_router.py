@@ -0,0 +1,62 @@
+# tests/test_payment_router.py
+"""Codec de payloads de factura: ida y vuelta, formato heredado y rechazo de payloads inválidos"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "bot"))
+
+# Los módulos de cada tipo de pago se registran al importarse
+import payments  # noqa: F401
+import ppv_handlers  # noqa: F401
+import videocall_handlers  # noqa: F401
+from payment_router import PAYLOAD_VERSION, PayloadError, _registry, decode_payload, encode_payload
+
+SAMPLE_FIELDS = {
+    "sub": (7001234567, 5123456789),
+    "ppv": (42, 5123456789),
+    "tip": (7001234567, 5123456789, 250),
+    "vc": (7001234567, 5123456789, 30, 1767225600),
+}
+
+def test_every_registered_kind_is_covered():
+    assert set(_registry) == set(SAMPLE_FIELDS)
+
+@pytest.mark.parametrize("kind", sorted(SAMPLE_FIELDS))
+def test_round_trip(kind):
+    values = SAMPLE_FIELDS[kind]
+    payload = decode_payload(encode_payload(kind, *values))
+    assert payload.kind == kind
+    assert payload.version == PAYLOAD_VERSION
+    assert payload.fields == dict(zip(_registry[kind].fields, values))
+
+@pytest.mark.parametrize("legacy, kind, fields", [
+    ("sub_7001234567_5123456789", "sub", {"creator_id": 7001234567, "payer_id": 5123456789}),
+    ("ppv_42_5123456789", "ppv", {"content_id": 42, "buyer_id": 5123456789}),
+    ("tip_7001234567_5123456789_250", "tip", {"creator_id": 7001234567, "tipper_id": 5123456789, "amount": 250}),
+])
+def test_legacy_payload(legacy, kind, fields):
+    payload = decode_payload(legacy)
+    assert payload.kind == kind
+    assert payload.version == 0
+    assert payload.fields == fields
+
+@pytest.mark.parametrize("payload", [
+    "zz.1:1:2",                                  # tipo desconocido
+    "zz_1_2",                                    # tipo desconocido, formato heredado
+    "ppv.1:1",                                   # faltan campos
+    "ppv.1:1:2:3",                               # sobran campos
+    "tip_1_2",                                   # faltan campos, formato heredado
+    f"ppv.{PAYLOAD_VERSION + 1}:1:2",            # versión futura
+    "ppv.1:1:no-base36",                         # campo ilegible
+    "ppv_1_x",                                   # campo ilegible, formato heredado
+])
+def test_invalid_payload_raises(payload):
+    with pytest.raises(PayloadError):
+        decode_payload(payload)
+
+def test_encode_rejects_wrong_field_count():
+    with pytest.raises(PayloadError):
+        encode_payload("tip", 1, 2)
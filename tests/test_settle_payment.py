@@ -0,0 +1,54 @@
+# tests/test_settle_payment.py
+"""Liquidación de pagos: cada charge_id se acredita una sola vez y el outbox va en la misma transacción"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "bot"))
+
+import database
+
+def setup_function():
+    database.DB_PATH = os.path.join(tempfile.mkdtemp(), "test_settle.db")
+    database.init_db()
+    database.add_creator(1, "creadora", "Creadora", "", 0, None, "stars")
+
+def count(table, where="1", params=()):
+    conn = database.get_db_connection()
+    try:
+        return conn.execute(f"SELECT COUNT(*) FROM {table} WHERE {where}", params).fetchone()[0]
+    finally:
+        conn.close()
+
+def settle_tip(charge_id, outbox):
+    return database.settle_payment(
+        charge_id, "tip", payer_id=10, amount_stars=100, receiver_id=1, commission_stars=20,
+        tx_type="tip", outbox=outbox
+    )
+
+def test_replayed_charge_is_credited_once():
+    outbox = [(10, "tip_receipt", {"creator_id": 1, "amount": 100, "commission": 20})]
+    assert settle_tip("charge_1", outbox) is True
+    assert settle_tip("charge_1", outbox) is False
+
+    assert database.get_user_balance(1) == 80
+    assert count("transactions", "payer_id = ?", (10,)) == 1
+    assert count("processed_payments", "charge_id = ?", ("charge_1",)) == 1
+    assert count("outbox") == 1
+
+def test_outbox_is_written_in_the_settlement_transaction():
+    # Un payload que no se puede serializar hace fallar el outbox: nada del pago debe quedar
+    with pytest.raises(TypeError):
+        settle_tip("charge_1", [(10, "tip_receipt", {"unserializable": object()})])
+    assert count("processed_payments") == 0
+    assert count("transactions") == 0
+    assert count("outbox") == 0
+    assert database.get_user_balance(1) == 0
+
+    # El mismo charge_id se puede liquidar después: el fallo no lo dejó marcado como procesado
+    assert settle_tip("charge_1", [(10, "tip_receipt", {"amount": 100})]) is True
+    assert count("outbox", "chat_id = ? AND template = ? AND status = 'pending'", (10, "tip_receipt")) == 1
+    assert database.get_user_balance(1) == 80
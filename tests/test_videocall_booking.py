@@ -0,0 +1,71 @@
+# tests/test_videocall_booking.py
+"""Reservas de videollamadas: una sesión que nunca arranca se reembolsa al acabar la franja"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "bot"))
+
+import database
+
+class FailingManager:
+    """Sustituye al cliente MTProto: ninguna sesión llega a arrancar"""
+
+    def __init__(self):
+        self.attempts = 0
+
+    async def start_videocall_session(self, creator_id, fan_id, duration_minutes, price_stars, creator_name, progress=None):
+        self.attempts += 1
+        return None, "❌ No se pudo crear el grupo de videollamada"
+
+class FakeBot:
+    def __init__(self):
+        self.refunds = []
+
+    async def refund_star_payment(self, user_id, telegram_payment_charge_id):
+        self.refunds.append((user_id, telegram_payment_charge_id))
+
+    async def send_message(self, chat_id, text, **kwargs):
+        pass
+
+def setup_function():
+    database.DB_PATH = os.path.join(tempfile.mkdtemp(), "test_booking.db")
+    database.init_db()
+    database.add_creator(1, "creadora", "Creadora", "", 0, None, "stars")
+
+def test_failed_booking_is_refunded_when_the_slot_ends(monkeypatch):
+    import videocall_booking
+    from scheduler import DurableScheduler
+
+    scheduler = DurableScheduler()
+    manager = FailingManager()
+    monkeypatch.setattr(videocall_booking, "scheduler", scheduler)
+    monkeypatch.setattr(videocall_booking, "videocall_manager", manager)
+    monkeypatch.setattr(videocall_booking, "BOOKING_RETRY_DELAY", 0.05)
+
+    engine = videocall_booking.BookingEngine()
+    engine.bot = FakeBot()
+    scheduler.register("videocall_booking_start", engine.start_booked_session)
+
+    async def scenario():
+        start_at = time.time()
+        end_at = start_at + 0.5
+        booking_id = database.add_videocall_booking(1, 20, start_at, end_at, 10, 50, "charge_1")
+        assert len(engine._calendar(1).bookings) == 1
+        scheduler.start()
+        await scheduler.schedule("videocall_booking_start", start_at, booking_id=booking_id)
+        while database.get_videocall_booking(booking_id)[7] == 'booked':
+            assert time.time() < end_at + 2, "la reserva no se resolvió tras acabar la franja"
+            await asyncio.sleep(0.05)
+        await scheduler.stop()
+        return booking_id
+
+    booking_id = asyncio.run(scenario())
+    assert manager.attempts > 1
+    assert database.get_videocall_booking(booking_id)[7] == 'failed'
+    assert engine.bot.refunds == [(20, "charge_1")]
+    assert len(engine._calendar(1).bookings) == 0
+    assert scheduler.pending_count == 0
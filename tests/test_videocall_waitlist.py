@@ -0,0 +1,61 @@
+# tests/test_videocall_waitlist.py
+"""Cola de espera de videollamadas: una entrada con hueco libre no se queda atascada"""
+
+import asyncio
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "bot"))
+
+import database
+
+class FakeManager:
+    """Sustituye al cliente MTProto: registra las sesiones que se piden iniciar"""
+
+    def __init__(self, fail=()):
+        self.started = []
+        self.fail = set(fail)
+
+    async def start_videocall_session(self, creator_id, fan_id, duration_minutes, price_stars, creator_name, progress=None):
+        if fan_id in self.fail:
+            return None, "❌ No se pudo crear el grupo de videollamada"
+        self.started.append(fan_id)
+        return f"vc_{fan_id}", -100
+
+    def get_pending_invite_link(self, group_id, user_id):
+        return None
+
+def setup_function():
+    database.DB_PATH = os.path.join(tempfile.mkdtemp(), "test_waitlist.db")
+    database.init_db()
+    database.add_creator(1, "creadora", "Creadora", "", 0, None, "stars")
+
+def test_enqueue_with_free_capacity_is_served():
+    from videocall_waitlist import VideoCallWaitlist
+
+    async def scenario():
+        waitlist = VideoCallWaitlist(FakeManager(), max_concurrent=1)
+        entry_id, position, _ = waitlist.enqueue(creator_id=1, fan_id=10, duration_minutes=10, price_stars=0)
+        assert position == 1
+        await asyncio.gather(*waitlist._tasks)
+        return waitlist, entry_id
+
+    waitlist, entry_id = asyncio.run(scenario())
+    assert waitlist.manager.started == [10]
+    assert database.get_waitlist_entry(entry_id)[3] == 'served'
+
+def test_serve_keeps_draining_after_a_failed_start():
+    from videocall_waitlist import VideoCallWaitlist
+
+    async def scenario():
+        waitlist = VideoCallWaitlist(FakeManager(fail={10}), max_concurrent=2)
+        first = database.add_waitlist_entry(1, 10, 10, 0)
+        second = database.add_waitlist_entry(1, 11, 10, 0)
+        await waitlist.serve(1)
+        return waitlist, first, second
+
+    waitlist, first, second = asyncio.run(scenario())
+    assert database.get_waitlist_entry(first)[3] == 'failed'
+    assert database.get_waitlist_entry(second)[3] == 'served'
+    assert waitlist.manager.started == [11]